@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import socket
+import struct
+import threading
+import subprocess
+import re
+import time
+import argparse
+import stat
+import glob
+import pwd
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Privileged helper for Control Panel
+# Started once through pkexec, then serves a fixed allow-list of operations
+# over a Unix socket until it has been idle for a while.
+
+IDLE_TIMEOUT = 300
+OP_TIMEOUT = 120
+MAX_WORKERS = 8
+
+UNIT_RE = re.compile(r"^[A-Za-z0-9@._:-]+$")
+DEVICE_RE = re.compile(r"^[a-z][a-z0-9]*$")
+# Package managers install any argument with a "/" or a package suffix as a local file
+PACKAGE_RE = re.compile(r"^[A-Za-z0-9@_+][A-Za-z0-9@._+:-]*$")
+EMERGE_PACKAGE_RE = re.compile(r"^(?:[A-Za-z0-9_+][A-Za-z0-9_+.-]*/)?[A-Za-z0-9_+][A-Za-z0-9_+.-]*$")
+PACKAGE_FILE_SUFFIXES = (".deb", ".rpm", ".apk", ".xbps", ".ebuild", ".tbz2", ".gpkg.tar")
+GROUP_RE = re.compile(r"^[a-z_][a-z0-9_-]*$")
+JOURNAL_FILTER_RE = re.compile(r"^--(priority=[0-7]|boot=-?[0-9]+|unit=[A-Za-z0-9@._:-]+)$")
+CURSOR_RE = re.compile(r"^[A-Za-z0-9=;_-]+$")
+JOURNAL_MAX_LINES = 5000
+
+# Package installs need far longer than one-shot commands
+OP_TIMEOUTS = {"install_packages": 3600}
+
+# Package manager -> commands, the package names are appended to the last one
+INSTALL_COMMANDS = {
+    "pacman": [["pacman", "-S", "--needed", "--noconfirm"]],
+    "apt": [["apt-get", "update"], ["env", "DEBIAN_FRONTEND=noninteractive", "apt-get", "install", "-y",
+                                       "-o", "Dpkg::Options::=--force-confdef", "-o", "Dpkg::Options::=--force-confold"]],
+    "dnf": [["dnf", "install", "-y"]],
+    "zypper": [["zypper", "--non-interactive", "install"]],
+    "xbps-install": [["xbps-install", "-Sy"]],
+    "apk": [["apk", "add"]],
+    "emerge": [["emerge"]],
+}
+
+# ufw rules the system profiles may apply
+UFW_RULES = [
+    re.compile(r"^default (allow|deny|reject) (incoming|outgoing|routed)$"),
+    re.compile(r"^(allow|deny|reject|limit) [A-Za-z0-9][A-Za-z0-9/:-]*$"),
+    re.compile(r"^--force enable$"),
+]
+
+
+def _device(args):
+    device = str(args.get("device", ""))
+    if not DEVICE_RE.match(device) or not os.path.isdir(os.path.join("/sys/block", device)):
+        raise ValueError(f"Invalid block device: {device!r}")
+    return f"/dev/{device}"
+
+
+def _energy_files():
+    # RAPL and amd_energy counters are root-only since CVE-2020-8694
+    files = glob.glob("/sys/class/powercap/intel-rapl:*/energy_uj")
+    for hwmon in glob.glob("/sys/class/hwmon/hwmon*"):
+        try:
+            with open(os.path.join(hwmon, "name")) as f:
+                if f.read().strip() == "amd_energy":
+                    files += glob.glob(os.path.join(hwmon, "energy*_input"))
+        except OSError:
+            continue
+    # grep -H prints "path:value" per file; no files would make it read stdin
+    return [["grep", "-H", "", *sorted(files)]] if files else []
+
+
+def _install_packages(args):
+    manager = args.get("manager")
+    packages = args.get("packages")
+    if manager not in INSTALL_COMMANDS:
+        raise ValueError(f"Unsupported package manager: {manager!r}")
+    pattern = EMERGE_PACKAGE_RE if manager == "emerge" else PACKAGE_RE
+    if not isinstance(packages, list) or not packages or \
+            not all(isinstance(p, str) and pattern.match(p) and ".." not in p
+                    and not p.lower().endswith(PACKAGE_FILE_SUFFIXES) and ".pkg.tar" not in p for p in packages):
+        raise ValueError("Invalid package list")
+    commands = [list(argv) for argv in INSTALL_COMMANDS[manager]]
+    commands[-1] += packages
+    return commands
+
+
+def _add_to_group(args):
+    # Always the connected user, never a name from the request
+    group = str(args.get("group", ""))
+    if not GROUP_RE.match(group):
+        raise ValueError(f"Invalid group name: {group!r}")
+    try:
+        user = pwd.getpwuid(args["caller_uid"]).pw_name
+    except KeyError:
+        raise ValueError("Unknown caller")
+    return [["usermod", "-aG", group, user]]
+
+
+def _ufw(args):
+    rule = str(args.get("rule", ""))
+    if not any(pattern.match(rule) for pattern in UFW_RULES):
+        raise ValueError(f"ufw rule not allowed: {rule!r}")
+    return [["ufw", *rule.split()]]
+
+
+def _journal(args):
+    # The same JSON export the app reads unprivileged, for users outside systemd-journal
+    filters = args.get("filters") or []
+    if not isinstance(filters, list) or not all(isinstance(f, str) and JOURNAL_FILTER_RE.match(f) for f in filters):
+        raise ValueError("Invalid journal filter")
+    lines = args.get("lines", 200)
+    if not isinstance(lines, int) or not 0 < lines <= JOURNAL_MAX_LINES:
+        raise ValueError(f"Invalid line count: {lines!r}")
+
+    argv = ["journalctl", "-o", "json", "--no-pager", f"--lines={lines}"]
+    for key, option in (("cursor", "--cursor"), ("after_cursor", "--after-cursor")):
+        if key in args:
+            cursor = str(args[key])
+            if not CURSOR_RE.match(cursor):
+                raise ValueError("Invalid journal cursor")
+            argv.append(f"{option}={cursor}")
+    if args.get("reverse"):
+        argv.append("--reverse")
+    return [argv + filters]
+
+
+def _unit(args):
+    unit = str(args.get("unit", ""))
+    if not UNIT_RE.match(unit) or unit.startswith("-"):
+        raise ValueError(f"Invalid unit name: {unit!r}")
+    return unit
+
+
+# Operation name -> function(args) returning the list of commands to run.
+# Commands run in order; for "first_success" ops the first one that works wins.
+OPERATIONS = {
+    "ping": lambda args: [],
+    "set_ntp": lambda args: [["timedatectl", "set-ntp", "true"]],
+    "hwclock_systohc": lambda args: [["hwclock", "--systohc"]],
+    "logrotate": lambda args: [["logrotate", "-f", "/etc/logrotate.conf"]],
+    "daemon_reload": lambda args: [["systemctl", "daemon-reload"]],
+    "restart_service": lambda args: [["systemctl", "restart", _unit(args)]],
+    "enable_service": lambda args: [["systemctl", "enable", "--now", _unit(args)]],
+    "disable_service": lambda args: [["systemctl", "disable", "--now", _unit(args)]],
+    "install_packages": _install_packages,
+    "add_to_group": _add_to_group,
+    "ufw": _ufw,
+    "energy_counters": lambda args: _energy_files(),
+    "journal": _journal,
+    # --nocheck=standby: report sleeping disks instead of spinning them up
+    "smart_info": lambda args: [["smartctl", "--json=c", "--all", "--nocheck=standby", _device(args)]],
+    "flush_dns": lambda args: [
+        ["resolvectl", "flush-caches"],
+        ["systemd-resolve", "--flush-caches"],
+        ["killall", "-HUP", "nscd"],
+    ],
+}
+
+FIRST_SUCCESS = {"flush_dns"}
+
+
+class HelperServer:
+    def __init__(self, socket_path, allowed_uid, idle_timeout=IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.allowed_uid = allowed_uid
+        self.idle_timeout = idle_timeout
+        self.pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.last_activity = time.monotonic()
+        self.running = True
+
+    def touch(self):
+        with self.lock:
+            self.last_activity = time.monotonic()
+
+    @contextlib.contextmanager
+    def as_caller(self):
+        # The socket directory belongs to the caller: touch paths in it with their
+        # rights, so a symlink swapped in can't redirect root to other files.
+        euid = os.geteuid()
+        try:
+            if euid != self.allowed_uid:
+                os.seteuid(self.allowed_uid)
+            yield
+        finally:
+            if os.geteuid() != euid:
+                os.seteuid(euid)
+
+    def remove_socket(self):
+        with self.as_caller():
+            if os.path.lexists(self.socket_path) and stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                os.unlink(self.socket_path)
+
+    def serve(self):
+        self.remove_socket()
+
+        # Bound as the caller, the socket is owned by them and 0600 from the umask
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            with self.as_caller():
+                server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        server.listen(4)
+        server.settimeout(1.0)
+
+        try:
+            while self.running:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    with self.lock:
+                        idle = time.monotonic() - self.last_activity
+                        if self.connections == 0 and idle > self.idle_timeout:
+                            break
+                    continue
+
+                if not self.peer_allowed(conn):
+                    conn.close()
+                    continue
+
+                with self.lock:
+                    self.connections += 1
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            self.pool.shutdown(wait=False)
+            self.remove_socket()
+
+    def peer_allowed(self, conn):
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        pid, uid, gid = struct.unpack("3i", creds)
+        return uid in (self.allowed_uid, 0)
+
+    def handle(self, conn):
+        try:
+            with conn, conn.makefile("rwb") as stream:
+                for raw in stream:
+                    self.touch()
+                    try:
+                        request = json.loads(raw)
+                        response = {"id": request.get("id"), "results": self.dispatch(request)}
+                    except (ValueError, AttributeError) as e:
+                        request = {}
+                        response = {"id": None, "error": f"Bad request: {e}"}
+                    stream.write(json.dumps(response).encode() + b"\n")
+                    stream.flush()
+                    self.touch()
+                    if request.get("shutdown"):
+                        self.running = False
+                        break
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.connections -= 1
+
+    def dispatch(self, request):
+        if not isinstance(request, dict) or not isinstance(request.get("ops", []), list):
+            raise ValueError("expected an object with a list of ops")
+        ops = request.get("ops", [])
+        if request.get("parallel"):
+            return list(self.pool.map(self.run_op, ops))
+        return [self.run_op(op) for op in ops]
+
+    def run_op(self, op):
+        if not isinstance(op, dict):
+            return {"op": None, "ok": False, "error": f"Invalid operation: {op!r}"}
+        name = op.get("op")
+        if not isinstance(name, str) or name not in OPERATIONS:
+            return {"op": name, "ok": False, "error": f"Operation not allowed: {name}"}
+
+        args = op.get("args") or {}
+        if not isinstance(args, dict):
+            return {"op": name, "ok": False, "error": f"Invalid arguments: {args!r}"}
+        args = dict(args)
+        args["caller_uid"] = self.allowed_uid
+        try:
+            commands = OPERATIONS[name](args)
+        except ValueError as e:
+            return {"op": name, "ok": False, "error": str(e)}
+
+        limit = OP_TIMEOUTS.get(name, OP_TIMEOUT)
+        try:
+            timeout = min(float(op.get("timeout", limit)), limit)
+        except (TypeError, ValueError):
+            timeout = None
+        # Also rejects NaN and negative values
+        if timeout is None or not 0 < timeout <= limit:
+            return {"op": name, "ok": False, "error": f"Invalid timeout: {op.get('timeout')!r}"}
+        output = []
+        ok = True
+        for argv in commands:
+            try:
+                # No stdin: a prompt fails the command instead of waiting forever
+                result = subprocess.run(argv, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout)
+                output.append((result.stdout + result.stderr).strip())
+                ok = result.returncode == 0
+            except FileNotFoundError:
+                ok = False
+                output.append(f"{argv[0]}: not found")
+            except subprocess.TimeoutExpired:
+                ok = False
+                output.append(f"{argv[0]}: timed out after {timeout:g} s")
+
+            if name in FIRST_SUCCESS:
+                if ok:
+                    break
+            elif not ok:
+                break
+
+        return {"op": name, "ok": ok, "output": "\n".join(o for o in output if o)}
+
+
+def run_client(socket_path, request):
+    """Send one operation to a running helper and print its output.
+
+    Lets jobs in the app's task graph run allow-listed operations as plain
+    processes, all under the single authorization of the running helper.
+    """
+    try:
+        op = json.loads(request)
+    except ValueError as e:
+        print(f"Bad request: {e}")
+        return 1
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError as e:
+        sock.close()
+        print(f"The privileged helper is not running: {e.strerror}")
+        return 1
+
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps({"id": 1, "ops": [op]}).encode() + b"\n")
+        stream.flush()
+        line = stream.readline()
+
+    response = json.loads(line) if line else {"error": "The privileged helper closed the connection"}
+    if "error" in response:
+        print(response["error"])
+        return 1
+    result = response["results"][0]
+    output = result.get("output") or result.get("error")
+    if output:
+        print(output)
+    return 0 if result["ok"] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control Panel privileged helper")
+    parser.add_argument("--socket", help="Socket path (defaults to the caller's runtime dir)")
+    parser.add_argument("--idle-timeout", type=int, default=IDLE_TIMEOUT)
+    parser.add_argument("--request", metavar="JSON", help="Run one operation on a running helper and exit")
+    args = parser.parse_args()
+
+    # pkexec tells us who asked; only that user may connect
+    uid = int(os.environ.get("PKEXEC_UID", os.getuid()))
+    socket_path = args.socket or f"/run/user/{uid}/controlpanel-helper.sock"
+
+    if args.request:
+        sys.exit(run_client(socket_path, args.request))
+
+    # The socket must live in a private directory owned by the caller
+    try:
+        dir_stat = os.stat(os.path.dirname(os.path.abspath(socket_path)))
+    except OSError:
+        print(f"Runtime directory for {socket_path} does not exist.")
+        sys.exit(1)
+    if dir_stat.st_uid != uid or dir_stat.st_mode & 0o022:
+        print(f"Refusing to create {socket_path}: directory is not private to uid {uid}.")
+        sys.exit(1)
+
+    HelperServer(socket_path, uid, args.idle_timeout).serve()
+
+
+if __name__ == "__main__":
+    main()
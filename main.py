@@ -1,4 +1,5 @@
 import os
+import sys
 import subprocess
 import gi
 import distro
@@ -9,17 +10,40 @@ import datetime
 import socket 
 import time
 import threading
-import urllib.request
+import urllib.parse
 import shutil
-import configparser
 import cairo
 import shlex
 import tempfile
 import stat
+import json
+import struct
+import sqlite3
+import grp
+import pwd
+import collections
+import contextlib
+import hashlib
+import concurrent.futures
+import bisect
+import glob
+import mmap
+import math
+import asyncio
+import ssl
+import ipaddress
+import signal
+import errno
+
+# Optional: only the MangoHud log analyzer needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
-from gi.repository import Gtk, Adw, Gio, GLib, GObject, Gdk
+from gi.repository import Gtk, Adw, Gio, GLib, GObject, Gdk, Pango
 
 # ==============================
 # SYSTEM PROFILES CONFIG
@@ -110,11 +134,3371 @@ SYSTEM_PROFILES = {
     },
 }
 
+# Per-user cache for indexes that are expensive to rebuild
+CACHE_DIR = os.path.join(GLib.get_user_cache_dir(), "controlpanel")
+# Per-user settings (monitored services, ...)
+CONFIG_DIR = os.path.join(GLib.get_user_config_dir(), "controlpanel")
+# Per-user data that must survive a cache wipe (config backups, ...)
+DATA_DIR = os.path.join(GLib.get_user_data_dir(), "controlpanel")
+
+DEFAULT_MONITORED_SERVICES = ["NetworkManager", "docker", "bluetooth", "cups"]
+DEFAULT_LATENCY_TARGETS = ["icmp 8.8.8.8", "tcp 1.1.1.1:443", "udp 9.9.9.9:53"]
+
+# Launch options shown on the Utilities page and used by the benchmark runner
+GAME_PREFIX = "mangohud gamemoderun gamescope -W 1920 -H 1080 -r 75 --force-grab-cursor -f -- %command%"
+
+
+# ==============================
+# LOCAL PACKAGE DATABASE INDEX
+# ==============================
+
+class LocalPackageIndex:
+    """In-memory name -> version index read straight from the local package database.
+
+    The index is cached on disk and invalidated by the mtime of the database,
+    so presence checks are dict lookups without forking the package manager.
+    """
+
+    # Package manager -> (backend, candidate database paths)
+    BACKENDS = {
+        "pacman": ("pacman", ["/var/lib/pacman/local"]),
+        "apt": ("dpkg", ["/var/lib/dpkg/status"]),
+        "dnf": ("rpm", ["/var/lib/rpm/rpmdb.sqlite", "/usr/lib/sysimage/rpm/rpmdb.sqlite"]),
+        "zypper": ("rpm", ["/usr/lib/sysimage/rpm/rpmdb.sqlite", "/var/lib/rpm/rpmdb.sqlite"]),
+    }
+
+    # RPM header tags / types used to read name and version from rpmdb blobs
+    RPMTAG_NAME, RPMTAG_VERSION, RPMTAG_RELEASE, RPMTAG_EPOCH = 1000, 1001, 1002, 1003
+    RPM_INT32_TYPE, RPM_STRING_TYPE = 4, 6
+
+    def __init__(self, pkg_manager, cache_path=None):
+        self.backend, self.db_path = None, None
+        backend, paths = self.BACKENDS.get(pkg_manager, (None, []))
+        for path in paths:
+            if os.path.exists(path):
+                self.backend, self.db_path = backend, path
+                break
+
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, "packages.json")
+        self._packages = None
+        self._mtime = None
+
+    def available(self):
+        return self.backend is not None
+
+    def _db_mtime(self):
+        mtime = os.stat(self.db_path).st_mtime_ns
+        # sqlite may keep recent transactions in the write-ahead log
+        if self.backend == "rpm" and os.path.exists(self.db_path + "-wal"):
+            mtime = max(mtime, os.stat(self.db_path + "-wal").st_mtime_ns)
+        return mtime
+
+    def packages(self):
+        """Return the name -> version dict, rebuilding it only if the database changed."""
+        if not self.available():
+            return None
+
+        try:
+            mtime = self._db_mtime()
+        except OSError:
+            return None
+
+        if self._packages is not None and self._mtime == mtime:
+            return self._packages
+
+        packages = self._load_cache(mtime)
+        if packages is None:
+            try:
+                packages = self._read_database()
+            except Exception as e:
+                print(f"[ERROR] Failed to read package database {self.db_path}: {e}")
+                return None
+            self._save_cache(mtime, packages)
+
+        self._packages, self._mtime = packages, mtime
+        return packages
+
+    def is_installed(self, name):
+        packages = self.packages()
+        return packages is not None and name in packages
+
+    def version(self, name):
+        packages = self.packages()
+        return packages.get(name) if packages else None
+
+    # --- Disk cache ---
+
+    def _load_cache(self, mtime):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            if data.get("db_path") == self.db_path and data.get("mtime") == mtime:
+                return data["packages"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _save_cache(self, mtime, packages):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"db_path": self.db_path, "mtime": mtime, "packages": packages}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"[ERROR] Failed to write package index cache: {e}")
+
+    # --- Database readers ---
+
+    def _read_database(self):
+        if self.backend == "pacman":
+            return self._read_pacman()
+        if self.backend == "dpkg":
+            return self._read_dpkg()
+        return self._read_rpm()
+
+    def _read_pacman(self):
+        # Entries are named "<name>-<pkgver>-<pkgrel>", the same values as %NAME% and
+        # %VERSION% in their desc file; versions never contain '-', so no file reads are needed.
+        packages = {}
+        for entry in os.scandir(self.db_path):
+            if not entry.is_dir():
+                continue
+            parts = entry.name.rsplit("-", 2)
+            if len(parts) == 3:
+                packages[parts[0]] = f"{parts[1]}-{parts[2]}"
+            else:
+                packages.update(self._read_pacman_desc(os.path.join(entry.path, "desc")))
+        return packages
+
+    def _read_pacman_desc(self, path):
+        fields = {}
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return {}
+        for i, line in enumerate(lines[:-1]):
+            if line in ("%NAME%", "%VERSION%"):
+                fields[line] = lines[i + 1]
+        if "%NAME%" in fields:
+            return {fields["%NAME%"]: fields.get("%VERSION%", "")}
+        return {}
+
+    def _read_dpkg(self):
+        packages = {}
+        name = version = status = None
+        with open(self.db_path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line == "\n":
+                    if name and status and status.endswith(" installed"):
+                        packages[name] = version or ""
+                    name = version = status = None
+                elif line.startswith("Package: "):
+                    name = line[9:].strip()
+                elif line.startswith("Status: "):
+                    status = line[8:].strip()
+                elif line.startswith("Version: "):
+                    version = line[9:].strip()
+        if name and status and status.endswith(" installed"):
+            packages[name] = version or ""
+        return packages
+
+    def _read_rpm(self):
+        try:
+            with contextlib.closing(sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)) as conn:
+                rows = conn.execute("SELECT blob FROM Packages").fetchall()
+        except sqlite3.Error:
+            # Without write access to the WAL index, fall back to a snapshot read
+            with contextlib.closing(sqlite3.connect(f"file:{self.db_path}?immutable=1", uri=True)) as conn:
+                rows = conn.execute("SELECT blob FROM Packages").fetchall()
+
+        packages = {}
+        for (blob,) in rows:
+            tags = self._parse_rpm_header(blob)
+            name = tags.get(self.RPMTAG_NAME)
+            if not name:
+                continue
+            version = f"{tags.get(self.RPMTAG_VERSION, '')}-{tags.get(self.RPMTAG_RELEASE, '')}"
+            if tags.get(self.RPMTAG_EPOCH):
+                version = f"{tags[self.RPMTAG_EPOCH]}:{version}"
+            packages[name] = version
+        return packages
+
+    def _parse_rpm_header(self, blob):
+        """Extract the name/version tags from an on-disk RPM header blob."""
+        wanted = (self.RPMTAG_NAME, self.RPMTAG_VERSION, self.RPMTAG_RELEASE, self.RPMTAG_EPOCH)
+        tags = {}
+        try:
+            index_count, data_len = struct.unpack_from(">II", blob, 0)
+            data_start = 8 + index_count * 16
+            for i in range(index_count):
+                tag, kind, offset, count = struct.unpack_from(">IIII", blob, 8 + i * 16)
+                if tag not in wanted:
+                    continue
+                pos = data_start + offset
+                if kind == self.RPM_STRING_TYPE:
+                    end = blob.index(b"\0", pos)
+                    tags[tag] = bytes(blob[pos:end]).decode("utf-8", "replace")
+                elif kind == self.RPM_INT32_TYPE:
+                    tags[tag] = struct.unpack_from(">I", blob, pos)[0]
+        except (struct.error, ValueError):
+            pass
+        return tags
+
+
+# ==============================
+# SYSTEMD D-BUS CLIENT
+# ==============================
+
+class SystemdClient:
+    """Asynchronous Gio.DBusProxy client for the systemd manager (org.freedesktop.systemd1).
+
+    All calls are non-blocking; results are delivered to callbacks on the
+    GLib main loop. Privileged methods go through polkit interactive
+    authorization instead of sudo.
+    """
+
+    BUS_NAME = "org.freedesktop.systemd1"
+    MANAGER_PATH = "/org/freedesktop/systemd1"
+    MANAGER_IFACE = "org.freedesktop.systemd1.Manager"
+    UNIT_IFACE = "org.freedesktop.systemd1.Unit"
+    SERVICE_IFACE = "org.freedesktop.systemd1.Service"
+    UINT64_MAX = 2 ** 64 - 1
+    # Leave enough time for the user to answer a polkit prompt
+    AUTH_TIMEOUT_MS = 120000
+
+    def __init__(self, bus_type=Gio.BusType.SYSTEM):
+        self.bus_type = bus_type
+        self.proxy = None
+        self.error = None
+        self._connecting = False
+        self._waiting = []
+        self._jobs = {} # job object path -> callback(ok, result)
+        self._watched = {} # unit object path -> (service, state)
+        self._watch_callback = None
+        self._watch_subscription = None
+
+    @staticmethod
+    def unit_name(service):
+        return service if "." in service else f"{service}.service"
+
+    def with_proxy(self, callback):
+        """Run callback(proxy) once connected; proxy is None if systemd is unreachable."""
+        if self.proxy is not None or self.error is not None:
+            callback(self.proxy)
+            return
+
+        self._waiting.append(callback)
+        if self._connecting:
+            return
+        self._connecting = True
+        Gio.DBusProxy.new_for_bus(
+            self.bus_type, Gio.DBusProxyFlags.DO_NOT_LOAD_PROPERTIES, None,
+            self.BUS_NAME, self.MANAGER_PATH, self.MANAGER_IFACE, None,
+            self._on_proxy_ready
+        )
+
+    def _on_proxy_ready(self, source, result):
+        try:
+            self.proxy = Gio.DBusProxy.new_for_bus_finish(result)
+            self.proxy.connect("g-signal", self._on_manager_signal)
+            # Job and unit signals are only emitted while at least one client is subscribed
+            self.proxy.call("Subscribe", None, Gio.DBusCallFlags.NONE, -1, None, None)
+        except GLib.Error as e:
+            self.error = e.message
+            print(f"[ERROR] Failed to connect to systemd: {e.message}")
+
+        self._connecting = False
+        waiting, self._waiting = self._waiting, []
+        for callback in waiting:
+            callback(self.proxy)
+
+    def _on_manager_signal(self, proxy, sender, signal, params):
+        if signal == "JobRemoved":
+            job_id, job_path, unit, result = params.unpack()
+            callback = self._jobs.pop(job_path, None)
+            if callback:
+                callback(result == "done", result)
+
+    # --- Queries ---
+
+    def load_units(self, services, callback):
+        """Batch-load state and accounting for services; callback(states, error).
+
+        ListUnitsByNames returns every unit in one call, the per-unit memory,
+        CPU and uptime values are then requested in a single pipelined burst.
+        """
+        names = [self.unit_name(s) for s in services]
+
+        def on_proxy(proxy):
+            if proxy is None:
+                callback(None, self.error)
+                return
+            proxy.call(
+                "ListUnitsByNames", GLib.Variant("(as)", (names,)),
+                Gio.DBusCallFlags.NONE, -1, None, on_listed
+            )
+
+        def on_listed(proxy, result):
+            try:
+                (rows,) = proxy.call_finish(result).unpack()
+            except GLib.Error as e:
+                callback(None, e.message)
+                return
+
+            by_name = {row[0]: row for row in rows}
+            states = {}
+            for service, name in zip(services, names):
+                row = by_name.get(name)
+                if not row:
+                    continue
+                states[service] = {
+                    "Description": row[1], "LoadState": row[2],
+                    "ActiveState": row[3], "SubState": row[4], "path": row[6],
+                    "ActiveEnterTimestamp": None, "MemoryCurrent": None, "CPUUsageNSec": None,
+                }
+            self._load_details(states, callback)
+
+        self.with_proxy(on_proxy)
+
+    def _detail_props(self, service, state):
+        if state["LoadState"] != "loaded":
+            return []
+        props = [(self.UNIT_IFACE, "ActiveEnterTimestamp")]
+        if self.unit_name(service).endswith(".service"):
+            props += [(self.SERVICE_IFACE, "MemoryCurrent"), (self.SERVICE_IFACE, "CPUUsageNSec")]
+        return props
+
+    def _load_details(self, states, callback):
+        pending = [len(states)]
+
+        def on_unit_done(service, values):
+            states[service].update(values)
+            pending[0] -= 1
+            if pending[0] == 0:
+                callback(states, None)
+
+        if not states:
+            callback(states, None)
+            return
+        for service, state in states.items():
+            self._fetch_properties(
+                state["path"], self._detail_props(service, state),
+                lambda values, s=service: on_unit_done(s, values)
+            )
+
+    def _fetch_properties(self, path, props, callback):
+        """Get several properties of one object concurrently; callback({name: value})."""
+        values = {}
+        pending = [len(props)]
+        if not props:
+            callback(values)
+            return
+
+        def on_value(conn, result, prop):
+            try:
+                (value,) = conn.call_finish(result).unpack()
+                values[prop] = None if value == self.UINT64_MAX else value
+            except GLib.Error:
+                values[prop] = None
+            pending[0] -= 1
+            if pending[0] == 0:
+                callback(values)
+
+        connection = self.proxy.get_connection()
+        for iface, prop in props:
+            connection.call(
+                self.BUS_NAME, path, "org.freedesktop.DBus.Properties", "Get",
+                GLib.Variant("(ss)", (iface, prop)), GLib.VariantType("(v)"),
+                Gio.DBusCallFlags.NONE, -1, None, on_value, prop
+            )
+
+    # --- Live updates ---
+
+    def watch_units(self, services, callback):
+        """Keep unit states current from PropertiesChanged signals; callback(service, state).
+
+        A single match rule covers every unit object, so the cost does not grow
+        with the number of watched units and nothing is polled. The state is
+        None if systemd is unreachable.
+        """
+        self._watched = {}
+        self._watch_callback = callback
+
+        def on_loaded(states, error):
+            if states is None:
+                for service in services:
+                    callback(service, None)
+                return
+
+            for service, state in states.items():
+                self._watched[state["path"]] = (service, state)
+                callback(service, state)
+
+            if self._watch_subscription is None:
+                self._watch_subscription = self.proxy.get_connection().signal_subscribe(
+                    self.BUS_NAME, "org.freedesktop.DBus.Properties", "PropertiesChanged",
+                    None, self.UNIT_IFACE, Gio.DBusSignalFlags.NONE, self._on_properties_changed
+                )
+
+        self.load_units(services, on_loaded)
+
+    def _on_properties_changed(self, conn, sender, path, iface, signal, params):
+        entry = self._watched.get(path)
+        if entry is None:
+            return
+
+        service, state = entry
+        changed_iface, changed, invalidated = params.unpack()
+        for key in ("LoadState", "ActiveState", "SubState", "ActiveEnterTimestamp"):
+            if key in changed:
+                state[key] = changed[key]
+
+        # Accounting values don't emit change signals, refresh them along with the state
+        props = [p for p in self._detail_props(service, state) if p[1] not in changed]
+
+        def on_values(values):
+            state.update(values)
+            if self._watch_callback and self._watched.get(path) is entry:
+                self._watch_callback(service, state)
+
+        self._fetch_properties(path, props, on_values)
+
+    # --- Control ---
+
+    def _queue_job(self, method, service, callback):
+        def on_proxy(proxy):
+            if proxy is None:
+                callback(False, self.error)
+                return
+            proxy.call(
+                method, GLib.Variant("(ss)", (self.unit_name(service), "replace")),
+                Gio.DBusCallFlags.ALLOW_INTERACTIVE_AUTHORIZATION, self.AUTH_TIMEOUT_MS,
+                None, on_queued
+            )
+
+        def on_queued(proxy, result):
+            try:
+                (job_path,) = proxy.call_finish(result).unpack()
+            except GLib.Error as e:
+                callback(False, e.message)
+                return
+            # Finished when systemd emits JobRemoved for this job
+            self._jobs[job_path] = callback
+
+        self.with_proxy(on_proxy)
+
+    def restart_unit(self, service, callback):
+        self._queue_job("RestartUnit", service, callback)
+
+    def start_unit(self, service, callback):
+        self._queue_job("StartUnit", service, callback)
+
+    def stop_unit(self, service, callback):
+        self._queue_job("StopUnit", service, callback)
+
+    def reload_daemon(self, callback):
+        """Equivalent of 'systemctl daemon-reload'; callback(ok, error)."""
+        def on_proxy(proxy):
+            if proxy is None:
+                callback(False, self.error)
+                return
+            proxy.call(
+                "Reload", None, Gio.DBusCallFlags.ALLOW_INTERACTIVE_AUTHORIZATION,
+                self.AUTH_TIMEOUT_MS, None, on_done
+            )
+
+        def on_done(proxy, result):
+            try:
+                proxy.call_finish(result)
+                callback(True, None)
+            except GLib.Error as e:
+                callback(False, e.message)
+
+        self.with_proxy(on_proxy)
+
+
+# ==============================
+# JOB RUNNER
+# ==============================
+
+class Job:
+    """A command run by JobRunner, with a ring-buffered output log."""
+
+    def __init__(self, job_id, title, argv, max_lines, can_cancel=True):
+        self.id = job_id
+        self.title = title
+        self.argv = argv
+        self.can_cancel = can_cancel # False once running for commands the user can't signal
+        self.cancel_requested = False
+        self.lines = collections.deque(maxlen=max_lines)
+        self.dropped_lines = 0
+        self.status = "queued" # queued, running, done, failed, cancelled
+        self.exit_status = None
+        self.started = None
+        self.finished = None
+        self.process = None
+        self.cancellable = Gio.Cancellable()
+        self.callbacks = []
+        self._open_streams = 0
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+    def append_line(self, line):
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped_lines += 1
+        self.lines.append(line)
+
+
+class JobRunner:
+    """Runs commands with Gio.Subprocess, streaming their output and tracking results.
+
+    At most max_concurrent jobs run at once, the rest wait in a FIFO queue.
+    Listeners are called on the main loop as listener(job, event, data) with
+    event "added", "started", "line" (data is the line), "cancelling" or
+    "finished".
+
+    Each job runs in its own process group, so cancelling also stops the
+    children of shell commands. pkexec jobs run as root and can't be signalled
+    by the user; they are only cancellable while still queued.
+    """
+
+    MAX_FINISHED_JOBS = 50
+    MAX_HISTORY = 20
+    # SIGTERM first so package managers can release their locks, then SIGKILL
+    KILL_DELAY = 5
+
+    def __init__(self, max_concurrent=3, max_lines=2000, history_path=None):
+        self.max_concurrent = max_concurrent
+        self.max_lines = max_lines
+        self.history_path = history_path or os.path.join(CACHE_DIR, "job_history.json")
+        self.jobs = []
+        self.listeners = []
+        self._queue = collections.deque()
+        self._running = 0
+        self._next_id = 1
+        self.history = self._load_history()
+
+    def submit(self, title, argv, callback=None, can_cancel=None):
+        """Queue argv for execution; callback(job) runs once it has finished.
+
+        can_cancel defaults to False for pkexec commands.
+        """
+        if can_cancel is None:
+            can_cancel = os.path.basename(argv[0]) != "pkexec"
+        job = Job(self._next_id, title, list(argv), self.max_lines, can_cancel)
+        self._next_id += 1
+        if callback:
+            job.callbacks.append(callback)
+
+        self.jobs.append(job)
+        self._prune()
+        self._queue.append(job)
+        self._notify(job, "added")
+        self._start_queued()
+        return job
+
+    def cancel(self, job):
+        if job.status == "queued":
+            self._queue.remove(job)
+            job.status = "cancelled"
+            self._finish(job)
+        elif job.status == "running" and job.can_cancel and not job.cancel_requested:
+            # Reported as cancelled once the process has actually exited
+            job.cancel_requested = True
+            self._signal(job, signal.SIGTERM)
+            GLib.timeout_add_seconds(self.KILL_DELAY, self._signal, job, signal.SIGKILL)
+            self._notify(job, "cancelling")
+
+    def _signal(self, job, signum):
+        pid = job.process.get_identifier() if job.process else None
+        if pid:
+            try:
+                os.killpg(int(pid), signum)
+            except (ProcessLookupError, PermissionError):
+                pass
+        return False
+
+    def average_duration(self, title):
+        durations = self.history.get(title)
+        return sum(durations) / len(durations) if durations else None
+
+    # --- Execution ---
+
+    def _start_queued(self):
+        while self._queue and self._running < self.max_concurrent:
+            self._start(self._queue.popleft())
+
+    def _start(self, job):
+        job.status = "running"
+        job.started = time.monotonic()
+        self._running += 1
+        self._notify(job, "started")
+
+        try:
+            # setsid makes the job a process group leader, see cancel()
+            job.process = Gio.Subprocess.new(
+                ["setsid", *job.argv], Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_PIPE
+            )
+        except GLib.Error as e:
+            job.append_line(f"Failed to start {job.argv[0]}: {e.message}")
+            self._notify(job, "line", job.lines[-1])
+            job.status = "failed"
+            self._running -= 1
+            self._finish(job)
+            self._start_queued()
+            return
+
+        # Finished once the process exited and both pipes hit EOF
+        job._open_streams = 3
+        for pipe in (job.process.get_stdout_pipe(), job.process.get_stderr_pipe()):
+            stream = Gio.DataInputStream.new(pipe)
+            stream.read_line_async(GLib.PRIORITY_DEFAULT, job.cancellable, self._on_line, job)
+        job.process.wait_async(None, self._on_exit, job)
+
+    def _on_line(self, stream, result, job):
+        try:
+            data, length = stream.read_line_finish(result)
+        except GLib.Error:
+            data = None
+
+        if data is None:
+            self._stream_done(job)
+            return
+
+        # Progress bars redraw with carriage returns, only keep the final state
+        line = data.decode("utf-8", "replace").rsplit("\r", 1)[-1]
+        job.append_line(line)
+        self._notify(job, "line", line)
+        stream.read_line_async(GLib.PRIORITY_DEFAULT, job.cancellable, self._on_line, job)
+
+    def _on_exit(self, process, result, job):
+        try:
+            process.wait_finish(result)
+        except GLib.Error:
+            pass
+        if process.get_if_exited():
+            job.exit_status = process.get_exit_status()
+        if job.cancel_requested and job.exit_status != 0:
+            job.status = "cancelled"
+            # A detached child may still hold the pipes open
+            job.cancellable.cancel()
+        else:
+            job.status = "done" if job.exit_status == 0 else "failed"
+        self._stream_done(job)
+
+    def _stream_done(self, job):
+        job._open_streams -= 1
+        if job._open_streams == 0:
+            self._running -= 1
+            self._finish(job)
+            self._start_queued()
+
+    def _finish(self, job):
+        job.finished = time.monotonic()
+        if job.status == "done":
+            durations = self.history.setdefault(job.title, [])
+            durations.append(round(job.duration, 3))
+            del durations[:-self.MAX_HISTORY]
+            self._save_history()
+
+        self._notify(job, "finished")
+        for callback in job.callbacks:
+            callback(job)
+
+    def _notify(self, job, event, data=None):
+        for listener in self.listeners:
+            listener(job, event, data)
+
+    def _prune(self):
+        finished = [j for j in self.jobs if j.finished is not None]
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            self.jobs.remove(job)
+            self._notify(job, "removed")
+
+    # --- Duration history ---
+
+    def _load_history(self):
+        try:
+            with open(self.history_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_history(self):
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            with open(self.history_path, "w") as f:
+                json.dump(self.history, f)
+        except OSError as e:
+            print(f"[ERROR] Failed to save job history: {e}")
+
+
+class TaskGraph:
+    """Runs JobRunner jobs as a dependency graph with exclusive resource locks.
+
+    A task starts as soon as all of its dependencies succeeded and none of its
+    locks (for example "pkgdb" for the package manager) is held by another
+    running task. Dependents of a failed task are skipped, independent tasks
+    keep going. Listeners are called as listener(graph, task) on every status
+    change, and once more with task=None when the whole graph has finished.
+    """
+
+    def __init__(self, runner, title):
+        self.runner = runner
+        self.title = title
+        self.tasks = {}
+        self.listeners = []
+        self.held_locks = set()
+        self.started = None
+        self.finished = None
+        self.critical_path = []
+        self._callback = None
+
+    def add(self, name, title, argv, deps=(), locks=(), can_cancel=None):
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"Unknown dependency '{dep}' for task '{name}'")
+        self.tasks[name] = {
+            "name": name, "title": title, "argv": argv,
+            "deps": list(deps), "locks": set(locks), "can_cancel": can_cancel,
+            "status": "pending", "job": None,
+        }
+        return name
+
+    def run(self, callback=None):
+        """Start the graph; callback(graph) runs when every task is done, failed or skipped."""
+        self._callback = callback
+        self.started = time.monotonic()
+        self._schedule()
+
+    @property
+    def done_count(self):
+        return sum(1 for t in self.tasks.values() if t["status"] not in ("pending", "running"))
+
+    @property
+    def failed_tasks(self):
+        return [t for t in self.tasks.values() if t["status"] in ("failed", "cancelled", "skipped")]
+
+    def _schedule(self):
+        changed = True
+        while changed:
+            changed = False
+            for task in self.tasks.values():
+                if task["status"] != "pending":
+                    continue
+                dep_states = [self.tasks[d]["status"] for d in task["deps"]]
+                if any(state in ("failed", "cancelled", "skipped") for state in dep_states):
+                    task["status"] = "skipped"
+                    changed = True
+                    self._notify(task)
+                elif all(state == "done" for state in dep_states) and not task["locks"] & self.held_locks:
+                    self.held_locks |= task["locks"]
+                    task["status"] = "running"
+                    task["job"] = self.runner.submit(
+                        task["title"], task["argv"], lambda job, t=task: self._on_job_done(t, job), task["can_cancel"]
+                    )
+                    self._notify(task)
+
+        if self.finished is None and all(t["status"] not in ("pending", "running") for t in self.tasks.values()):
+            self.finished = time.monotonic()
+            self.critical_path = self._compute_critical_path()
+            self._notify(None)
+            if self._callback:
+                self._callback(self)
+        return False
+
+    def _on_job_done(self, task, job):
+        self.held_locks -= task["locks"]
+        task["status"] = job.status
+        self._notify(task)
+        # Reschedule outside the job callback, submit() may finish jobs synchronously
+        GLib.idle_add(self._schedule)
+
+    def _compute_critical_path(self):
+        """Walk back from the last task to finish through whatever it waited for.
+
+        A task waits either for its dependencies or for a task holding one of its
+        locks; the predecessor that finished last is the one that bounded it.
+        """
+        ran = [t for t in self.tasks.values() if t["job"] and t["job"].started is not None]
+        if not ran:
+            return []
+
+        current = max(ran, key=lambda t: t["job"].finished)
+        path = [current]
+        while True:
+            start = current["job"].started
+            preds = [self.tasks[d] for d in current["deps"]]
+            preds += [t for t in ran if t is not current and t["locks"] & current["locks"]]
+            preds = [t for t in preds if t in ran and t["job"].finished <= start + 0.05]
+            if not preds:
+                break
+            current = max(preds, key=lambda t: t["job"].finished)
+            path.append(current)
+        return list(reversed(path))
+
+    def _notify(self, task):
+        for listener in self.listeners:
+            listener(self, task)
+
+
+# ==============================
+# CONFIG VARIANTS
+# ==============================
+
+class ConfigVariantStore:
+    """Switches config files between shipped variants, keeping deduplicated backups.
+
+    Backups are stored once per SHA-256 under objects/, and each target keeps
+    a list of (hash, time) records pruned to KEEP_BACKUPS. File hashes are
+    cached by (mtime, size, inode), so the current variant is usually found
+    without reading the file.
+    """
+
+    KEEP_BACKUPS = 10
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(DATA_DIR, "config-store")
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.index_path = os.path.join(self.root, "index.json")
+        self.targets = {}
+        self.legacy = {}
+        self.index = self._load_index()
+        self._index_dirty = False
+
+    def register(self, name, target, variants, legacy=None):
+        """variants maps a variant name to the file holding its content.
+
+        legacy maps a variant name to the SHA-256 of earlier shipped versions,
+        so targets written by an older release still count as that variant.
+        """
+        self.targets[name] = (os.path.expanduser(target), variants)
+        self.legacy[name] = legacy or {}
+
+    def target(self, name):
+        return self.targets[name][0]
+
+    def file_hash(self, path):
+        """SHA-256 of a file, from the index when its stat signature is unchanged.
+
+        None when the file is missing or unreadable. New hashes are written out
+        by the calling public method, once.
+        """
+        try:
+            st = os.stat(path)
+            signature = [st.st_mtime_ns, st.st_size, st.st_ino]
+            cached = self.index["hashes"].get(path)
+            if cached and cached["stat"] == signature:
+                return cached["hash"]
+
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        self.index["hashes"][path] = {"stat": signature, "hash": digest.hexdigest()}
+        self._index_dirty = True
+        return digest.hexdigest()
+
+    def current(self, name):
+        """Name of the variant the target currently matches, or None."""
+        try:
+            return self._match(name)
+        finally:
+            self._flush_index()
+
+    def _match(self, name):
+        target, variants = self.targets[name]
+        current = self.file_hash(target)
+        if current is None:
+            return None
+        for variant, source in variants.items():
+            if self.file_hash(source) == current or current in self.legacy[name].get(variant, ()):
+                return variant
+        return None
+
+    def apply(self, name, variant):
+        """Atomically replace the target with a variant; returns the previous content."""
+        target, variants = self.targets[name]
+        with open(variants[variant], "rb") as f:
+            content = f.read()
+        return self._write(name, target, content)
+
+    def backups(self, name):
+        """Backup records ({"hash", "time"}) of a target, oldest first."""
+        return list(self.index["backups"].get(self.target(name), []))
+
+    def restore(self, name, digest):
+        """Put a backed-up version back in place; returns the previous content."""
+        with open(os.path.join(self.objects_dir, digest), "rb") as f:
+            content = f.read()
+        return self._write(name, self.target(name), content)
+
+    def _write(self, name, target, content):
+        try:
+            return self._replace(name, target, content)
+        finally:
+            self._flush_index()
+
+    def _replace(self, name, target, content):
+        previous = b""
+        mode = 0o644
+        if os.path.exists(target):
+            with open(target, "rb") as f:
+                previous = f.read()
+            mode = stat.S_IMODE(os.stat(target).st_mode)
+            # Shipped variants can be recreated at any time, only back up other content
+            if self._match(name) is None:
+                self._backup(target, previous)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        self.file_hash(target)
+        return previous
+
+    def _backup(self, target, content):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = os.path.join(self.objects_dir, digest)
+        if not os.path.exists(object_path):
+            os.makedirs(self.objects_dir, exist_ok=True)
+            tmp_path = f"{object_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, object_path)
+
+        records = [r for r in self.index["backups"].get(target, []) if r["hash"] != digest]
+        records.append({"hash": digest, "time": time.time()})
+        self.index["backups"][target] = records[-self.KEEP_BACKUPS:]
+        self._prune()
+        self._index_dirty = True
+        print(f"[INFO] Backed up {target} as {digest[:12]}")
+
+    def _prune(self):
+        """Delete objects no target references any more."""
+        referenced = {r["hash"] for records in self.index["backups"].values() for r in records}
+        try:
+            for digest in os.listdir(self.objects_dir):
+                if digest not in referenced:
+                    os.unlink(os.path.join(self.objects_dir, digest))
+        except OSError:
+            pass
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("hashes", {})
+        index.setdefault("backups", {})
+        return index
+
+    def _flush_index(self):
+        if self._index_dirty:
+            self._index_dirty = False
+            self._save_index()
+
+    def _save_index(self):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"[ERROR] Failed to write config store index: {e}")
+
+
+# ==============================
+# HYPRLAND IPC
+# ==============================
+
+class HyprlandIPC:
+    """Minimal client for Hyprland's request socket (what hyprctl talks to).
+
+    Pass socket_path to point it at something else, e.g. a fake server.
+    """
+
+    # Keywords that may appear many times; only monitor lines can be applied one by one
+    REPEATABLE = ("monitor", "bind", "gesture", "exec", "source", "windowrule", "layerrule", "workspace", "env")
+    # bind takes flag letters (bindel, bindm), exec and windowrule have variants (exec-once, windowrulev2)
+    REPEATABLE_VARIANT_RE = re.compile(r"^(bind[a-z]+|execr|execr?-(once|shutdown)|windowrulev2)$")
+
+    def __init__(self, socket_path=None, timeout=2.0):
+        self.socket_path = socket_path or self.default_socket_path()
+        self.timeout = timeout
+
+    @staticmethod
+    def default_socket_path():
+        signature = os.environ.get("HYPRLAND_INSTANCE_SIGNATURE")
+        if not signature:
+            return None
+        runtime = os.environ.get("XDG_RUNTIME_DIR") or GLib.get_user_runtime_dir()
+        path = os.path.join(runtime, "hypr", signature, ".socket.sock")
+        # Hyprland < 0.40 kept its sockets in /tmp
+        return path if os.path.exists(path) else os.path.join("/tmp/hypr", signature, ".socket.sock")
+
+    def available(self):
+        return bool(self.socket_path) and os.path.exists(self.socket_path)
+
+    def request(self, command):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall(command.encode())
+            chunks = []
+            while True:
+                chunk = sock.recv(8192)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            sock.close()
+        return b"".join(chunks).decode(errors="replace")
+
+    def batch(self, commands):
+        """Run several commands in one request; returns the (command, reply) pairs that failed.
+
+        Hyprland separates the replies with a blank line, older versions just
+        concatenated them, which is only unambiguous when every reply is "ok".
+        """
+        reply = self.request("[[BATCH]]" + ";".join(commands)).strip()
+        replies = [r.strip() for r in reply.split("\n\n")]
+        if len(replies) != len(commands) and reply == "ok" * len(commands):
+            replies = ["ok"] * len(commands)
+        if len(replies) != len(commands):
+            return [(command, reply) for command in commands]
+        return [(command, r) for command, r in zip(commands, replies) if r != "ok"]
+
+    def reload(self):
+        return self.request("reload").strip() == "ok"
+
+    @staticmethod
+    def parse_config(text):
+        """Ordered (key, value) pairs, with sections flattened to "section:key"."""
+        pairs = []
+        sections = []
+        for raw in text.splitlines():
+            # "##" is an escaped "#", a single "#" starts a comment
+            line = re.split(r"(?<!#)#(?!#)", raw, 1)[0].replace("##", "#").strip()
+            if not line:
+                continue
+            if line.endswith("{"):
+                sections.append(line[:-1].strip())
+                continue
+            if line == "}":
+                if sections:
+                    sections.pop()
+                continue
+            if "{" in line or "}" in line:
+                raise ValueError(f"Unsupported config line: {raw}")
+            key, sep, value = line.partition("=")
+            if sep:
+                pairs.append((":".join(sections + [key.strip()]), value.strip()))
+        return pairs
+
+    @classmethod
+    def is_repeatable(cls, key):
+        """Exact keyword match: section options such as binds:... or gestures:... are single."""
+        return key in cls.REPEATABLE or bool(cls.REPEATABLE_VARIANT_RE.match(key))
+
+    @classmethod
+    def keyword_diff(cls, old_text, new_text):
+        """Keyword commands turning old_text's settings into new_text's, or None if a reload is needed."""
+        try:
+            old_pairs, new_pairs = cls.parse_config(old_text), cls.parse_config(new_text)
+        except ValueError:
+            return None
+        commands = []
+
+        old_single = {k: v for k, v in old_pairs if not cls.is_repeatable(k) and not k.startswith("$")}
+        new_single = {k: v for k, v in new_pairs if not cls.is_repeatable(k) and not k.startswith("$")}
+        if set(old_single) - set(new_single):
+            # A removed option cannot be reset to its default by keyword
+            return None
+        for key, value in new_single.items():
+            if old_single.get(key) != value:
+                commands.append(f"keyword {key} {value}")
+
+        # Binds, rules, variables etc. can only be replaced as a whole by a reload
+        def repeated(pairs):
+            return [p for p in pairs if (cls.is_repeatable(p[0]) or p[0].startswith("$")) and p[0] != "monitor"]
+        if repeated(old_pairs) != repeated(new_pairs):
+            return None
+
+        # Monitor rules are keyed by output name
+        old_monitors = {v.split(",")[0].strip(): v for k, v in old_pairs if k == "monitor"}
+        new_monitors = {v.split(",")[0].strip(): v for k, v in new_pairs if k == "monitor"}
+        if set(old_monitors) - set(new_monitors):
+            return None
+        for name, value in new_monitors.items():
+            if old_monitors.get(name) != value:
+                commands.append(f"keyword monitor {value}")
+
+        if any(";" in c for c in commands):
+            # ";" separates batch commands
+            return None
+        return commands
+
+
+# ==============================
+# MANGOHUD LOG ANALYSIS
+# ==============================
+
+class FrametimeLog:
+    """A MangoHud CSV log loaded into NumPy columns.
+
+    Files are read in chunks of CHUNK_BYTES and only the columns we plot are
+    kept (as float32), so logs of several hundred MB stay manageable.
+    """
+
+    CHUNK_BYTES = 8 * 1024 * 1024
+    COLUMNS = ("frametime", "cpu_load", "gpu_load")
+    STUTTER_WINDOW = 60
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.frametime = columns["frametime"]
+        self.cpu_load = columns.get("cpu_load")
+        self.gpu_load = columns.get("gpu_load")
+        # Frame end times in seconds, independent of the elapsed column's unit
+        self.time = np.cumsum(self.frametime, dtype=np.float64) / 1000.0
+        self._stutters = None
+
+    @staticmethod
+    def default_folder(config_paths):
+        """output_folder from the first config that sets one, else our default location."""
+        for path in config_paths:
+            try:
+                with open(os.path.expanduser(path)) as f:
+                    for line in f:
+                        key, sep, value = line.partition("=")
+                        if sep and key.strip() == "output_folder":
+                            return os.path.expanduser(value.strip())
+            except OSError:
+                continue
+        return os.path.expanduser("~/.local/share/MangoHud/logs")
+
+    @staticmethod
+    def list_logs(folder):
+        try:
+            names = [n for n in os.listdir(folder) if n.endswith(".csv") and not n.endswith("_summary.csv")]
+        except OSError:
+            return []
+        paths = [os.path.join(folder, n) for n in names]
+        return sorted(paths, key=lambda p: os.path.getmtime(p), reverse=True)
+
+    @classmethod
+    def load(cls, path, progress=None):
+        """Parse a log; progress(fraction) is called from the loading thread."""
+        total = max(1, os.path.getsize(path))
+        chunks = {name: [] for name in cls.COLUMNS}
+
+        with open(path, "r", errors="replace") as f:
+            # Newer logs start with a system info block; the frame header names "frametime"
+            header = None
+            read = 0
+            for line in iter(f.readline, ""):
+                read += len(line)
+                fields = [c.strip() for c in line.split(",")]
+                if "frametime" in fields:
+                    header = fields
+                    break
+            if header is None:
+                raise ValueError("Not a MangoHud frametime log")
+
+            wanted = [name for name in cls.COLUMNS if name in header]
+            usecols = [header.index(name) for name in wanted]
+            while True:
+                lines = f.readlines(cls.CHUNK_BYTES)
+                if not lines:
+                    break
+                try:
+                    block = np.loadtxt(lines, delimiter=",", usecols=usecols, dtype=np.float32, ndmin=2)
+                except ValueError:
+                    # A truncated last line (game still running) or junk: parse row by row, drop what fails
+                    rows = []
+                    for line in lines:
+                        fields = line.split(",")
+                        try:
+                            rows.append([float(fields[i]) for i in usecols])
+                        except (ValueError, IndexError):
+                            continue
+                    block = np.array(rows, dtype=np.float32) if rows else None
+                if block is not None and len(block):
+                    for i, name in enumerate(wanted):
+                        chunks[name].append(block[:, i])
+                read += sum(map(len, lines))
+                if progress:
+                    progress(min(1.0, read / total))
+
+        columns = {name: np.concatenate(parts) for name, parts in chunks.items() if parts}
+        if "frametime" not in columns or not len(columns["frametime"]):
+            raise ValueError("The log contains no frames")
+        return cls(path, columns)
+
+    def stutters(self):
+        """Indexes of frames much slower than the frames around them (computed once per log)."""
+        if self._stutters is None:
+            ft = self.frametime.astype(np.float64)
+            window = min(self.STUTTER_WINDOW, len(ft))
+            # Divide by the frames actually in the window, the zero padding would halve the average at the ends
+            kernel = np.ones(window)
+            moving = np.convolve(ft, kernel, mode="same") / np.convolve(np.ones_like(ft), kernel, mode="same")
+            self._stutters = np.nonzero((ft > 2.0 * moving) & (ft - moving > 8.0))[0]
+        return self._stutters
+
+    def stats(self):
+        ft = self.frametime.astype(np.float64)
+        sorted_ft = np.sort(ft)
+        n = len(sorted_ft)
+
+        def low(fraction):
+            # Average FPS over the slowest `fraction` of frames
+            worst = sorted_ft[-max(1, int(n * fraction)):]
+            return float(1000.0 / worst.mean())
+
+        p50, p90, p95, p99, p999 = map(float, np.percentile(sorted_ft, [50, 90, 95, 99, 99.9]))
+        stutters = self.stutters()
+        result = {
+            "frames": n,
+            "duration": float(self.time[-1]),
+            "avg_fps": n / float(self.time[-1]) if self.time[-1] > 0 else 0.0,
+            "low_1": low(0.01),
+            "low_01": low(0.001),
+            "p50": p50, "p90": p90, "p95": p95, "p99": p99, "p999": p999,
+            "max_ft": float(sorted_ft[-1]),
+            "stutters": len(stutters),
+        }
+        if self.cpu_load is not None:
+            result["cpu_load"] = float(self.cpu_load.mean())
+        if self.gpu_load is not None:
+            result["gpu_load"] = float(self.gpu_load.mean())
+        return result
+
+    def fps_per_second(self):
+        """Frames completed in each whole second of the log."""
+        counts = np.bincount(self.time.astype(np.int64))
+        # The last second is usually partial
+        return counts[:-1].astype(np.float64) if len(counts) > 1 else counts.astype(np.float64)
+
+    def envelope(self, values, buckets):
+        """Per-bucket (min, max, mean) for plotting at a given width."""
+        buckets = max(1, min(buckets, len(values)))
+        edges = np.linspace(0, len(values), buckets + 1).astype(np.int64)[:-1]
+        counts = np.diff(np.append(edges, len(values)))
+        return (np.minimum.reduceat(values, edges), np.maximum.reduceat(values, edges),
+                np.add.reduceat(values.astype(np.float64), edges) / counts)
+
+
+class BenchmarkStore:
+    """Benchmark runs, one directory each under the data dir.
+
+    A run directory holds the MangoHud log and run.json with the settings,
+    the FrametimeLog stats, per-second FPS and the system samples taken
+    while it ran.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(DATA_DIR, "benchmarks")
+
+    def new_run_dir(self):
+        run_dir = os.path.join(self.root, datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(run_dir, exist_ok=True)
+        return run_dir
+
+    def runs(self):
+        """All stored runs, newest first."""
+        result = []
+        try:
+            names = sorted(os.listdir(self.root), reverse=True)
+        except OSError:
+            return result
+        for name in names:
+            try:
+                with open(os.path.join(self.root, name, "run.json")) as f:
+                    run = json.load(f)
+            except (OSError, ValueError):
+                continue
+            run["dir"] = os.path.join(self.root, name)
+            result.append(run)
+        return result
+
+    def save(self, run_dir, run):
+        tmp_path = os.path.join(run_dir, "run.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(run, f)
+        os.replace(tmp_path, os.path.join(run_dir, "run.json"))
+
+    def delete(self, run):
+        shutil.rmtree(run["dir"], ignore_errors=True)
+
+    @staticmethod
+    def compare(base, other):
+        """Welch's t-test on per-second FPS of two runs.
+
+        Returns the mean difference (other - base), its 95% confidence
+        half-width and a two-sided p-value (normal approximation, fine for
+        runs of 30 s and longer).
+        """
+        a, b = base.get("fps_series") or [], other.get("fps_series") or []
+        if len(a) < 2 or len(b) < 2:
+            return None
+        mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+        var_a = sum((x - mean_a) ** 2 for x in a) / (len(a) - 1)
+        var_b = sum((x - mean_b) ** 2 for x in b) / (len(b) - 1)
+        se = math.sqrt(var_a / len(a) + var_b / len(b))
+        diff = mean_b - mean_a
+        if se == 0:
+            return {"diff": diff, "ci95": 0.0, "p": 0.0 if diff else 1.0}
+        return {"diff": diff, "ci95": 1.96 * se, "p": math.erfc(abs(diff / se) / math.sqrt(2))}
+
+
+# ==============================
+# NETWORK PROBES
+# ==============================
+
+class AsyncioLoopThread:
+    """A single asyncio event loop on a daemon thread, shared by the network probes."""
+
+    _instance = None
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True, name="asyncio").start()
+
+    def submit(self, coro):
+        """Schedule a coroutine; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+class ProbeStats:
+    """Rolling RTT window, all-time histogram and RFC 3550 style jitter for one target."""
+
+    BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+    def __init__(self, window=120):
+        self.rtts = collections.deque(maxlen=window)
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+        self.jitter = 0.0
+        self._last = None
+
+    def add(self, rtt):
+        self.rtts.append(rtt)
+        if rtt is None:
+            return
+        self.histogram[bisect.bisect_left(self.BUCKETS, rtt)] += 1
+        if self._last is not None:
+            self.jitter += (abs(rtt - self._last) - self.jitter) / 16
+        self._last = rtt
+
+    def summary(self):
+        received = sorted(r for r in self.rtts if r is not None)
+        if not self.rtts:
+            return None
+        result = {"loss": 1 - len(received) / len(self.rtts), "jitter": self.jitter}
+        if received:
+            result["avg"] = sum(received) / len(received)
+            result["p95"] = received[min(len(received) - 1, int(len(received) * 0.95))]
+        return result
+
+
+class LatencyProber:
+    """Probes every target concurrently once per INTERVAL on the shared asyncio loop.
+
+    Targets are "icmp HOST", "tcp HOST:PORT" or "udp HOST:PORT". ICMP uses
+    an unprivileged datagram socket (net.ipv4.ping_group_range), UDP port 53
+    sends a DNS query and any other UDP port expects an echo.
+    callback([(target, rtt_ms or None), ...]) runs on the main loop.
+    """
+
+    INTERVAL = 1.0
+    TIMEOUT = 2.0
+
+    def __init__(self, targets, callback):
+        self.targets = targets
+        self.callback = callback
+        self.future = None
+        # Last error per target label, for targets that never answer
+        self.errors = {}
+        self._addresses = {}
+
+    @staticmethod
+    def parse_target(text):
+        kind, _, rest = text.strip().partition(" ")
+        kind, rest = kind.lower(), rest.strip()
+        if kind not in ("icmp", "tcp", "udp") or not rest:
+            raise ValueError(f"Invalid probe target: {text!r}")
+        port = None
+        if kind != "icmp":
+            host, _, port = rest.rpartition(":")
+            rest, port = host.strip("[]"), int(port)
+        return {"label": text.strip(), "kind": kind, "host": rest, "port": port}
+
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    def start(self):
+        if not self.running():
+            self.future = AsyncioLoopThread.get().submit(self._run())
+
+    def stop(self):
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        while True:
+            started = loop.time()
+            rtts = await asyncio.gather(*(self._probe(t, seq) for t in self.targets))
+            GLib.idle_add(self.callback, list(zip(self.targets, rtts)))
+            seq = (seq + 1) & 0xFFFF
+            await asyncio.sleep(max(0.0, self.INTERVAL - (loop.time() - started)))
+
+    async def _probe(self, target, seq):
+        try:
+            return await asyncio.wait_for(self._probe_once(target, seq), self.TIMEOUT)
+        except PermissionError:
+            self.errors[target["label"]] = "Not permitted (see net.ipv4.ping_group_range)"
+        except (OSError, ValueError) as e:
+            self.errors[target["label"]] = getattr(e, "strerror", None) or str(e)
+        except asyncio.TimeoutError:
+            pass
+        return None
+
+    async def _address(self, target):
+        # Resolve once so name lookups are not part of the measured RTT
+        if target["label"] not in self._addresses:
+            kind = socket.SOCK_STREAM if target["kind"] == "tcp" else socket.SOCK_DGRAM
+            infos = await asyncio.get_running_loop().getaddrinfo(target["host"], target["port"] or 0, type=kind)
+            self._addresses[target["label"]] = (infos[0][0], infos[0][4])
+        return self._addresses[target["label"]]
+
+    async def _probe_once(self, target, seq):
+        loop = asyncio.get_running_loop()
+        family, address = await self._address(target)
+
+        if target["kind"] == "tcp":
+            started = time.perf_counter()
+            reader, writer = await asyncio.open_connection(address[0], address[1])
+            rtt = (time.perf_counter() - started) * 1000
+            writer.close()
+            return rtt
+
+        if target["kind"] == "udp":
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            if target["port"] == 53:
+                # Query for the root NS records
+                payload = struct.pack("!HHHHHH", seq, 0x0100, 1, 0, 0, 0) + b"\x00" + struct.pack("!HH", 2, 1)
+            else:
+                payload = struct.pack("!H", seq) + b"controlpanel"
+            match = payload[:2]
+        else:
+            proto = socket.IPPROTO_ICMPV6 if family == socket.AF_INET6 else socket.IPPROTO_ICMP
+            sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+            request, reply = (128, 129) if family == socket.AF_INET6 else (8, 0)
+            # The kernel fills in the identifier and checksum for ping sockets
+            payload = struct.pack("!BBHHH", request, 0, 0, 0, seq) + b"controlpanel"
+
+        try:
+            sock.setblocking(False)
+            # Connecting a datagram socket only sets the peer, it never blocks.
+            # (loop.sock_connect would re-resolve with proto=ICMP, which getaddrinfo rejects.)
+            sock.connect(address)
+            started = time.perf_counter()
+            await loop.sock_sendall(sock, payload)
+            while True:
+                data = await loop.sock_recv(sock, 2048)
+                if target["kind"] == "udp":
+                    if data[:2] == match:
+                        break
+                elif len(data) >= 8 and data[0] == reply and struct.unpack("!H", data[6:8])[0] == seq:
+                    break
+            return (time.perf_counter() - started) * 1000
+        finally:
+            sock.close()
+
+
+class PublicIPResolver:
+    """Public IP lookup that races several HTTPS endpoints and takes the first valid answer.
+
+    Runs on the shared asyncio loop and keeps one keep-alive connection per
+    endpoint host. The result is cached in memory and on disk for TTL
+    seconds; invalidate() drops it (and the connections) when routes change.
+    """
+
+    TTL = 600
+    TIMEOUT = 5.0
+    ENDPOINTS = [
+        "https://api.ipify.org/",
+        "https://icanhazip.com/",
+        "https://checkip.amazonaws.com/",
+        "https://ifconfig.me/ip",
+    ]
+
+    def __init__(self, endpoints=None, cache_path=None, ssl_context=None):
+        self.endpoints = endpoints or self.ENDPOINTS
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, "public_ip.json")
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.ip, self.fetched = self._load_cache()
+        self._callbacks = []
+        self._pending = None
+        # Only touched from the asyncio thread
+        self._connections = {}
+
+    def cached(self):
+        """(ip, fresh) from the cache, or (None, False)."""
+        if self.ip is None:
+            return None, False
+        return self.ip, time.time() - self.fetched < self.TTL
+
+    def resolve(self, callback, force=False):
+        """callback(ip, error) on the main loop; answers from the cache while it is fresh."""
+        ip, fresh = self.cached()
+        if fresh and not force:
+            callback(ip, None)
+            return
+        self._callbacks.append(callback)
+        if self._pending is None:
+            self._pending = AsyncioLoopThread.get().submit(self._race())
+            self._pending.add_done_callback(lambda fut: GLib.idle_add(self._on_resolved, fut))
+
+    def invalidate(self):
+        self.fetched = 0
+        loop = AsyncioLoopThread.get().loop
+        loop.call_soon_threadsafe(self._close_connections)
+
+    def _on_resolved(self, future):
+        self._pending = None
+        try:
+            ip, error = future.result(), None
+            self.ip, self.fetched = ip, time.time()
+            self._save_cache()
+        except Exception as e:
+            ip, error = None, str(e) or type(e).__name__
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(ip, error)
+        return False
+
+    async def _race(self):
+        tasks = [asyncio.ensure_future(self._fetch(url)) for url in self.endpoints]
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=self.TIMEOUT):
+                try:
+                    return await next_done
+                except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                    errors.append(str(e))
+        except asyncio.TimeoutError:
+            raise RuntimeError("Timed out")
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise RuntimeError(errors[-1] if errors else "No endpoint answered")
+
+    async def _fetch(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        host, port = parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80)
+        key = (parsed.scheme, host, port)
+
+        reader, writer = self._connections.pop(key, (None, None))
+        if reader is None or reader.at_eof() or writer.is_closing():
+            tls = self.ssl_context if parsed.scheme == "https" else None
+            reader, writer = await asyncio.open_connection(host, port, ssl=tls)
+
+        try:
+            writer.write((f"GET {parsed.path or '/'} HTTP/1.1\r\nHost: {host}\r\n"
+                          "User-Agent: controlpanel\r\nAccept: text/plain\r\nConnection: keep-alive\r\n\r\n").encode())
+            await writer.drain()
+            status = (await reader.readline()).decode(errors="replace").split()
+            if len(status) < 2 or status[1] != "200":
+                raise ValueError(f"{host}: HTTP {' '.join(status[1:]) or 'error'}")
+
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode(errors="replace").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if "content-length" in headers:
+                body = await reader.readexactly(int(headers["content-length"]))
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                body = b""
+                while (size := int((await reader.readline()).split(b";")[0], 16)):
+                    body += await reader.readexactly(size)
+                    await reader.readline()
+                await reader.readline()
+            else:
+                body = await reader.read(256)
+                headers["connection"] = "close"
+        except BaseException:
+            # A half-read response leaves the connection unusable
+            writer.close()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._connections[key] = (reader, writer)
+        # Raises ValueError for anything that is not an address
+        return str(ipaddress.ip_address(body.decode(errors="replace").strip()))
+
+    def _close_connections(self):
+        for reader, writer in self._connections.values():
+            writer.close()
+        self._connections.clear()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            return data["ip"], data["time"]
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "w") as f:
+                json.dump({"ip": self.ip, "time": self.fetched}, f)
+        except OSError as e:
+            print(f"[ERROR] Failed to write public IP cache: {e}")
+
+
+# ==============================
+# PRIVILEGED HELPER CLIENT
+# ==============================
+
+class PrivilegedHelperClient:
+    """Client for helper.py, a root helper started once through pkexec.
+
+    Requests are batches of allow-listed operations sent as one JSON line
+    over a Unix socket. The helper exits by itself after an idle timeout and
+    is started again (one polkit prompt) on the next request.
+    """
+
+    # Includes the time the user needs to answer the polkit prompt
+    START_TIMEOUT = 90
+    REQUEST_TIMEOUT = 300
+
+    def __init__(self, helper_path, socket_path=None):
+        self.helper_path = helper_path
+        self.socket_path = socket_path or os.path.join(GLib.get_user_runtime_dir(), "controlpanel-helper.sock")
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._process = None
+
+    def available(self):
+        return shutil.which("pkexec") is not None and os.path.exists(self.helper_path)
+
+    def client_argv(self, op, args=None):
+        """argv that runs one operation on the already running helper, for JobRunner jobs."""
+        request = json.dumps({"op": op, "args": args or {}})
+        return [sys.executable, self.helper_path, "--socket", self.socket_path, "--request", request]
+
+    def request(self, ops, callback, parallel=False):
+        """Send a batch from a worker thread; callback(results, error) runs on the main loop."""
+        def worker():
+            try:
+                results = self.request_sync(ops, parallel)
+                GLib.idle_add(callback, results, None)
+            except Exception as e:
+                GLib.idle_add(callback, None, str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def request_sync(self, ops, parallel=False, start=True):
+        """Send a batch and wait for the per-operation results (blocking).
+
+        With start=False the request fails instead of starting the helper, for
+        background reads that must never raise a polkit prompt.
+        """
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+
+        sock = self._connect() if start else self._try_connect()
+        if sock is None:
+            raise RuntimeError("The privileged helper is not running")
+        try:
+            sock.settimeout(self.REQUEST_TIMEOUT)
+            with sock.makefile("rwb") as stream:
+                stream.write(json.dumps({"id": request_id, "ops": ops, "parallel": parallel}).encode() + b"\n")
+                stream.flush()
+                line = stream.readline()
+        finally:
+            sock.close()
+
+        if not line:
+            raise RuntimeError("The privileged helper closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["results"]
+
+    def _try_connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            return sock
+        except OSError:
+            sock.close()
+            return None
+
+    def _connect(self):
+        sock = self._try_connect()
+        if sock:
+            return sock
+
+        with self._lock:
+            # Reap a helper that exited after its idle timeout
+            if self._process is not None and self._process.poll() is not None:
+                self._process = None
+            if self._process is None:
+                self._process = subprocess.Popen(
+                    ["pkexec", sys.executable, self.helper_path, "--socket", self.socket_path],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            process = self._process
+
+        deadline = time.monotonic() + self.START_TIMEOUT
+        while time.monotonic() < deadline:
+            sock = self._try_connect()
+            if sock:
+                return sock
+            if process.poll() is not None:
+                raise RuntimeError("Authorization was cancelled or the helper failed to start")
+            time.sleep(0.05)
+        raise RuntimeError("Timed out waiting for the privileged helper")
+
+
+# ==============================
+# DESKTOP ENTRIES
+# ==============================
+
+DESKTOP_ESCAPES = {"s": " ", "n": "\n", "t": "\t", "r": "\r", "\\": "\\", ";": ";"}
+
+
+def parse_desktop_entry(path):
+    """Keys of the [Desktop Entry] group (unlocalized only), or None.
+
+    A single pass over the lines, stopping at the next group; much cheaper
+    than configparser for the few keys we need.
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    entry = None
+    for line in data.splitlines():
+        if not line or line[0] == "#":
+            continue
+        if line[0] == "[":
+            if entry is not None:
+                break
+            if line.rstrip() == "[Desktop Entry]":
+                entry = {}
+            continue
+        if entry is None:
+            continue
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or "[" in key:
+            continue
+        value = value.strip()
+        if "\\" in value:
+            value = re.sub(r"\\(.)", lambda m: DESKTOP_ESCAPES.get(m.group(1), m.group(0)), value)
+        entry.setdefault(key, value)
+    return entry
+
+
+class ApplicationIndex:
+    """Every launchable application under $XDG_DATA_DIRS, with a fuzzy search index.
+
+    Parsed entries are persisted per applications directory together with
+    the directory's mtime, so only directories that changed are re-read.
+    """
+
+    FIELD_CODES = re.compile(r"\s*%[fFuUdDnNickvm]")
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, "applications.json")
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        self.dirs = [os.path.join(d, "applications") for d in [data_home] + data_dirs.split(":") if d]
+        self.apps = []
+        self.load()
+
+    def load(self):
+        cache = self._load_cache()
+        fresh = {}
+        changed = False
+        for root in self.dirs:
+            for directory in self._walk(root):
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+                cached = cache.get(directory)
+                if cached and cached["mtime"] == mtime:
+                    fresh[directory] = cached
+                else:
+                    fresh[directory] = {"mtime": mtime, "apps": self._scan(root, directory)}
+                    changed = True
+        if changed or set(fresh) != set(cache):
+            self._save_cache(fresh)
+
+        # Earlier dirs win for the same desktop file id
+        seen = set()
+        apps = []
+        for root in self.dirs:
+            for directory in self._walk(root):
+                for app in fresh.get(directory, {}).get("apps", []):
+                    if app["id"] not in seen:
+                        seen.add(app["id"])
+                        if app["show"]:
+                            apps.append(app)
+        for app in apps:
+            app["_name"] = app["name"].lower()
+            app["_words"] = app["_name"].split()
+            app["_other"] = " ".join((app["generic"], app["keywords"])).lower()
+            app["_exec"] = os.path.basename(app["exec"].split(" ", 1)[0]).lower()
+        self.apps = sorted(apps, key=lambda a: a["_name"])
+
+    def _walk(self, root):
+        if not os.path.isdir(root):
+            return []
+        return [dirpath for dirpath, _, _ in os.walk(root)]
+
+    def _scan(self, root, directory):
+        apps = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return apps
+        for name in names:
+            if not name.endswith(".desktop"):
+                continue
+            path = os.path.join(directory, name)
+            entry = parse_desktop_entry(path)
+            if entry is None:
+                continue
+            apps.append({
+                "id": os.path.relpath(path, root).replace("/", "-"),
+                "path": path,
+                "name": entry.get("Name", name[:-8]),
+                "generic": entry.get("GenericName", ""),
+                "comment": entry.get("Comment", ""),
+                "keywords": entry.get("Keywords", "").replace(";", " "),
+                "exec": self.FIELD_CODES.sub("", entry.get("Exec", "")).replace("%%", "%").strip(),
+                "icon": entry.get("Icon", ""),
+                # Kept so a hidden entry still shadows lower-priority ones
+                "show": entry.get("Type") == "Application" and bool(entry.get("Exec"))
+                        and entry.get("NoDisplay", "false") != "true" and entry.get("Hidden", "false") != "true",
+            })
+        return apps
+
+    def search(self, query, limit=100):
+        query = query.strip().lower()
+        if not query:
+            return self.apps[:limit]
+        scored = []
+        for app in self.apps:
+            score = self._score(query, app)
+            if score:
+                scored.append((-score, app["_name"], app))
+        scored.sort(key=lambda x: (x[0], x[1]))
+        return [x[2] for x in scored[:limit]]
+
+    @staticmethod
+    def _score(query, app):
+        name = app["_name"]
+        if name.startswith(query):
+            return 100
+        if any(w.startswith(query) for w in app["_words"]):
+            return 80
+        if query in name:
+            return 60
+        if query in app["_other"]:
+            return 40
+        if app["_exec"].startswith(query):
+            return 30
+        # Fuzzy: the query's characters appear in order in the name
+        pos = 0
+        for ch in query:
+            pos = name.find(ch, pos) + 1
+            if not pos:
+                return 0
+        return 10
+
+    # --- Disk cache ---
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, data):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"[ERROR] Failed to write application index cache: {e}")
+
+
+# ==============================
+# AUTOSTART MONITOR
+# ==============================
+
+class AutostartMonitor:
+    """Autostart entries from the user and system autostart dirs, kept current by Gio.FileMonitor.
+
+    A user file shadows a system file with the same name. Parsed files are
+    cached by (mtime, inode), and callback(filename, entry) is called only
+    for the files a change affects; entry is None when the file is gone.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.user_dir = os.path.join(GLib.get_user_config_dir(), "autostart")
+        config_dirs = os.environ.get("XDG_CONFIG_DIRS") or "/etc/xdg"
+        self.system_dirs = [os.path.join(d, "autostart") for d in config_dirs.split(":") if d]
+        self._cache = {}
+        self._monitors = []
+
+    def start(self):
+        for directory in [self.user_dir] + self.system_dirs:
+            try:
+                monitor = Gio.File.new_for_path(directory).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+            except GLib.Error as e:
+                print(f"[ERROR] Cannot watch {directory}: {e.message}")
+                continue
+            monitor.connect("changed", self.on_changed)
+            self._monitors.append(monitor)
+
+    def on_changed(self, monitor, file, other_file, event):
+        # Wait for CHANGES_DONE_HINT instead of reparsing a half-written file
+        if event in (Gio.FileMonitorEvent.CHANGED, Gio.FileMonitorEvent.ATTRIBUTE_CHANGED):
+            return
+        for f in (file, other_file):
+            if f is not None and f.get_basename().endswith(".desktop"):
+                self.rescan(f.get_basename())
+
+    def rescan(self, filename):
+        self.callback(filename, self.resolve(filename))
+
+    def entries(self):
+        """filename -> resolved entry for every visible autostart file."""
+        names = set()
+        for directory in [self.user_dir] + self.system_dirs:
+            try:
+                names.update(n for n in os.listdir(directory) if n.endswith(".desktop"))
+            except OSError:
+                continue
+        result = {}
+        for name in names:
+            entry = self.resolve(name)
+            if entry is not None:
+                result[name] = entry
+        return result
+
+    def resolve(self, filename):
+        """The effective entry: the user file if there is one, else the first system file."""
+        system = None
+        for directory in self.system_dirs:
+            system = self.parse(os.path.join(directory, filename))
+            if system:
+                break
+        user = self.parse(os.path.join(self.user_dir, filename))
+        entry = user or system
+        if entry is None:
+            return None
+        return dict(entry, filename=filename, user=user is not None, system=system is not None)
+
+    def parse(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._cache.pop(path, None)
+            return None
+
+        key = (st.st_mtime_ns, st.st_ino)
+        cached = self._cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        entry = None
+        section = parse_desktop_entry(path)
+        if section is not None:
+            entry = {
+                "path": path,
+                "name": section.get("Name", os.path.basename(path)),
+                "comment": section.get("Comment", "No description"),
+                "exec": section.get("Exec", ""),
+                "hidden": section.get("Hidden", "false").lower() == "true",
+                "enabled": section.get("X-GNOME-Autostart-enabled", "true").lower() != "false",
+            }
+        self._cache[path] = (key, entry)
+        return entry
+
+    def set_enabled(self, filename, enabled):
+        """Write a user override that enables or disables the entry."""
+        entry = self.resolve(filename)
+        if entry is None:
+            return
+        with open(entry["path"], "r", errors="replace") as f:
+            lines = f.read().splitlines()
+
+        values = {"Hidden": "false", "X-GNOME-Autostart-enabled": "true"} if enabled else {"Hidden": "true"}
+        out, in_main, done = [], False, set()
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith("["):
+                if in_main:
+                    out.extend(f"{k}={v}" for k, v in values.items() if k not in done)
+                    done.update(values)
+                in_main = stripped == "[Desktop Entry]"
+            elif in_main and "=" in stripped:
+                key = stripped.split("=", 1)[0].strip()
+                if key in values:
+                    if key not in done:
+                        out.append(f"{key}={values[key]}")
+                        done.add(key)
+                    continue
+            out.append(line)
+        if in_main:
+            out.extend(f"{k}={v}" for k, v in values.items() if k not in done)
+
+        os.makedirs(self.user_dir, exist_ok=True)
+        path = os.path.join(self.user_dir, filename)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(out) + "\n")
+        os.replace(tmp_path, path)
+
+
+# ==============================
+# STORAGE MONITOR
+# ==============================
+
+class StorageMonitor:
+    """Mount usage collected off the main thread, with a per-mount timeout.
+
+    Each mount gets at most one worker thread at a time: statvfs on a hung
+    NFS/CIFS mount can block forever and cannot be cancelled, so the stuck
+    thread is left alone and the mount is reported as not responding
+    instead of queueing more work behind it.
+    """
+
+    TIMEOUT = 5
+    LOCAL_FS = {"ext4", "ext3", "btrfs", "xfs", "ntfs", "ntfs3", "vfat", "exfat", "f2fs", "zfs", "bcachefs"}
+    NETWORK_FS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph", "glusterfs", "afs", "davfs",
+                  "fuse.sshfs", "fuse.glusterfs", "fuse.rclone", "fuse.davfs2"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def mounts(self):
+        """mountpoint -> (device, fstype, is_network); only reads the mount table."""
+        result = {}
+        try:
+            partitions = psutil.disk_partitions(all=True)
+        except OSError:
+            return result
+        for part in partitions:
+            if part.fstype in self.LOCAL_FS or part.fstype in self.NETWORK_FS:
+                result[part.mountpoint] = (part.device, part.fstype, part.fstype in self.NETWORK_FS)
+        return result
+
+    def refresh(self, mountpoints, callback):
+        """callback(mountpoint, usage, error) runs on the main loop for each mount."""
+        now = time.monotonic()
+        for mountpoint in mountpoints:
+            with self._lock:
+                started = self._inflight.get(mountpoint)
+                if started is None:
+                    self._inflight[mountpoint] = now
+            if started is not None:
+                # Still stuck in the previous statvfs
+                if now - started > self.TIMEOUT:
+                    callback(mountpoint, None, "Not responding")
+                continue
+
+            threading.Thread(target=self._stat, args=(mountpoint, callback), daemon=True).start()
+            GLib.timeout_add_seconds(self.TIMEOUT, self._check_timeout, mountpoint, now, callback)
+
+    def _stat(self, mountpoint, callback):
+        try:
+            usage, error = psutil.disk_usage(mountpoint), None
+        except OSError as e:
+            usage, error = None, e.strerror
+        with self._lock:
+            self._inflight.pop(mountpoint, None)
+        GLib.idle_add(callback, mountpoint, usage, error)
+
+    def _check_timeout(self, mountpoint, started, callback):
+        with self._lock:
+            stuck = self._inflight.get(mountpoint) == started
+        if stuck:
+            callback(mountpoint, None, "Not responding")
+        return False
+
+
+# ==============================
+# BATTERY TELEMETRY
+# ==============================
+
+class BatteryMonitor:
+    """Battery state pushed by UPower, with slow sysfs polling as a fallback.
+
+    UPower already samples the hardware and emits PropertiesChanged when a
+    value moves, so an idle battery costs nothing here. Without UPower the
+    power_supply uevent files are read every POLL_INTERVAL seconds.
+    """
+
+    BUS_NAME = "org.freedesktop.UPower"
+    PATH = "/org/freedesktop/UPower"
+    IFACE = "org.freedesktop.UPower"
+    DEVICE_IFACE = "org.freedesktop.UPower.Device"
+    TYPE_BATTERY = 2
+    STATES = {1: "Charging", 2: "Discharging", 3: "Empty", 4: "Full", 5: "Not charging", 6: "Discharging"}
+    TECHNOLOGIES = {1: "Li-ion", 2: "Li-poly", 3: "LiFePO4", 4: "Lead acid", 5: "NiCd", 6: "NiMH"}
+    SYSFS_DIR = "/sys/class/power_supply"
+    POLL_INTERVAL = 30
+    # Signed rate samples (positive while charging) covering about an hour
+    HISTORY = 360
+    HISTORY_WINDOW = 3600
+    # Updates closer together than this replace the previous sample
+    MIN_SAMPLE_GAP = 5
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.batteries = {} # name -> info
+        self.history = {} # name -> deque of (monotonic time, watts)
+        self.source = None # "upower" or "sysfs" once started
+        self._manager = None
+        self._devices = {} # object path -> (name, proxy)
+        self._pending = 0
+
+    def start(self):
+        """callback(batteries) runs on the main loop whenever a battery changes."""
+        Gio.DBusProxy.new_for_bus(
+            Gio.BusType.SYSTEM, Gio.DBusProxyFlags.DO_NOT_LOAD_PROPERTIES, None,
+            self.BUS_NAME, self.PATH, self.IFACE, None, self._on_manager_ready
+        )
+
+    # --- UPower ---
+
+    def _on_manager_ready(self, source, result):
+        try:
+            self._manager = Gio.DBusProxy.new_for_bus_finish(result)
+        except GLib.Error as e:
+            self._start_polling(e.message)
+            return
+        self._manager.connect("g-signal", self._on_manager_signal)
+        self._manager.call("EnumerateDevices", None, Gio.DBusCallFlags.NONE, -1, None, self._on_enumerated)
+
+    def _on_enumerated(self, proxy, result):
+        try:
+            (paths,) = proxy.call_finish(result).unpack()
+        except GLib.Error as e:
+            self._start_polling(e.message)
+            return
+
+        self.source = "upower"
+        # Report once every device proxy has loaded its properties
+        self._pending = len(paths)
+        if not paths:
+            self.callback(self.batteries)
+        for path in paths:
+            self._add_device(path)
+
+    def _on_manager_signal(self, proxy, sender, signal, params):
+        if signal == "DeviceAdded":
+            self._add_device(params.unpack()[0])
+        elif signal == "DeviceRemoved":
+            entry = self._devices.pop(params.unpack()[0], None)
+            if entry:
+                self.batteries.pop(entry[0], None)
+                self.history.pop(entry[0], None)
+                self.callback(self.batteries)
+
+    def _add_device(self, path):
+        Gio.DBusProxy.new_for_bus(
+            Gio.BusType.SYSTEM, Gio.DBusProxyFlags.NONE, None,
+            self.BUS_NAME, path, self.DEVICE_IFACE, None, self._on_device_ready, path
+        )
+
+    def _on_device_ready(self, source, result, path):
+        try:
+            proxy = Gio.DBusProxy.new_for_bus_finish(result)
+        except GLib.Error as e:
+            print(f"[ERROR] Failed to read UPower device {path}: {e.message}")
+            proxy = None
+
+        # Peripheral batteries (mice, headsets) don't power the system
+        if proxy and self._property(proxy, "Type") == self.TYPE_BATTERY and self._property(proxy, "PowerSupply"):
+            name = os.path.basename(self._property(proxy, "NativePath") or path)
+            self._devices[path] = (name, proxy)
+            proxy.connect("g-properties-changed", self._on_device_changed, path)
+            self._update(name, self._info_from_upower(proxy))
+
+        if self._pending:
+            self._pending -= 1
+            if self._pending:
+                return
+        self.callback(self.batteries)
+
+    def _on_device_changed(self, proxy, changed, invalidated, path):
+        entry = self._devices.get(path)
+        if entry:
+            self._update(entry[0], self._info_from_upower(proxy))
+            self.callback(self.batteries)
+
+    @staticmethod
+    def _property(proxy, name):
+        value = proxy.get_cached_property(name)
+        return value.unpack() if value is not None else None
+
+    def _info_from_upower(self, proxy):
+        def prop(name):
+            return self._property(proxy, name)
+
+        vendor_model = " ".join(filter(None, (prop("Vendor"), prop("Model"))))
+        cycles = prop("ChargeCycles") # UPower >= 0.99.14, -1 when unknown
+        return {
+            "percentage": prop("Percentage"),
+            "state": self.STATES.get(prop("State"), "Unknown"),
+            "energy": prop("Energy"),
+            "energy_full": prop("EnergyFull"),
+            "energy_full_design": prop("EnergyFullDesign"),
+            "rate": prop("EnergyRate") or 0.0,
+            "cycles": cycles if cycles and cycles > 0 else None,
+            "technology": self.TECHNOLOGIES.get(prop("Technology")),
+            "model": vendor_model or None,
+        }
+
+    # --- sysfs ---
+
+    def _start_polling(self, reason):
+        print(f"[INFO] UPower unavailable ({reason}), polling {self.SYSFS_DIR}")
+        self.source = "sysfs"
+        self._poll()
+        GLib.timeout_add_seconds(self.POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        try:
+            names = sorted(os.listdir(self.SYSFS_DIR))
+        except OSError:
+            names = []
+
+        seen = set()
+        for name in names:
+            values = self.read_uevent(os.path.join(self.SYSFS_DIR, name, "uevent"))
+            if values.get("type") != "Battery" or values.get("scope") == "Device":
+                continue
+            if values.get("present", "1") != "1":
+                continue
+            seen.add(name)
+            self._update(name, self._info_from_sysfs(values))
+
+        for name in set(self.batteries) - seen:
+            del self.batteries[name]
+            self.history.pop(name, None)
+        self.callback(self.batteries)
+        return True
+
+    @staticmethod
+    def read_uevent(path):
+        """POWER_SUPPLY_* values of one supply in a single read, lowercase keys without the prefix."""
+        values = {}
+        try:
+            with open(path) as f:
+                for line in f:
+                    key, _, value = line.rstrip("\n").partition("=")
+                    if key.startswith("POWER_SUPPLY_"):
+                        values[key[13:].lower()] = value
+        except OSError:
+            pass
+        return values
+
+    def _info_from_sysfs(self, values):
+        def number(key, scale=1e6):
+            try:
+                return int(values[key]) / scale
+            except (KeyError, ValueError):
+                return None
+
+        # Some firmware only reports charge (µAh) and current (µA), convert with the voltage
+        volts = number("voltage_min_design") or number("voltage_now")
+        energy, full, design = number("energy_now"), number("energy_full"), number("energy_full_design")
+        if energy is None and volts:
+            charge = [number(k) for k in ("charge_now", "charge_full", "charge_full_design")]
+            energy, full, design = [c * volts if c is not None else None for c in charge]
+        rate = number("power_now")
+        if rate is None and number("current_now") is not None and number("voltage_now"):
+            rate = number("current_now") * number("voltage_now")
+
+        percentage = number("capacity", 1)
+        if percentage is None and energy is not None and full:
+            percentage = energy / full * 100
+        cycles = number("cycle_count", 1)
+        model = " ".join(filter(None, (values.get("manufacturer"), values.get("model_name"))))
+        return {
+            "percentage": percentage,
+            "state": values.get("status", "Unknown"),
+            "energy": energy,
+            "energy_full": full,
+            "energy_full_design": design,
+            "rate": abs(rate or 0.0),
+            "cycles": int(cycles) if cycles else None,
+            "technology": values.get("technology") if values.get("technology") != "Unknown" else None,
+            "model": model or None,
+        }
+
+    # --- Derived values ---
+
+    def _update(self, name, info):
+        full, design = info["energy_full"], info["energy_full_design"]
+        info["wear"] = max(0.0, (1 - full / design) * 100) if full and design else None
+
+        # Seconds left, computed from the current rate for either backend
+        info["time_left"] = None
+        if info["rate"] > 0 and info["energy"] is not None:
+            if info["state"] == "Discharging":
+                info["time_left"] = info["energy"] / info["rate"] * 3600
+            elif info["state"] == "Charging" and full:
+                info["time_left"] = max(full - info["energy"], 0) / info["rate"] * 3600
+        self.batteries[name] = info
+
+        if info["state"] == "Charging":
+            watts = info["rate"]
+        elif info["state"] == "Discharging":
+            watts = -info["rate"]
+        else:
+            watts = 0.0
+        history = self.history.setdefault(name, collections.deque(maxlen=self.HISTORY))
+        now = time.monotonic()
+        if history and now - history[-1][0] < self.MIN_SAMPLE_GAP:
+            history[-1] = (now, watts)
+        else:
+            history.append((now, watts))
+
+    def average_rates(self, name):
+        """(mean charge W, mean discharge W) over the history window, None where there were no samples."""
+        cutoff = time.monotonic() - self.HISTORY_WINDOW
+        samples = [w for t, w in self.history.get(name, ()) if t >= cutoff]
+        charging = [w for w in samples if w > 0]
+        discharging = [-w for w in samples if w < 0]
+        return (
+            sum(charging) / len(charging) if charging else None,
+            sum(discharging) / len(discharging) if discharging else None,
+        )
+
+    def summary(self):
+        """Combined state of all batteries, weighted by energy like UPower's display device."""
+        batteries = list(self.batteries.values())
+        if not batteries:
+            return None
+        energy = [b["energy"] for b in batteries]
+        full = [b["energy_full"] for b in batteries]
+        if all(energy) and all(full):
+            percentage = sum(energy) / sum(full) * 100
+        else:
+            percentage = sum(b["percentage"] or 0 for b in batteries) / len(batteries)
+
+        states = [b["state"] for b in batteries]
+        state = next((s for s in ("Charging", "Discharging") if s in states), states[0])
+        rate = sum(b["rate"] for b in batteries if b["state"] == state)
+        time_left = None
+        if rate > 0 and all(e is not None for e in energy):
+            if state == "Discharging":
+                time_left = sum(energy) / rate * 3600
+            elif state == "Charging" and all(full):
+                time_left = max(sum(full) - sum(energy), 0) / rate * 3600
+        return {"percentage": percentage, "state": state, "rate": rate, "time_left": time_left}
+
+
+# ==============================
+# CPU POWER & THROTTLING
+# ==============================
+
+class PowerMonitor:
+    """CPU package/core power from energy counters, and throttling detection.
+
+    Power comes from the powercap RAPL zones (Intel, and AMD on recent
+    kernels) or the older amd_energy hwmon driver. Those counters are
+    root-only on patched kernels; they are then read through the privileged
+    helper, but only while it is already running and for HELPER_WINDOW
+    seconds after show() was called, so no polkit prompt is ever raised for
+    a graph and the helper can still reach its idle timeout.
+
+    Throttling uses the kernel's thermal_throttle event counters where the
+    CPU has them (Intel). Otherwise a sample is flagged when the frequency is
+    held below FREQ_LIMIT percent of max while the temperature is near its
+    limit or the package draws close to its long-term power limit.
+    """
+
+    POWERCAP_DIR = "/sys/class/powercap"
+    HWMON_DIR = "/sys/class/hwmon"
+    CPU_DIR = "/sys/devices/system/cpu"
+    TEMP_SENSORS = {"coretemp", "k10temp", "zenpower"}
+    TEMP_LABELS = {"Package id 0", "Tdie", "Tctl"}
+    # Used when the sensor does not report a critical temperature
+    DEFAULT_TEMP_LIMIT = 95
+    TEMP_MARGIN = 5
+    POWER_MARGIN = 0.95
+    FREQ_LIMIT = 90
+    HELPER_TIMEOUT = 5
+    # Helper reads count as activity, so unbounded polling would keep it running forever
+    HELPER_WINDOW = 600
+
+    def __init__(self, helper=None):
+        self.helper = helper
+        self.helper_until = 0 # monotonic deadline for helper reads
+        self.domains = self._find_domains()
+        self.limit_w = self._read_power_limit()
+        self.temp_input, self.temp_limit = self._find_temp_sensor()
+        self.counter_files = self._find_throttle_counters()
+        self.needs_helper = False
+        self.power = {"package": None, "core": None}
+        self.counts = None # kernel throttle events since boot, {"thermal": n, "power": n}
+        self._last = {} # energy file -> (monotonic time, µJ)
+        self._lock = threading.Lock()
+        self._helper_reading = None # (time, {file: µJ}) delivered by the helper thread
+        self._helper_busy = False
+
+    # --- Discovery ---
+
+    def _find_domains(self):
+        """Energy counters as dicts with kind ("package"/"core"), file and wrap range."""
+        domains = []
+        try:
+            zones = sorted(z for z in os.listdir(self.POWERCAP_DIR) if z.startswith("intel-rapl:"))
+        except OSError:
+            zones = []
+        for zone in zones:
+            path = os.path.join(self.POWERCAP_DIR, zone)
+            name = self._read(os.path.join(path, "name")) or ""
+            kind = "package" if name.startswith("package") else "core" if name == "core" else None
+            if kind:
+                max_range = self._read(os.path.join(path, "max_energy_range_uj"))
+                domains.append({"kind": kind, "file": os.path.join(path, "energy_uj"),
+                                "max": int(max_range) if max_range else None})
+        if domains:
+            return domains
+
+        # amd_energy accumulates in software and does not wrap
+        try:
+            hwmons = sorted(os.listdir(self.HWMON_DIR))
+        except OSError:
+            hwmons = []
+        for hwmon in hwmons:
+            path = os.path.join(self.HWMON_DIR, hwmon)
+            if self._read(os.path.join(path, "name")) != "amd_energy":
+                continue
+            for entry in sorted(os.listdir(path)):
+                if entry.startswith("energy") and entry.endswith("_label"):
+                    label = self._read(os.path.join(path, entry)) or ""
+                    kind = "package" if label.startswith("Esocket") else "core" if label.startswith("Ecore") else None
+                    if kind:
+                        domains.append({"kind": kind, "file": os.path.join(path, entry.replace("_label", "_input")), "max": None})
+        return domains
+
+    def _read_power_limit(self):
+        """Sum of the packages' long-term (PL1) limits in watts."""
+        total = 0
+        for domain in self.domains:
+            if domain["kind"] == "package" and domain["file"].startswith(self.POWERCAP_DIR):
+                value = self._read(os.path.join(os.path.dirname(domain["file"]), "constraint_0_power_limit_uw"))
+                total += int(value) / 1e6 if value else 0
+        return total or None
+
+    def _find_temp_sensor(self):
+        """(input file, limit °C) of the package temperature, the same sensor get_temp shows."""
+        try:
+            hwmons = sorted(os.listdir(self.HWMON_DIR))
+        except OSError:
+            return None, self.DEFAULT_TEMP_LIMIT
+        for hwmon in hwmons:
+            path = os.path.join(self.HWMON_DIR, hwmon)
+            if self._read(os.path.join(path, "name")) not in self.TEMP_SENSORS:
+                continue
+            for entry in sorted(os.listdir(path)):
+                if entry.endswith("_label") and self._read(os.path.join(path, entry)) in self.TEMP_LABELS:
+                    crit = self._read(os.path.join(path, entry.replace("_label", "_crit")))
+                    limit = int(crit) / 1000 if crit else self.DEFAULT_TEMP_LIMIT
+                    return os.path.join(path, entry.replace("_label", "_input")), limit
+        return None, self.DEFAULT_TEMP_LIMIT
+
+    def _find_throttle_counters(self):
+        """{"thermal": [files], "power": [files]}, one CPU per core and per package."""
+        files = {"thermal": [], "power": []}
+        seen_cores, seen_packages = set(), set()
+        try:
+            cpus = sorted((c for c in os.listdir(self.CPU_DIR) if re.fullmatch(r"cpu\d+", c)), key=lambda c: int(c[3:]))
+        except OSError:
+            cpus = []
+        for cpu in cpus:
+            path = os.path.join(self.CPU_DIR, cpu)
+            throttle = os.path.join(path, "thermal_throttle")
+            if not os.path.isdir(throttle):
+                continue
+            package = self._read(os.path.join(path, "topology", "physical_package_id"))
+            core = (package, self._read(os.path.join(path, "topology", "core_id")))
+            scopes = []
+            if core not in seen_cores:
+                seen_cores.add(core)
+                scopes.append("core")
+            if package not in seen_packages:
+                seen_packages.add(package)
+                scopes.append("package")
+            for scope in scopes:
+                # The power limit counters are gone from newer kernels
+                for kind, name in (("thermal", f"{scope}_throttle_count"), ("power", f"{scope}_power_limit_count")):
+                    counter = os.path.join(throttle, name)
+                    if os.path.exists(counter):
+                        files[kind].append(counter)
+        return files
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    # --- Sampling ---
+
+    def show(self, visible):
+        """Start (or restart) the helper read window while the graph is visible, end it otherwise."""
+        self.helper_until = time.monotonic() + self.HELPER_WINDOW if visible else 0
+
+    def sample(self, freq_pct):
+        """One reading per refresh; freq_pct is the matching freq_history value.
+
+        Returns {"package": W, "core": W, "temp": °C, "throttle": None, "thermal" or "power"}.
+        """
+        self._sample_power()
+
+        temp = None
+        if self.temp_input:
+            value = self._read(self.temp_input)
+            temp = int(value) / 1000 if value else None
+
+        deltas = self._sample_counts()
+        held_back = freq_pct < self.FREQ_LIMIT
+        package = self.power["package"]
+        if deltas.get("thermal") or (held_back and temp is not None and temp >= self.temp_limit - self.TEMP_MARGIN):
+            throttle = "thermal"
+        elif deltas.get("power") or (held_back and package and self.limit_w and package >= self.limit_w * self.POWER_MARGIN):
+            throttle = "power"
+        else:
+            throttle = None
+        return {"package": package, "core": self.power["core"], "temp": temp, "throttle": throttle}
+
+    def _sample_power(self):
+        if not self.domains:
+            return
+
+        if not self.needs_helper:
+            now = time.monotonic()
+            readings = {}
+            try:
+                for domain in self.domains:
+                    with open(domain["file"]) as f:
+                        readings[domain["file"]] = int(f.read())
+            except PermissionError:
+                self.needs_helper = True
+            except (OSError, ValueError):
+                return
+            else:
+                self._update_power(now, readings)
+                return
+
+        if time.monotonic() >= self.helper_until:
+            # Window over: drop the stale value and don't average over the gap later
+            self.power = {"package": None, "core": None}
+            self._last = {}
+            return
+
+        # Counters are root-only: use the newest helper reading, ask for the next one
+        with self._lock:
+            reading, self._helper_reading = self._helper_reading, None
+            start = self.helper is not None and not self._helper_busy
+            if start:
+                self._helper_busy = True
+        if reading:
+            self._update_power(*reading)
+        if start:
+            threading.Thread(target=self._helper_worker, daemon=True).start()
+
+    def _helper_worker(self):
+        reading = None
+        try:
+            op = {"op": "energy_counters", "timeout": self.HELPER_TIMEOUT}
+            result = self.helper.request_sync([op], start=False)[0]
+            now = time.monotonic()
+            if result.get("ok"):
+                values = {}
+                for line in result.get("output", "").splitlines():
+                    path, _, value = line.rpartition(":")
+                    if value.isdigit():
+                        values[path] = int(value)
+                reading = (now, values)
+        except Exception:
+            # Not running: the graph stays empty until the user starts the helper for something else
+            pass
+        with self._lock:
+            self._helper_busy = False
+            if reading:
+                self._helper_reading = reading
+
+    def _update_power(self, now, readings):
+        power = {"package": None, "core": None}
+        for domain in self.domains:
+            value = readings.get(domain["file"])
+            previous = self._last.get(domain["file"])
+            if value is None:
+                continue
+            self._last[domain["file"]] = (now, value)
+            if previous is None or now <= previous[0]:
+                continue
+            delta = value - previous[1]
+            if delta < 0:
+                if not domain["max"]:
+                    continue
+                delta += domain["max"]
+            watts = delta / 1e6 / (now - previous[0])
+            power[domain["kind"]] = (power[domain["kind"]] or 0) + watts
+        self.power = power
+
+    def _sample_counts(self):
+        """Kernel throttle events since the previous sample, per kind."""
+        counts = {}
+        for kind, files in self.counter_files.items():
+            values = [self._read(path) for path in files]
+            values = [int(v) for v in values if v and v.isdigit()]
+            if values:
+                counts[kind] = sum(values)
+        previous, self.counts = self.counts, counts or None
+        if not previous or not counts:
+            return {}
+        return {kind: counts[kind] - previous.get(kind, counts[kind]) for kind in counts}
+
+
+# ==============================
+# SMART MONITOR
+# ==============================
+
+class SmartMonitor:
+    """Collects `smartctl -j` results for every disk through the privileged helper.
+
+    Disks are queried concurrently from a small worker pool, one helper
+    request each, so a slow or sleeping disk only delays its own row. Parsed
+    results are cached on disk for TTL seconds.
+    """
+
+    TTL = 600
+    OP_TIMEOUT = 20
+    MAX_WORKERS = 4
+
+    # ATA attributes whose normalized value is the remaining SSD life in percent
+    ATA_LIFE_ATTRS = (177, 231, 233, 202)
+    ATA_ERROR_ATTRS = {5: "reallocated", 197: "pending", 198: "uncorrectable", 199: "crc_errors"}
+
+    def __init__(self, helper, cache_path=None):
+        self.helper = helper
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, "smart.json")
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    @staticmethod
+    def list_disks():
+        """Physical block devices (no loop, ram, zram, device-mapper or optical)."""
+        disks = []
+        try:
+            for name in sorted(os.listdir("/sys/block")):
+                if name.startswith(("loop", "ram", "zram", "dm-", "md", "sr", "fd", "nbd")):
+                    continue
+                if os.path.exists(os.path.join("/sys/block", name, "device")):
+                    disks.append(name)
+        except OSError:
+            pass
+        return disks
+
+    def query(self, disks, callback, force=False):
+        """callback(disk, info) runs on the main loop once per disk."""
+        now = time.time()
+        for disk in disks:
+            with self._lock:
+                cached = self._cache.get(disk)
+            if cached and not force and now - cached["time"] < self.TTL:
+                GLib.idle_add(callback, disk, cached)
+            else:
+                self.pool.submit(self._query_one, disk, callback)
+
+    def _query_one(self, disk, callback):
+        op = {"op": "smart_info", "args": {"device": disk}, "timeout": self.OP_TIMEOUT}
+        try:
+            result = self.helper.request_sync([op])[0]
+            info = self.parse(result.get("output") or result.get("error") or "")
+        except Exception as e:
+            info = {"state": "error", "message": str(e)}
+        info["time"] = time.time()
+
+        # Do not cache transient failures
+        if info["state"] in ("ok", "failing", "standby"):
+            with self._lock:
+                self._cache[disk] = info
+                self._save_cache()
+        GLib.idle_add(callback, disk, info)
+
+    @classmethod
+    def parse(cls, output):
+        start = output.find("{")
+        if start == -1:
+            return {"state": "error", "message": (output.strip().splitlines() or ["No output"])[-1]}
+        try:
+            data, _ = json.JSONDecoder().raw_decode(output, start)
+        except ValueError:
+            return {"state": "error", "message": "Unreadable smartctl output"}
+
+        messages = [m.get("string", "") for m in data.get("smartctl", {}).get("messages", [])]
+        info = {
+            "model": data.get("model_name") or data.get("model_family") or "",
+            "serial": data.get("serial_number", ""),
+            "capacity": data.get("user_capacity", {}).get("bytes"),
+            "temperature": data.get("temperature", {}).get("current"),
+            "power_on_hours": data.get("power_on_time", {}).get("hours"),
+            "wear": None,
+            "errors": {},
+        }
+
+        if any("STANDBY" in m.upper() for m in messages):
+            info.update(state="standby", message="Sleeping, not woken up")
+            return info
+
+        status = data.get("smart_status")
+        if status is None:
+            info.update(state="unsupported", message=messages[-1] if messages else "SMART not supported")
+            return info
+        info["state"] = "ok" if status.get("passed") else "failing"
+
+        nvme = data.get("nvme_smart_health_information_log")
+        if nvme:
+            info["wear"] = nvme.get("percentage_used")
+            info["errors"] = {
+                "media_errors": nvme.get("media_errors", 0),
+                "error_log_entries": nvme.get("num_err_log_entries", 0),
+            }
+        else:
+            attrs = {a.get("id"): a for a in data.get("ata_smart_attributes", {}).get("table", [])}
+            for attr_id in cls.ATA_LIFE_ATTRS:
+                if attr_id in attrs:
+                    info["wear"] = max(0, 100 - attrs[attr_id].get("value", 100))
+                    break
+            for attr_id, key in cls.ATA_ERROR_ATTRS.items():
+                if attr_id in attrs:
+                    info["errors"][key] = attrs[attr_id].get("raw", {}).get("value", 0)
+            error_log = data.get("ata_smart_error_log", {}).get("summary", {})
+            if "count" in error_log:
+                info["errors"]["error_log_entries"] = error_log["count"]
+        return info
+
+    # --- Disk cache ---
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"[ERROR] Failed to write SMART cache: {e}")
+
+
+# ==============================
+# JOURNAL READER
+# ==============================
+
+class JournalEntry(GObject.Object):
+    """One journal record, reduced to the fields the Logs page shows."""
+    __gtype_name__ = "ControlPanelJournalEntry"
+
+    def __init__(self, cursor, timestamp, priority, unit, message):
+        super().__init__()
+        self.cursor = cursor
+        self.timestamp = timestamp
+        self.priority = priority
+        self.unit = unit
+        self.message = message
+
+
+class JournalReader:
+    """Reads `journalctl -o json`, with priority/unit/boot filters applied by journalctl itself.
+
+    follow() streams new entries as they are written; load_before() pages
+    backwards from a cursor. Entries are delivered in batches on the main loop.
+
+    Users outside systemd-journal/adm/wheel only see their own journal. With
+    privileged set, the same export is read through the privileged helper
+    instead, and following becomes a poll for entries after the last cursor.
+    """
+
+    JOURNAL_DIRS = ("/var/log/journal", "/run/log/journal")
+    POLL_INTERVAL = 2
+    # Entries fetched per poll after the first page, the helper's upper limit
+    POLL_MAX_LINES = 5000
+
+    def __init__(self, helper=None):
+        self.helper = helper
+        self.privileged = False
+        self.process = None
+        self.cancellable = None
+
+    @classmethod
+    def system_journal_readable(cls):
+        """False if system journal files exist but none of them is readable (ACLs included)."""
+        if os.geteuid() == 0:
+            return True
+        found = False
+        for directory in cls.JOURNAL_DIRS:
+            for path in glob.glob(os.path.join(directory, "*", "system*.journal")):
+                found = True
+                if os.access(path, os.R_OK):
+                    return True
+        return not found
+
+    @staticmethod
+    def filter_args(priority=None, unit=None, boot="0"):
+        args = []
+        if priority is not None:
+            args.append(f"--priority={priority}")
+        if unit:
+            args.append(f"--unit={unit}")
+        if boot is not None:
+            args.append(f"--boot={boot}")
+        return args
+
+    @staticmethod
+    def parse_entry(line):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+
+        message = data.get("MESSAGE", "")
+        if isinstance(message, list):
+            # Binary messages are exported as byte arrays
+            message = bytes(b for b in message if isinstance(b, int)).decode("utf-8", "replace")
+        elif message is None:
+            message = ""
+
+        try:
+            timestamp = int(data.get("__REALTIME_TIMESTAMP", 0)) / 1e6
+        except ValueError:
+            timestamp = 0
+        try:
+            priority = int(data.get("PRIORITY", 6))
+        except ValueError:
+            priority = 6
+        unit = data.get("_SYSTEMD_UNIT") or data.get("SYSLOG_IDENTIFIER") or data.get("_COMM") or ""
+        return JournalEntry(data.get("__CURSOR", ""), timestamp, priority, unit, message)
+
+    def follow(self, filters, lines, on_entries, on_error=None):
+        """Show the last `lines` entries, then keep streaming; on_entries(list) per batch.
+
+        on_error(message) is called if the privileged helper request fails.
+        """
+        self.stop()
+        self.cancellable = Gio.Cancellable()
+        if self.privileged:
+            return self._poll_privileged(filters, lines, on_entries, on_error)
+        argv = ["journalctl", "-o", "json", "--follow", "--no-pager", f"--lines={lines}"] + filters
+        self.process = self._spawn(argv)
+        if self.process is None:
+            return False
+
+        pending = []
+        cancellable = self.cancellable
+
+        def flush():
+            if pending and not cancellable.is_cancelled():
+                on_entries(list(pending))
+            pending.clear()
+            return False
+
+        def on_line(stream, result):
+            try:
+                data, length = stream.read_line_finish(result)
+            except GLib.Error:
+                return
+            if data is None:
+                flush()
+                return
+            entry = self.parse_entry(data)
+            if entry is not None:
+                # Deliver at most every 100 ms, whatever the log rate is
+                if not pending:
+                    GLib.timeout_add(100, flush)
+                pending.append(entry)
+            stream.read_line_async(GLib.PRIORITY_DEFAULT, cancellable, on_line)
+
+        stream = Gio.DataInputStream.new(self.process.get_stdout_pipe())
+        stream.read_line_async(GLib.PRIORITY_DEFAULT, cancellable, on_line)
+        return True
+
+    def load_before(self, cursor, filters, count, callback):
+        """Fetch up to `count` entries older than cursor; callback(entries) oldest first."""
+        def on_output(stdout):
+            entries = [e for e in map(self.parse_entry, (stdout or "").splitlines()) if e is not None]
+            # The cursor entry itself is included, it is already displayed
+            entries = [e for e in entries if e.cursor != cursor]
+            callback(list(reversed(entries[:count])))
+
+        if self.privileged:
+            args = {"filters": filters, "cursor": cursor, "lines": count + 1, "reverse": True}
+            self._request(args, lambda stdout, error: on_output(stdout))
+            return
+
+        argv = ["journalctl", "-o", "json", "--no-pager", "--reverse", f"--cursor={cursor}", f"--lines={count + 1}"] + filters
+        process = self._spawn(argv)
+        if process is None:
+            callback([])
+            return
+
+        def on_done(proc, result):
+            try:
+                ok, stdout, stderr = proc.communicate_utf8_finish(result)
+            except GLib.Error:
+                stdout = None
+            on_output(stdout)
+
+        process.communicate_utf8_async(None, None, on_done)
+
+    def _poll_privileged(self, filters, lines, on_entries, on_error):
+        cancellable = self.cancellable
+        state = {"cursor": None, "busy": False}
+
+        def poll():
+            if cancellable.is_cancelled():
+                return False
+            if not state["busy"]:
+                state["busy"] = True
+                args = {"filters": filters, "lines": lines}
+                if state["cursor"]:
+                    args.update(after_cursor=state["cursor"], lines=self.POLL_MAX_LINES)
+                self._request(args, on_output)
+            return True
+
+        def on_output(stdout, error):
+            state["busy"] = False
+            if cancellable.is_cancelled():
+                return
+            if stdout is None:
+                cancellable.cancel()
+                if on_error:
+                    on_error(error)
+                return
+            entries = [e for e in map(self.parse_entry, stdout.splitlines()) if e is not None]
+            if entries:
+                state["cursor"] = entries[-1].cursor
+                on_entries(entries)
+
+        poll()
+        GLib.timeout_add_seconds(self.POLL_INTERVAL, poll)
+        return True
+
+    def _request(self, args, callback):
+        """Run the helper's journal op; callback(stdout, error) with stdout None on failure."""
+        def on_done(results, error):
+            if results is None:
+                callback(None, error)
+            elif not results[0]["ok"]:
+                callback(None, results[0].get("error") or results[0].get("output") or "journalctl failed")
+            else:
+                callback(results[0].get("output", ""), None)
+
+        self.helper.request([{"op": "journal", "args": args}], on_done)
+
+    def _spawn(self, argv):
+        try:
+            return Gio.Subprocess.new(argv, Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_SILENCE)
+        except GLib.Error as e:
+            print(f"[ERROR] Failed to start journalctl: {e.message}")
+            return None
+
+    def stop(self):
+        if self.cancellable:
+            self.cancellable.cancel()
+            self.cancellable = None
+        if self.process:
+            self.process.force_exit()
+            self.process = None
+
+
+# ==============================
+# SYSCTL INDEX
+# ==============================
+
+class SysctlIndex:
+    """Sorted index of every key under /proc/sys, built once per session.
+
+    Keys use sysctl's dotted form; because they are sorted, each subtree
+    (e.g. "net.ipv4.") is a contiguous range found with bisect. The dotted
+    form is ambiguous for names that contain dots themselves (VLAN interfaces
+    such as eth0.100), so files are read by the path found while indexing.
+    """
+
+    def __init__(self, root="/proc/sys"):
+        self.root = root
+        self.keys = []
+        self.lower = []
+        self.paths = {} # key -> path relative to root
+        self.build()
+
+    def build(self):
+        paths = {}
+        stack = [self.root]
+        while stack:
+            path = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            relpath = os.path.relpath(entry.path, self.root)
+                            paths[relpath.replace("/", ".")] = relpath
+            except OSError:
+                continue
+        self.paths = paths
+        self.keys = sorted(paths)
+        self.lower = [k.lower() for k in self.keys]
+
+    def subtree(self, prefix):
+        """Keys starting with prefix, via two bisections."""
+        prefix = prefix.lower()
+        lo = bisect.bisect_left(self.lower, prefix)
+        hi = bisect.bisect_left(self.lower, prefix + "\uffff", lo)
+        return self.keys[lo:hi]
+
+    def search(self, query):
+        """Prefix matches first, then any other key containing the query."""
+        query = query.strip().lower().replace("/", ".")
+        if not query:
+            return self.keys
+        prefixed = self.subtree(query)
+        seen = set(prefixed)
+        return prefixed + [k for k, low in zip(self.keys, self.lower) if query in low and k not in seen]
+
+    def read(self, key):
+        try:
+            with open(os.path.join(self.root, self.paths.get(key, key.replace(".", "/"))), "r", errors="replace") as f:
+                return " ".join(f.read(4096).split())
+        except PermissionError:
+            return "(permission denied)"
+        except OSError as e:
+            # Write-only triggers such as vm.drop_caches fail with EINVAL/EIO
+            return "(write-only)" if e.errno in (errno.EINVAL, errno.EIO) else f"({e.strerror})"
+
+
+# ==============================
+# HARDWARE INVENTORY
+# ==============================
+
+class HardwareIds:
+    """Vendor/device name lookup in a pci.ids or usb.ids file.
+
+    The file is memory-mapped and only vendor line offsets are indexed up
+    front; a vendor's device lines are indexed the first time it is looked up.
+    Both indexes are sorted, so lookups are binary searches.
+    """
+
+    VENDOR_RE = re.compile(rb"^([0-9a-f]{4})  ", re.M)
+    DEVICE_RE = re.compile(rb"^\t([0-9a-f]{4})  ", re.M)
+
+    def __init__(self, candidates):
+        self.mm = None
+        self.vendor_ids = []
+        self.vendor_offsets = []
+        self.devices = {}
+
+        for path in candidates:
+            try:
+                with open(path, "rb") as f:
+                    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                break
+            except (OSError, ValueError):
+                continue
+        if self.mm is None:
+            return
+
+        for match in self.VENDOR_RE.finditer(self.mm):
+            self.vendor_ids.append(int(match.group(1), 16))
+            self.vendor_offsets.append(match.start())
+        # The ids files are sorted, but do not rely on it for bisect
+        if self.vendor_ids != sorted(self.vendor_ids):
+            pairs = sorted(zip(self.vendor_ids, self.vendor_offsets))
+            self.vendor_ids = [p[0] for p in pairs]
+            self.vendor_offsets = [p[1] for p in pairs]
+
+    def _line(self, offset):
+        end = self.mm.find(b"\n", offset)
+        line = self.mm[offset:end if end != -1 else len(self.mm)]
+        return line.strip().split(b"  ", 1)[-1].decode("utf-8", "replace")
+
+    def _vendor_index(self, vendor_id):
+        i = bisect.bisect_left(self.vendor_ids, vendor_id)
+        if i == len(self.vendor_ids) or self.vendor_ids[i] != vendor_id:
+            return None
+        return i
+
+    def vendor(self, vendor_id):
+        if self.mm is None:
+            return None
+        i = self._vendor_index(vendor_id)
+        return self._line(self.vendor_offsets[i]) if i is not None else None
+
+    def device(self, vendor_id, device_id):
+        if self.mm is None:
+            return None
+        i = self._vendor_index(vendor_id)
+        if i is None:
+            return None
+
+        if vendor_id not in self.devices:
+            start = self.mm.find(b"\n", self.vendor_offsets[i]) + 1
+            # Device lines end at the next line that does not start with a tab
+            end = start
+            while end < len(self.mm) and self.mm[end:end + 1] in (b"\t", b"#"):
+                nl = self.mm.find(b"\n", end)
+                end = nl + 1 if nl != -1 else len(self.mm)
+            ids, offsets = [], []
+            for match in self.DEVICE_RE.finditer(self.mm, start, end):
+                ids.append(int(match.group(1), 16))
+                offsets.append(match.start())
+            self.devices[vendor_id] = (ids, offsets)
+
+        ids, offsets = self.devices[vendor_id]
+        j = bisect.bisect_left(ids, device_id)
+        if j < len(ids) and ids[j] == device_id:
+            return self._line(offsets[j])
+        return None
+
+
+class HardwareInventory:
+    """Reads PCI and USB devices straight from sysfs."""
+
+    PCI_ROOT = "/sys/bus/pci/devices"
+    USB_ROOT = "/sys/bus/usb/devices"
+    PCI_IDS = ["/usr/share/hwdata/pci.ids", "/usr/share/misc/pci.ids", "/usr/share/pci.ids"]
+    USB_IDS = ["/usr/share/hwdata/usb.ids", "/usr/share/misc/usb.ids", "/usr/share/usb.ids", "/var/lib/usbutils/usb.ids"]
+
+    _pci_ids = None
+    _usb_ids = None
+
+    @classmethod
+    def pci_ids(cls):
+        if cls._pci_ids is None:
+            cls._pci_ids = HardwareIds(cls.PCI_IDS)
+        return cls._pci_ids
+
+    @classmethod
+    def usb_ids(cls):
+        if cls._usb_ids is None:
+            cls._usb_ids = HardwareIds(cls.USB_IDS)
+        return cls._usb_ids
+
+    @staticmethod
+    def _read(path, default=None):
+        try:
+            with open(path, "r") as f:
+                return f.read().strip()
+        except OSError:
+            return default
+
+    @staticmethod
+    def _driver(path):
+        link = os.path.join(path, "driver")
+        return os.path.basename(os.readlink(link)) if os.path.islink(link) else None
+
+    def list_pci(self):
+        try:
+            return sorted(os.listdir(self.PCI_ROOT))
+        except OSError:
+            return []
+
+    def list_usb(self):
+        try:
+            # Interfaces ("1-1:1.0") and hubs' ports are not devices of their own
+            return sorted(n for n in os.listdir(self.USB_ROOT)
+                          if ":" not in n and os.path.exists(os.path.join(self.USB_ROOT, n, "idVendor")))
+        except OSError:
+            return []
+
+    def read_pci(self, name):
+        path = os.path.join(self.PCI_ROOT, name)
+        if not os.path.isdir(path):
+            return None
+        try:
+            vendor_id = int(self._read(os.path.join(path, "vendor"), "0"), 16)
+            device_id = int(self._read(os.path.join(path, "device"), "0"), 16)
+        except ValueError:
+            return None
+
+        ids = self.pci_ids()
+        info = {
+            "name": ids.device(vendor_id, device_id) or f"Device {device_id:04x}",
+            "vendor": ids.vendor(vendor_id) or f"Vendor {vendor_id:04x}",
+            "ids": f"{vendor_id:04x}:{device_id:04x}",
+            "driver": self._driver(path),
+            "power": self._read(os.path.join(path, "power_state")),
+            "runtime": self._read(os.path.join(path, "power", "runtime_status")),
+            "link": None,
+        }
+
+        speed = self._read(os.path.join(path, "current_link_speed"))
+        width = self._read(os.path.join(path, "current_link_width"))
+        if speed and width and not speed.startswith("Unknown"):
+            link = f"{speed} x{width}"
+            max_speed = self._read(os.path.join(path, "max_link_speed"))
+            max_width = self._read(os.path.join(path, "max_link_width"))
+            if max_speed and max_width and (max_speed, max_width) != (speed, width):
+                link += f" (max {max_speed} x{max_width})"
+            info["link"] = link
+        return info
+
+    def read_usb(self, name):
+        path = os.path.join(self.USB_ROOT, name)
+        vendor_hex = self._read(os.path.join(path, "idVendor"))
+        product_hex = self._read(os.path.join(path, "idProduct"))
+        if not vendor_hex or not product_hex:
+            return None
+        vendor_id, device_id = int(vendor_hex, 16), int(product_hex, 16)
+
+        # Drivers are bound to the interfaces, not to the device itself
+        drivers = []
+        try:
+            for entry in sorted(os.listdir(path)):
+                if entry.startswith(name + ":"):
+                    driver = self._driver(os.path.join(path, entry))
+                    if driver and driver not in drivers:
+                        drivers.append(driver)
+        except OSError:
+            pass
+
+        ids = self.usb_ids()
+        speed = self._read(os.path.join(path, "speed"))
+        return {
+            "name": self._read(os.path.join(path, "product")) or ids.device(vendor_id, device_id) or f"Device {device_id:04x}",
+            "vendor": self._read(os.path.join(path, "manufacturer")) or ids.vendor(vendor_id) or f"Vendor {vendor_id:04x}",
+            "ids": f"{vendor_id:04x}:{device_id:04x}",
+            "driver": ", ".join(drivers) or None,
+            "power": None,
+            "runtime": self._read(os.path.join(path, "power", "runtime_status")),
+            "link": f"{speed} Mb/s" if speed else None,
+        }
+
+
+class UeventMonitor:
+    """Kernel hotplug events from a NETLINK_KOBJECT_UEVENT socket, on the main loop."""
+
+    NETLINK_KOBJECT_UEVENT = 15
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.sock = None
+        self.source = None
+
+    def start(self):
+        try:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, self.NETLINK_KOBJECT_UEVENT)
+            # Multicast group 1 carries the kernel's own events
+            self.sock.bind((0, 1))
+            self.sock.setblocking(False)
+        except (OSError, AttributeError) as e:
+            print(f"[ERROR] Hotplug monitoring unavailable: {e}")
+            self.sock = None
+            return False
+        self.source = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_readable)
+        return True
+
+    def on_readable(self, fd, condition):
+        while True:
+            try:
+                data = self.sock.recv(16384)
+            except BlockingIOError:
+                break
+            except OSError:
+                return True
+            fields = {}
+            for part in data.split(b"\0")[1:]:
+                key, sep, value = part.partition(b"=")
+                if sep:
+                    fields[key.decode(errors="replace")] = value.decode(errors="replace")
+            if fields:
+                self.callback(fields)
+        return True
+
+    def stop(self):
+        if self.source:
+            GLib.source_remove(self.source)
+            self.source = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
 
 class LinuxUtilityApp(Adw.Application):
 
     # Cached detection results
     _cached_pkg_manager = None
+    _cached_pkg_index = None
     _cached_terminal = None
 
     def __init__(self):
@@ -126,11 +3510,40 @@ class LinuxUtilityApp(Adw.Application):
         self.mem_history = [0] * 50
         self.freq_history = [0] * 50
         self.swap_history = [0] * 50
+        self.power_history = [0] * 50
+        self.throttle_history = [None] * 50
         
         # I/O Tracking
         self.last_net_io = psutil.net_io_counters()
         self.last_disk_io = psutil.disk_io_counters()
         self.last_refresh_time = time.time()
+
+        # systemd over D-Bus (system units and the user's session units)
+        self.systemd = SystemdClient()
+        self.user_systemd = SystemdClient(Gio.BusType.SESSION)
+
+        # Root helper for privileged one-shot actions
+        self.helper = PrivilegedHelperClient(self.get_resource_path("helper.py"))
+        self.smart = SmartMonitor(self.helper)
+        self.power_monitor = PowerMonitor(self.helper)
+
+        # Config files the toggles switch between shipped variants
+        self.config_variants = ConfigVariantStore()
+        self.config_variants.register("general.conf", "~/.config/hypr/hyprland/general.conf", {
+            "original": self.get_resource_path("configs/general.conf.original"),
+            "pivot": self.get_resource_path("configs/general.conf.pivot"),
+        })
+        self.config_variants.register("MangoHud.conf", "~/.config/MangoHud/MangoHud.conf", {
+            "disabled": self.get_resource_path("configs/MangoHud.conf.disabled"),
+            "enabled": self.get_resource_path("configs/MangoHud.conf.enabled"),
+        }, legacy={
+            # Before the LOGGING section was added
+            "enabled": {"c54f4049bc40335889d1d6e30473455651d9478436ba9d489d53fc6de07aa4cd"},
+        })
+
+        # Background commands with captured output
+        self.job_runner = JobRunner()
+        self.job_runner.listeners.append(self.on_job_event)
         
         self.apply_custom_css()
 
@@ -174,7 +3587,6 @@ class LinuxUtilityApp(Adw.Application):
     # ------------------------------
 
     def get_resource_path(self, relative_path):
-        import sys
         base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
         return os.path.join(base_path, relative_path)
 
@@ -197,7 +3609,7 @@ class LinuxUtilityApp(Adw.Application):
         sidebar_header = Adw.HeaderBar(show_end_title_buttons=False)
         sidebar_vbox.append(sidebar_header)
 
-        sidebar_list = Gtk.ListBox(css_classes=["navigation-sidebar", "sidebar-list"])
+        self.sidebar_list = sidebar_list = Gtk.ListBox(css_classes=["navigation-sidebar", "sidebar-list"])
         sidebar_list.set_selection_mode(Gtk.SelectionMode.SINGLE)
         
         # Menu Items
@@ -205,7 +3617,11 @@ class LinuxUtilityApp(Adw.Application):
             ("Diagnostics", "dialog-information-symbolic", "info"),
             ("Tools", "preferences-other-symbolic", "tools"),
             ("Utilities", "applications-system-symbolic", "utils"),
-            ("Startup", "system-run-symbolic", "startup")
+            ("Startup", "system-run-symbolic", "startup"),
+            ("Hardware", "computer-symbolic", "hardware"),
+            ("Frametimes", "applications-games-symbolic", "frametimes"),
+            ("Logs", "text-x-generic-symbolic", "logs"),
+            ("Jobs", "utilities-system-monitor-symbolic", "jobs")
         ]
 
         for label, icon, tag in self.nav_items:
@@ -226,6 +3642,13 @@ class LinuxUtilityApp(Adw.Application):
         self.content_stack.add_titled(self.create_tools_page(), "tools", "Tools")
         self.content_stack.add_titled(self.create_utilities_page(), "utils", "Utilities")
         self.content_stack.add_titled(self.create_startup_page(), "startup", "Startup")
+        self.content_stack.add_titled(self.create_hardware_page(), "hardware", "Hardware")
+        self.content_stack.add_titled(self.create_frametimes_page(), "frametimes", "Frametimes")
+        self.content_stack.add_titled(self.create_logs_page(), "logs", "Logs")
+        self.content_stack.add_titled(self.create_jobs_page(), "jobs", "Jobs")
+        self.content_stack.connect("notify::visible-child-name", self.on_page_changed)
+        # The first page is already visible, so the handler won't run for it
+        self.power_monitor.show(self.content_stack.get_visible_child_name() == "info")
 
         content_page = Adw.NavigationPage(title="Control Panel")
         content_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -248,6 +3671,28 @@ class LinuxUtilityApp(Adw.Application):
             # On mobile/small screens, show content
             self.split_view.set_show_content(True)
 
+    def on_page_changed(self, stack, pspec):
+        # Probe latency only while Diagnostics is visible
+        if stack.get_visible_child_name() == "info":
+            self.latency_prober.start()
+        else:
+            self.latency_prober.stop()
+        # Root-only energy counters keep the helper busy, read them only while they are shown
+        self.power_monitor.show(stack.get_visible_child_name() == "info")
+
+        # Only keep the journal stream open while the Logs page is visible
+        if stack.get_visible_child_name() == "logs":
+            if not self.journal_following:
+                self.restart_journal()
+        elif self.journal_following:
+            self.journal_reader.stop()
+            self.journal_following = False
+
+    def show_page(self, tag):
+        """Switch to a page by its tag, keeping the sidebar selection in sync."""
+        tags = [item[2] for item in self.nav_items]
+        self.sidebar_list.select_row(self.sidebar_list.get_row_at_index(tags.index(tag)))
+
     # ------------------------------
     # GRAPH LOGIC
     # ------------------------------
@@ -268,12 +3713,17 @@ class LinuxUtilityApp(Adw.Application):
             "green":  (self.mem_history,  (0.1, 0.8, 0.4)),
             "orange": (self.swap_history, (1.0, 0.5, 0.1)),
             "purple": (self.freq_history, (0.6, 0.3, 0.8)),
+            "red":    (self.power_history, (0.9, 0.3, 0.3)),
         }
 
         if color not in graph_map:
             return
 
         history, (r, g, b) = graph_map[color]
+        # Watts have no fixed maximum, scale to the power limit or the peak
+        scale = 100.0
+        if color == "red":
+            scale = max(self.power_monitor.limit_w or 0, max(history) * 1.2, 1.0)
 
         # Background with subtle gradient
         pattern = cairo.LinearGradient(0, 0, 0, height)
@@ -286,6 +3736,9 @@ class LinuxUtilityApp(Adw.Application):
         if len(history) < 2:
             return
 
+        if color in ("purple", "red"):
+            self.draw_throttle_bands(cr, width, height)
+
         # Main Line and Fill
         cr.set_line_width(2.5)
         cr.set_line_join(cairo.LineJoin.ROUND)
@@ -296,7 +3749,7 @@ class LinuxUtilityApp(Adw.Application):
         # Create Path for fill
         cr.move_to(0, height)
         for i, val in enumerate(history):
-            val = max(0, min(val, 100))
+            val = max(0, min(val * 100.0 / scale, 100))
             y = height - (val / 100.0 * height)
             cr.line_to(i * step, y)
         cr.line_to(width, height)
@@ -312,6 +3765,33 @@ class LinuxUtilityApp(Adw.Application):
         cr.set_source_rgb(r, g, b)
         cr.stroke()
 
+    THROTTLE_COLORS = {"thermal": (0.9, 0.2, 0.2), "power": (1.0, 0.7, 0.1)}
+
+    def draw_throttle_bands(self, cr, width, height):
+        """Shade the samples where the CPU was throttled, behind the line."""
+        step = width / (len(self.throttle_history) - 1)
+        for i, kind in enumerate(self.throttle_history):
+            if kind:
+                cr.set_source_rgba(*self.THROTTLE_COLORS[kind], 0.25)
+                cr.rectangle(i * step - step / 2, 0, step, height)
+                cr.fill()
+
+    def format_throttle_status(self):
+        window = len(self.throttle_history) * 2
+        current = self.throttle_history[-1]
+        if current:
+            parts = ["Thermal throttling now" if current == "thermal" else "Power-limit throttling now"]
+        else:
+            flagged = sum(1 for kind in self.throttle_history if kind)
+            parts = [f"Throttled {flagged * 2} s of the last {window} s" if flagged else f"None in the last {window} s"]
+        counts = self.power_monitor.counts
+        if counts:
+            events = [f"{counts['thermal']} thermal"] if "thermal" in counts else []
+            if "power" in counts:
+                events.append(f"{counts['power']} power-limit")
+            parts.append(" / ".join(events) + " events since boot")
+        return " · ".join(parts)
+
     # ------------------------------
     # TOOLS PAGE
     # ------------------------------
@@ -337,7 +3817,7 @@ class LinuxUtilityApp(Adw.Application):
         # Fastpak Install
         software_group.add(self.create_utility_row(
             "Install Flatpaks", "Install predefined Flatpak applications",
-            "flatpak-symbolic", lambda: self.open_terminal(self.install_flatpaks())
+            "flatpak-symbolic", self.on_install_flatpaks
         ))
         
         # CUPS Row
@@ -372,7 +3852,11 @@ class LinuxUtilityApp(Adw.Application):
         journal_row.add_prefix(Gtk.Image.new_from_icon_name("utilities-terminal-symbolic"))
         copy_j = Gtk.Button(icon_name="edit-copy-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"])
         copy_j.connect("clicked", lambda x: self.copy_to_clipboard(journal_cmd))
+        open_j = Gtk.Button(icon_name="go-next-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"])
+        open_j.set_tooltip_text("Show in Logs")
+        open_j.connect("clicked", lambda x: self.view_system_logs(priority=3))
         journal_row.add_suffix(copy_j)
+        journal_row.add_suffix(open_j)
         snippet_group.add(journal_row)
 
         # Pacman Orphans Snippet
@@ -441,7 +3925,8 @@ class LinuxUtilityApp(Adw.Application):
             mango_row = Adw.ActionRow(title="MangoHud Toggle", subtitle="Swap local config to ~/.config/MangoHud/")
             mango_row.add_prefix(Gtk.Image.new_from_icon_name("applications-games-symbolic"))
             mango_sw = Gtk.Switch(active=self.get_config_status("MangoHud.conf"), valign=Gtk.Align.CENTER)
-            mango_sw.connect("state-set", self.on_config_toggle, "MangoHud.conf", "~/.config/MangoHud/MangoHud.conf")
+            mango_sw.connect("state-set", self.on_config_toggle, "MangoHud.conf")
+            mango_row.add_suffix(self.create_restore_config_button("MangoHud.conf", mango_sw))
             mango_row.add_suffix(mango_sw)
             advanced_group.add(mango_row)
 
@@ -450,7 +3935,8 @@ class LinuxUtilityApp(Adw.Application):
             pivot_row = Adw.ActionRow(title="Monitor Pivot (DP-2)", subtitle="Swap Hyprland layout config")
             pivot_row.add_prefix(Gtk.Image.new_from_icon_name("video-display-symbolic"))
             pivot_sw = Gtk.Switch(active=self.get_config_status("general.conf"), valign=Gtk.Align.CENTER)
-            pivot_sw.connect("state-set", self.on_config_toggle, "general.conf", "~/.config/hypr/hyprland/general.conf")
+            pivot_sw.connect("state-set", self.on_config_toggle, "general.conf")
+            pivot_row.add_suffix(self.create_restore_config_button("general.conf", pivot_sw))
             pivot_row.add_suffix(pivot_sw)
             advanced_group.add(pivot_row)
             
@@ -476,6 +3962,10 @@ class LinuxUtilityApp(Adw.Application):
         graph_grid.attach(mem_g, 1, 0, 1, 1)
         graph_grid.attach(swap_g, 0, 1, 1, 1)
         graph_grid.attach(freq_g, 1, 1, 1, 1)
+        # Throttled samples are shaded red (thermal) or amber (power limit) on frequency and power
+        if self.power_monitor.domains:
+            power_g, self.power_label, self.power_draw_area = self.create_graph("CPU Power", "red")
+            graph_grid.attach(power_g, 0, 2, 2, 1)
 
         perf_group.add(graph_grid)
         vbox.append(perf_group)
@@ -497,8 +3987,14 @@ class LinuxUtilityApp(Adw.Application):
         cpu_row.add_row(self.create_action_row("Cores", f"{psutil.cpu_count(logical=False)} Physical / {psutil.cpu_count()} Logical", "processor-symbolic"))
         self.temp_row = self.create_action_row("Temperature", self.get_temp(), "sensors-temperature-symbolic")
         cpu_row.add_row(self.temp_row)
+        self.throttle_row = self.create_action_row("Throttling", self.format_throttle_status(), "dialog-warning-symbolic")
+        cpu_row.add_row(self.throttle_row)
         # Added Microcode/Sec Info
-        cpu_row.add_row(self.create_action_row("Microcode", "Click 'Microcode Status' in Tools for details", "security-high-symbolic"))
+        self.microcode_row = self.create_action_row("Microcode", self.get_microcode_summary(), "security-high-symbolic")
+        self.microcode_row.set_activatable(True)
+        self.microcode_row.add_suffix(Gtk.Image.new_from_icon_name("go-next-symbolic"))
+        self.microcode_row.connect("activated", lambda r: self.check_microcode())
+        cpu_row.add_row(self.microcode_row)
         cpu_mb_group.add(cpu_row)
 
         mb_row = Adw.ExpanderRow(title="Motherboard &amp; BIOS", subtitle="Hardware Identification")
@@ -525,17 +4021,12 @@ class LinuxUtilityApp(Adw.Application):
         mem_row.add_row(self.mem_avail_row)
         storage_group.add(mem_row)
 
-        for part in psutil.disk_partitions():
-            if part.fstype in ['ext4', 'btrfs', 'xfs', 'ntfs', 'vfat']:
-                try:
-                    usage = psutil.disk_usage(part.mountpoint)
-                    disk_row = Adw.ExpanderRow(title=f"Disk ({part.mountpoint})", subtitle=f"{usage.percent}% Used")
-                    disk_row.add_prefix(Gtk.Image.new_from_icon_name("drive-harddisk-symbolic"))
-                    disk_row.add_row(self.create_action_row("Total Space", f"{round(usage.total/1e9, 1)} GB", "drive-harddisk-symbolic"))
-                    disk_row.add_row(self.create_action_row("Used", f"{round(usage.used/1e9, 1)} GB", "drive-harddisk-symbolic"))
-                    disk_row.add_row(self.create_action_row("Free", f"{round(usage.free/1e9, 1)} GB", "drive-harddisk-symbolic"))
-                    storage_group.add(disk_row)
-                except: continue
+        # Disk rows are filled in from worker threads, a hung mount must not block startup
+        self.storage_group = storage_group
+        self.storage_rows = {}
+        self.storage = StorageMonitor()
+        self.refresh_storage()
+        GLib.timeout_add_seconds(10, self.refresh_storage)
         vbox.append(storage_group)
 
         # 6. Connectivity
@@ -552,15 +4043,45 @@ class LinuxUtilityApp(Adw.Application):
         pub_ip_btn.connect("clicked", self.update_public_ip)
         self.pub_ip_row.add_suffix(pub_ip_btn)
         conn_group.add(self.pub_ip_row)
+
+        # Show the cached address right away, refresh it in the background when stale
+        self.public_ip = PublicIPResolver()
+        self._public_ip_refresh = None
+        self.update_public_ip(force=False)
+        Gio.NetworkMonitor.get_default().connect("network-changed", self.on_network_changed)
         vbox.append(conn_group)
 
+        # Network Latency
+        self.latency_group = Adw.PreferencesGroup(title="Network Latency")
+        edit_targets_btn = Gtk.Button(icon_name="document-edit-symbolic", css_classes=["flat"], tooltip_text="Edit targets")
+        edit_targets_btn.connect("clicked", self.on_edit_latency_targets)
+        self.latency_group.set_header_suffix(edit_targets_btn)
+        self.latency_area = Gtk.DrawingArea(content_height=100)
+        self.latency_area.set_draw_func(self.draw_latency_graph)
+        self.latency_area.set_margin_bottom(12)
+        self.latency_group.add(self.latency_area)
+        self.latency_rows = {}
+        self.latency_prober = None
+        self.setup_latency_prober()
+        vbox.append(self.latency_group)
+
         # 7. Health &amp; Resources
         health_group = Adw.PreferencesGroup(title="Health &amp; Resources")
         self.top_proc_row = self.create_action_row("Top Resource Consumer", "Identifying...", "process-stop-symbolic")
         health_group.add(self.top_proc_row)
 
-        self.battery_row = self.create_action_row("Battery", self.get_battery(), "battery-full-symbolic")
+        # Battery state is pushed by UPower, the expander holds wear and rate history
+        self.battery_row = Adw.ExpanderRow(title="Battery", subtitle="Waiting...", enable_expansion=False)
+        self.battery_row.add_prefix(Gtk.Image.new_from_icon_name("battery-full-symbolic"))
+        self.battery_rates_row = Adw.ActionRow(title="Charge Rate History", subtitle="No samples yet")
+        self.battery_row.add_row(self.battery_rates_row)
+        self.battery_graph = Gtk.DrawingArea(content_height=60, margin_start=12, margin_end=12, margin_top=6, margin_bottom=6)
+        self.battery_graph.set_draw_func(self.draw_battery_graph)
+        self.battery_row.add_row(self.battery_graph)
+        self.battery_detail_rows = {}
         health_group.add(self.battery_row)
+        self.battery_monitor = BatteryMonitor(self.on_battery_changed)
+        self.battery_monitor.start()
         self.fans_row = self.create_action_row("Fan Speed", self.get_fans(), "sensors-fan-symbolic")
         health_group.add(self.fans_row)
         vbox.append(health_group)
@@ -619,7 +4140,7 @@ class LinuxUtilityApp(Adw.Application):
         ))
         maintenance_group.add(self.create_utility_row(
             "Clear Home Cache", "Remove files from ~/.cache", 
-            "edit-clear-symbolic", lambda: self.open_terminal("rm -rf ~/.cache/* && echo 'Cache cleared' && sleep 3")
+            "edit-clear-symbolic", lambda: self.run_job("Clear Home Cache", ["sh", "-c", "rm -rf ~/.cache/*"])
         ))
         maintenance_group.add(self.create_utility_row(
             "Log Rotation (Manual)", "Force system logs to rotate immediately", 
@@ -639,33 +4160,24 @@ class LinuxUtilityApp(Adw.Application):
 
 
         # 3. Service Management
-        services_adm_group = Adw.PreferencesGroup(title="Service Management")
-        for svc in ["NetworkManager", "docker", "bluetooth", "cups"]:
-            row = Adw.ActionRow(title=f"Service: {svc}")
-            row.add_prefix(Gtk.Image.new_from_icon_name("system-run-symbolic"))
-            
-            # Status btn
-            status_btn = Gtk.Button(icon_name="dialog-information-symbolic", css_classes=["flat"])
-            status_btn.connect("clicked", lambda x, s=svc: self.on_service_action(s, "status"))
-            
-            # Restart btn
-            restart_btn = Gtk.Button(icon_name="view-refresh-symbolic", css_classes=["flat", "warning"])
-            restart_btn.connect("clicked", lambda x, s=svc: self.on_service_action(s, "restart"))
-            
-            row.add_suffix(status_btn)
-            row.add_suffix(restart_btn)
-            services_adm_group.add(row)
-        vbox.append(services_adm_group)
+        self.services_adm_group = Adw.PreferencesGroup(title="Service Management")
+        edit_services_btn = Gtk.Button(icon_name="document-edit-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"])
+        edit_services_btn.set_tooltip_text("Edit monitored services")
+        edit_services_btn.connect("clicked", self.on_edit_monitored_services)
+        self.services_adm_group.set_header_suffix(edit_services_btn)
+        self.service_rows = {}
+        self.populate_service_rows()
+        vbox.append(self.services_adm_group)
 
         # 4. System Services
         services_group = Adw.PreferencesGroup(title="System Services")
         services_group.add(self.create_utility_row(
             "Restart Network", "Restart NetworkManager service", 
-            "network-wired-symbolic", lambda: self.open_terminal("sudo systemctl restart NetworkManager && echo 'Done' && sleep 3")
+            "network-wired-symbolic", lambda: self.restart_services(["NetworkManager"])
         ))
         services_group.add(self.create_utility_row(
             "Restart Audio", "Restart PipeWire and WirePlumber", 
-            "audio-volume-high-symbolic", lambda: self.open_terminal("systemctl --user restart pipewire pipewire-pulse wireplumber && echo 'Done' && sleep 3")
+            "audio-volume-high-symbolic", lambda: self.restart_services(["pipewire", "pipewire-pulse", "wireplumber"], user=True)
         ))
         services_group.add(self.create_utility_row(
             "Restart Bluetooth", "Reset the Bluetooth stack and service", 
@@ -681,7 +4193,7 @@ class LinuxUtilityApp(Adw.Application):
         ))
         services_group.add(self.create_utility_row(
             "Flatpak Repair", "Fix broken Flatpak installations", 
-            "flatpak-symbolic", lambda: self.open_terminal("flatpak repair -y && echo 'Done' && sleep 5")
+            "flatpak-symbolic", lambda: self.run_job("Flatpak Repair", self.privileged_argv("flatpak repair -y"))
         ))
         vbox.append(services_group)
 
@@ -701,7 +4213,7 @@ class LinuxUtilityApp(Adw.Application):
         ))
 
         # Game Prefix Row
-        game_prefix = "mangohud gamemoderun gamescope -W 1920 -H 1080 -r 75 --force-grab-cursor -f -- %command%"
+        game_prefix = GAME_PREFIX
         prefix_row = Adw.ActionRow(title="Game Prefix", subtitle=game_prefix)
         prefix_row.set_subtitle_selectable(True)
         prefix_row.add_prefix(Gtk.Image.new_from_icon_name("applications-games-symbolic"))
@@ -745,7 +4257,12 @@ class LinuxUtilityApp(Adw.Application):
         info_banner.set_child(info_label)
         vbox.append(info_banner)
 
-        self.refresh_startup_list()
+        self.startup_rows = {}
+        self.startup_list_box.set_sort_func(self.sort_startup_rows)
+        self.autostart = AutostartMonitor(self.on_autostart_changed)
+        for filename, entry in self.autostart.entries().items():
+            self.on_autostart_changed(filename, entry)
+        self.autostart.start()
         vbox.append(self.startup_list_box)
 
         add_btn = Gtk.Button(
@@ -754,48 +4271,938 @@ class LinuxUtilityApp(Adw.Application):
             halign=Gtk.Align.CENTER,
             css_classes=["suggested-action", "pill"]
         )
-        add_btn.connect("clicked", self.on_add_startup_click)
-        vbox.append(add_btn)
+        add_btn.connect("clicked", self.on_add_startup_click)
+        vbox.append(add_btn)
+
+        return self.wrap_in_resizable_view(vbox)
+
+    # --- HARDWARE PAGE ---
+
+    def create_hardware_page(self):
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=24)
+        self.hardware = HardwareInventory()
+        self.hardware_rows = {}
+        self.hardware_pending = set()
+
+        self.pci_group = Adw.PreferencesGroup(title="PCI Devices")
+        self.usb_group = Adw.PreferencesGroup(title="USB Devices")
+        vbox.append(self.pci_group)
+        vbox.append(self.usb_group)
+
+        for name in self.hardware.list_pci():
+            self.update_hardware_row("pci", name)
+        for name in self.hardware.list_usb():
+            self.update_hardware_row("usb", name)
+
+        self.uevent_monitor = UeventMonitor(self.on_uevent)
+        self.uevent_monitor.start()
+
+        return self.wrap_in_resizable_view(vbox)
+
+    def format_hardware_subtitle(self, name, info):
+        parts = [info["vendor"], name, info["ids"]]
+        parts.append(f"Driver: {info['driver']}" if info["driver"] else "No driver")
+        if info["link"]:
+            parts.append(info["link"])
+        power = " / ".join(p for p in (info["power"], info["runtime"]) if p)
+        if power:
+            parts.append(f"Power: {power}")
+        return " · ".join(parts)
+
+    def update_hardware_row(self, bus, name):
+        """Add, refresh or remove the row for one device."""
+        info = self.hardware.read_pci(name) if bus == "pci" else self.hardware.read_usb(name)
+        group = self.pci_group if bus == "pci" else self.usb_group
+        row = self.hardware_rows.get((bus, name))
+
+        if info is None:
+            if row:
+                group.remove(row)
+                del self.hardware_rows[(bus, name)]
+            return
+
+        if row is None:
+            row = Adw.ActionRow()
+            row.add_prefix(Gtk.Image.new_from_icon_name("computer-symbolic" if bus == "pci" else "media-removable-symbolic"))
+            group.add(row)
+            self.hardware_rows[(bus, name)] = row
+        row.set_title(GLib.markup_escape_text(info["name"]))
+        row.set_subtitle(GLib.markup_escape_text(self.format_hardware_subtitle(name, info)))
+
+    def on_uevent(self, event):
+        subsystem = event.get("SUBSYSTEM")
+        if subsystem == "pci":
+            key = ("pci", os.path.basename(event.get("DEVPATH", "")))
+        elif subsystem == "usb" and event.get("DEVTYPE") in ("usb_device", "usb_interface"):
+            # Interface events update the parent device's driver list
+            key = ("usb", os.path.basename(event.get("DEVPATH", "")).split(":")[0])
+        else:
+            return
+
+        # A single plug-in emits a burst of events; update once it settles
+        if not self.hardware_pending:
+            GLib.timeout_add(250, self.flush_hardware_rows)
+        self.hardware_pending.add(key)
+
+    def flush_hardware_rows(self):
+        for bus, name in sorted(self.hardware_pending):
+            self.update_hardware_row(bus, name)
+        self.hardware_pending.clear()
+        return False
+
+    # --- FRAMETIMES PAGE ---
+
+    def create_frametimes_page(self):
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=24)
+        self.frametime_log = None
+        self.frametime_stats = None
+        self.mangohud_log_dir = FrametimeLog.default_folder([
+            os.path.expanduser("~/.config/MangoHud/MangoHud.conf"),
+            self.get_resource_path("configs/MangoHud.conf.enabled"),
+        ])
+
+        self.mangohud_logs_group = Adw.PreferencesGroup(title="MangoHud Logs", description=self.mangohud_log_dir)
+        refresh_btn = Gtk.Button(icon_name="view-refresh-symbolic", css_classes=["flat"], tooltip_text="Rescan")
+        refresh_btn.connect("clicked", lambda b: self.populate_mangohud_logs())
+        self.mangohud_logs_group.set_header_suffix(refresh_btn)
+        self.mangohud_log_rows = []
+        vbox.append(self.mangohud_logs_group)
+
+        self.frametime_summary_group = Adw.PreferencesGroup(title="Summary", description="Select a log to analyze")
+        self.frametime_rows = {}
+        for key, title in (("fps", "Average FPS"), ("lows", "1% / 0.1% Lows"), ("percentiles", "Frametime Percentiles"),
+                           ("stutters", "Stutters"), ("length", "Length"), ("load", "Average CPU / GPU Load")):
+            row = Adw.ActionRow(title=title, subtitle="-")
+            self.frametime_summary_group.add(row)
+            self.frametime_rows[key] = row
+        vbox.append(self.frametime_summary_group)
+
+        plot_group = Adw.PreferencesGroup(title="Frametime")
+        self.frametime_area = Gtk.DrawingArea(content_height=160)
+        self.frametime_area.set_draw_func(self.draw_frametime_plot)
+        self.frametime_area.connect("resize", self.prepare_frametime_plot)
+        self.frametime_plot = None
+        plot_group.add(self.frametime_area)
+        vbox.append(plot_group)
+
+        load_group = Adw.PreferencesGroup(title="CPU / GPU Load", description="CPU in blue, GPU in orange")
+        self.frametime_load_area = Gtk.DrawingArea(content_height=100)
+        self.frametime_load_area.set_draw_func(self.draw_frametime_load_plot)
+        self.frametime_load_area.connect("resize", self.prepare_frametime_load_plot)
+        self.frametime_load_plot = None
+        load_group.add(self.frametime_load_area)
+        vbox.append(load_group)
+
+        self.benchmarks = BenchmarkStore()
+        self.benchmark_samples = None
+        self.benchmark_selected = set()
+        self.benchmark_group = Adw.PreferencesGroup(
+            title="Benchmarks", description="Runs a game with the Game Prefix and MangoHud logging for a fixed time"
+        )
+        bench_buttons = Gtk.Box(spacing=6)
+        self.benchmark_compare_btn = Gtk.Button(label="Compare", sensitive=False, css_classes=["flat"])
+        self.benchmark_compare_btn.connect("clicked", lambda b: self.show_benchmark_comparison())
+        self.benchmark_run_btn = Gtk.Button(label="Run", css_classes=["suggested-action"])
+        self.benchmark_run_btn.connect("clicked", lambda b: self.on_run_benchmark_click())
+        bench_buttons.append(self.benchmark_compare_btn)
+        bench_buttons.append(self.benchmark_run_btn)
+        self.benchmark_group.set_header_suffix(bench_buttons)
+        self.benchmark_rows = []
+        vbox.append(self.benchmark_group)
+
+        self.populate_mangohud_logs()
+        self.populate_benchmarks()
+        return self.wrap_in_resizable_view(vbox)
+
+    # --- Benchmarks ---
+
+    def load_benchmark_settings(self):
+        try:
+            with open(os.path.join(CONFIG_DIR, "benchmark.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"label": "", "command": "", "prefix": GAME_PREFIX, "delay": 10, "duration": 60, "fps_limit": 0}
+
+    def save_benchmark_settings(self, settings):
+        try:
+            os.makedirs(CONFIG_DIR, exist_ok=True)
+            with open(os.path.join(CONFIG_DIR, "benchmark.json"), "w") as f:
+                json.dump(settings, f)
+        except OSError as e:
+            print(f"[ERROR] Failed to save benchmark settings: {e}")
+
+    def on_run_benchmark_click(self):
+        if np is None:
+            self.toast_overlay.add_toast(Adw.Toast(title="Install python-numpy to run benchmarks"))
+            return
+
+        settings = self.load_benchmark_settings()
+        box = Gtk.ListBox(css_classes=["boxed-list"], selection_mode=Gtk.SelectionMode.NONE)
+        label_row = Adw.EntryRow(title="Label (e.g. gamescope, vsync off)", text=settings["label"])
+        command_row = Adw.EntryRow(title="Game command", text=settings["command"])
+        prefix_row = Adw.EntryRow(title="Prefix (%command% is replaced)", text=settings["prefix"])
+        delay_spin = Gtk.SpinButton.new_with_range(0, 600, 5)
+        delay_spin.set_value(settings["delay"])
+        delay_spin.set_valign(Gtk.Align.CENTER)
+        delay_row = Adw.ActionRow(title="Start logging after (s)")
+        delay_row.add_suffix(delay_spin)
+        duration_spin = Gtk.SpinButton.new_with_range(10, 3600, 10)
+        duration_spin.set_value(settings["duration"])
+        duration_spin.set_valign(Gtk.Align.CENTER)
+        duration_row = Adw.ActionRow(title="Log duration (s)")
+        duration_row.add_suffix(duration_spin)
+        fps_limit_spin = Gtk.SpinButton.new_with_range(0, 1000, 5)
+        fps_limit_spin.set_value(settings.get("fps_limit", 0))
+        fps_limit_spin.set_valign(Gtk.Align.CENTER)
+        fps_limit_row = Adw.ActionRow(title="FPS limit", subtitle="Applied through MangoHud, 0 for none")
+        fps_limit_row.add_suffix(fps_limit_spin)
+        for row in (label_row, command_row, prefix_row, delay_row, duration_row, fps_limit_row):
+            box.append(row)
+
+        dialog = Adw.MessageDialog(transient_for=self.toast_overlay.get_root(), heading="Run Benchmark",
+                                   body="The game is stopped after the log duration.", extra_child=box)
+        dialog.add_response("cancel", "Cancel")
+        dialog.add_response("run", "Run")
+        dialog.set_response_appearance("run", Adw.ResponseAppearance.SUGGESTED)
+
+        def on_response(dialog, response):
+            if response != "run":
+                return
+            settings = {
+                "label": label_row.get_text().strip(),
+                "command": command_row.get_text().strip(),
+                "prefix": prefix_row.get_text().strip(),
+                "delay": int(delay_spin.get_value()),
+                "duration": int(duration_spin.get_value()),
+                "fps_limit": int(fps_limit_spin.get_value()),
+            }
+            if not settings["command"]:
+                self.toast_overlay.add_toast(Adw.Toast(title="Enter the game command"))
+                return
+            self.save_benchmark_settings(settings)
+            self.run_benchmark(settings)
+
+        dialog.connect("response", on_response)
+        dialog.present()
+
+    def run_benchmark(self, settings):
+        """Launch the game with MangoHud autologging and stop it once the log is complete."""
+        run_dir = self.benchmarks.new_run_dir()
+        prefix = settings["prefix"] or "%command%"
+        command = prefix.replace("%command%", settings["command"]) if "%command%" in prefix else f"{prefix} {settings['command']}"
+        # read_cfg keeps the user's MangoHud.conf, which MANGOHUD_CONFIG would otherwise replace
+        mangohud_config = f"read_cfg,output_folder={run_dir},autostart_log={settings['delay']},log_duration={settings['duration']}"
+        if settings.get("fps_limit"):
+            mangohud_config += f",fps_limit={settings['fps_limit']}"
+        total = settings["delay"] + settings["duration"] + 5
+
+        argv = ["timeout", "--kill-after=10", str(total),
+                "env", "MANGOHUD=1", f"MANGOHUD_CONFIG={mangohud_config}", "sh", "-c", f"exec {command}"]
+        self.benchmark_samples = []
+        self.benchmark_run_btn.set_sensitive(False)
+        self.benchmark_group.set_description(f"Running {settings['label'] or settings['command']} for {total} s...")
+
+        def on_done(job):
+            samples, self.benchmark_samples = self.benchmark_samples, None
+            self.benchmark_run_btn.set_sensitive(True)
+            self.finish_benchmark(run_dir, settings, command, samples, job)
+
+        # timeout exits with 124 when it had to stop the game, which is the normal case here
+        self.job_runner.submit(f"Benchmark: {settings['label'] or settings['command']}", argv, on_done)
+
+    def finish_benchmark(self, run_dir, settings, command, samples, job):
+        logs = FrametimeLog.list_logs(run_dir)
+        if not logs:
+            self.benchmark_group.set_description("Runs a game with the Game Prefix and MangoHud logging for a fixed time")
+            toast = Adw.Toast(title="Benchmark produced no MangoHud log", button_label="Show Log")
+            toast.connect("button-clicked", lambda t: self.show_job(job))
+            self.toast_overlay.add_toast(toast)
+            shutil.rmtree(run_dir, ignore_errors=True)
+            return
+
+        def worker():
+            try:
+                log = FrametimeLog.load(logs[0])
+                run = dict(settings, command_line=command, time=time.time(), log=os.path.basename(logs[0]),
+                           stats=log.stats(), fps_series=[float(x) for x in log.fps_per_second()], samples=samples)
+                if samples:
+                    run["system"] = {
+                        "cpu": sum(x[1] for x in samples) / len(samples),
+                        "mem": sum(x[2] for x in samples) / len(samples),
+                        "freq": sum(x[3] for x in samples) / len(samples),
+                    }
+                self.benchmarks.save(run_dir, run)
+                GLib.idle_add(self.on_benchmark_saved, run, None)
+            except (OSError, ValueError) as e:
+                GLib.idle_add(self.on_benchmark_saved, None, str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_benchmark_saved(self, run, error):
+        self.benchmark_group.set_description("Runs a game with the Game Prefix and MangoHud logging for a fixed time")
+        if error:
+            self.toast_overlay.add_toast(Adw.Toast(title=f"Benchmark log unreadable: {error}"))
+        else:
+            self.toast_overlay.add_toast(Adw.Toast(title=f"Benchmark done: {run['stats']['avg_fps']:.1f} FPS average"))
+        self.populate_benchmarks()
+        return False
+
+    def populate_benchmarks(self):
+        for row in self.benchmark_rows:
+            self.benchmark_group.remove(row)
+        self.benchmark_rows = []
+        self.benchmark_selected.clear()
+        self.benchmark_compare_btn.set_sensitive(False)
+
+        runs = self.benchmarks.runs()
+        if not runs:
+            row = Adw.ActionRow(title="No benchmark runs yet")
+            self.benchmark_group.add(row)
+            self.benchmark_rows.append(row)
+            return
+
+        for run in runs:
+            stats = run["stats"]
+            row = Adw.ActionRow(
+                title=GLib.markup_escape_text(run.get("label") or run.get("command", "")),
+                subtitle=f"{datetime.datetime.fromtimestamp(run['time']):%Y-%m-%d %H:%M} · "
+                         f"{stats['avg_fps']:.1f} FPS · 1% low {stats['low_1']:.1f} · {stats['stutters']} stutters"
+                         + (f" · limit {run['fps_limit']}" if run.get("fps_limit") else ""),
+            )
+            check = Gtk.CheckButton(valign=Gtk.Align.CENTER)
+            check.connect("toggled", self.on_benchmark_toggled, run)
+            row.add_prefix(check)
+            row.set_activatable_widget(check)
+            del_btn = Gtk.Button(icon_name="user-trash-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"])
+            del_btn.connect("clicked", self.on_delete_benchmark, run)
+            row.add_suffix(del_btn)
+            self.benchmark_group.add(row)
+            self.benchmark_rows.append(row)
+
+    def on_delete_benchmark(self, btn, run):
+        self.benchmarks.delete(run)
+        self.populate_benchmarks()
+
+    def on_benchmark_toggled(self, check, run):
+        if check.get_active():
+            self.benchmark_selected.add(run["dir"])
+        else:
+            self.benchmark_selected.discard(run["dir"])
+        self.benchmark_compare_btn.set_sensitive(len(self.benchmark_selected) >= 2)
+
+    def show_benchmark_comparison(self):
+        """Side-by-side summary of the selected runs, each tested against the oldest one."""
+        runs = sorted((r for r in self.benchmarks.runs() if r["dir"] in self.benchmark_selected), key=lambda r: r["time"])
+        if len(runs) < 2:
+            return
+
+        metrics = [
+            ("FPS Limit", lambda r: str(r["fps_limit"]) if r.get("fps_limit") else "-"),
+            ("Average FPS", lambda r: f"{r['stats']['avg_fps']:.1f}"),
+            ("1% Low", lambda r: f"{r['stats']['low_1']:.1f}"),
+            ("0.1% Low", lambda r: f"{r['stats']['low_01']:.1f}"),
+            ("P99 Frametime", lambda r: f"{r['stats']['p99']:.2f} ms"),
+            ("Stutters", lambda r: str(r['stats']['stutters'])),
+            ("CPU Load", lambda r: f"{r['system']['cpu']:.0f}%" if r.get("system") else "-"),
+            ("Memory", lambda r: f"{r['system']['mem']:.0f}%" if r.get("system") else "-"),
+        ]
+
+        grid = Gtk.Grid(column_spacing=18, row_spacing=6)
+        for col, run in enumerate(runs, start=1):
+            grid.attach(Gtk.Label(label=run.get("label") or run.get("command", ""), css_classes=["heading"],
+                                  ellipsize=Pango.EllipsizeMode.END, max_width_chars=18), col, 0, 1, 1)
+        for row, (name, fmt) in enumerate(metrics, start=1):
+            grid.attach(Gtk.Label(label=name, xalign=0, css_classes=["dim-label"]), 0, row, 1, 1)
+            for col, run in enumerate(runs, start=1):
+                grid.attach(Gtk.Label(label=fmt(run), xalign=1), col, row, 1, 1)
+
+        base = runs[0]
+        lines = []
+        if len({r.get("fps_limit") or 0 for r in runs}) > 1:
+            lines.append("The runs use different FPS limits, so FPS differences partly reflect the limit.")
+        for run in runs[1:]:
+            result = BenchmarkStore.compare(base, run)
+            name = run.get("label") or run.get("command", "")
+            if result is None:
+                lines.append(f"{name}: too short to compare")
+                continue
+            verdict = "significant" if result["p"] < 0.05 else "within noise"
+            lines.append(f"{name} vs {base.get('label') or 'first run'}: {result['diff']:+.1f} FPS "
+                         f"(95% CI ±{result['ci95']:.1f}, p={result['p']:.3f}, {verdict})")
+
+        content = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=18)
+        content.append(grid)
+        content.append(Gtk.Label(label="\n".join(lines), xalign=0, wrap=True))
+
+        dialog = Adw.MessageDialog(transient_for=self.toast_overlay.get_root(), heading="Benchmark Comparison",
+                                   body="Per-second FPS, Welch's t-test against the oldest selected run", extra_child=content)
+        dialog.add_response("close", "Close")
+        dialog.present()
+
+    def populate_mangohud_logs(self):
+        for row in self.mangohud_log_rows:
+            self.mangohud_logs_group.remove(row)
+        self.mangohud_log_rows = []
+
+        if np is None:
+            row = Adw.ActionRow(title="NumPy is not installed", subtitle="Install python-numpy to analyze MangoHud logs")
+        else:
+            logs = FrametimeLog.list_logs(self.mangohud_log_dir)[:20]
+            row = None if logs else Adw.ActionRow(title="No logs yet", subtitle="Press the MangoHud log key (Shift+F2) in a game")
+            for path in logs:
+                st = os.stat(path)
+                log_row = Adw.ActionRow(
+                    title=GLib.markup_escape_text(os.path.basename(path)),
+                    subtitle=f"{datetime.datetime.fromtimestamp(st.st_mtime):%Y-%m-%d %H:%M} · {self.format_bytes(st.st_size)}",
+                    activatable=True,
+                )
+                log_row.add_suffix(Gtk.Image.new_from_icon_name("go-next-symbolic"))
+                log_row.connect("activated", lambda r, p=path: self.analyze_frametime_log(p))
+                self.mangohud_logs_group.add(log_row)
+                self.mangohud_log_rows.append(log_row)
+        if row:
+            self.mangohud_logs_group.add(row)
+            self.mangohud_log_rows.append(row)
+
+    def analyze_frametime_log(self, path):
+        """Load and analyze a log in a worker thread."""
+        self.frametime_summary_group.set_description(f"Loading {os.path.basename(path)}...")
+
+        def on_progress(fraction):
+            GLib.idle_add(self.frametime_summary_group.set_description,
+                          f"Loading {os.path.basename(path)}... {int(fraction * 100)}%")
+
+        def worker():
+            try:
+                log = FrametimeLog.load(path, on_progress)
+                stats = log.stats()
+                GLib.idle_add(self.show_frametime_log, log, stats, None)
+            except (OSError, ValueError) as e:
+                GLib.idle_add(self.show_frametime_log, None, None, str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_frametime_log(self, log, stats, error):
+        if error:
+            self.frametime_summary_group.set_description(GLib.markup_escape_text(f"Failed to load log: {error}"))
+            return False
+
+        self.frametime_log, self.frametime_stats = log, stats
+        self.frametime_summary_group.set_description(GLib.markup_escape_text(os.path.basename(log.path)))
+        rows = self.frametime_rows
+        rows["fps"].set_subtitle(f"{stats['avg_fps']:.1f} FPS")
+        rows["lows"].set_subtitle(f"{stats['low_1']:.1f} / {stats['low_01']:.1f} FPS")
+        rows["percentiles"].set_subtitle(
+            f"P50 {stats['p50']:.2f} · P95 {stats['p95']:.2f} · P99 {stats['p99']:.2f} · P99.9 {stats['p999']:.2f} · Max {stats['max_ft']:.2f} ms"
+        )
+        rows["stutters"].set_subtitle(f"{stats['stutters']} frames over twice the local average")
+        rows["length"].set_subtitle(f"{stats['frames']} frames in {self.format_duration(int(stats['duration']))}")
+        loads = [f"{stats[k]:.0f}%" if k in stats else "-" for k in ("cpu_load", "gpu_load")]
+        rows["load"].set_subtitle(" / ".join(loads))
+
+        self.prepare_frametime_plot(self.frametime_area, self.frametime_area.get_width(), 0)
+        self.prepare_frametime_load_plot(self.frametime_load_area, self.frametime_load_area.get_width(), 0)
+        return False
+
+    def prepare_frametime_plot(self, area, width, height):
+        """Reduce the log to one column per pixel, on load and resize instead of every redraw."""
+        log = self.frametime_log
+        self.frametime_plot = None
+        if log is not None and width >= 2:
+            low, high, mean = log.envelope(log.frametime, width)
+            # One marker per pixel column is enough
+            stutters = np.unique(log.stutters() * width // len(log.frametime))
+            self.frametime_plot = (low.tolist(), high.tolist(), mean.tolist(), stutters.tolist())
+        area.queue_draw()
+
+    def prepare_frametime_load_plot(self, area, width, height):
+        log = self.frametime_log
+        self.frametime_load_plot = None
+        if log is not None and width >= 2:
+            self.frametime_load_plot = [
+                (log.envelope(values, width)[2].tolist(), color)
+                for values, color in ((log.cpu_load, (0.2, 0.5, 0.9)), (log.gpu_load, (1.0, 0.5, 0.1)))
+                if values is not None
+            ]
+        area.queue_draw()
+
+    def draw_frametime_plot(self, area, cr, width, height):
+        if self.frametime_plot is None:
+            return
+
+        # Scale to the 99.9th percentile so single spikes don't flatten the plot
+        top = max(self.frametime_stats["p999"] * 1.25, 1.0)
+        low, high, mean, stutters = self.frametime_plot
+        step = width / len(mean)
+
+        # Min/max band, then the mean line
+        cr.set_source_rgba(0.2, 0.5, 0.9, 0.3)
+        for i in range(len(mean)):
+            x = i * step
+            cr.move_to(x, height - min(low[i] / top, 1.0) * height)
+            cr.line_to(x, height - min(high[i] / top, 1.0) * height)
+        cr.set_line_width(max(step, 1.0))
+        cr.stroke()
+
+        cr.set_source_rgb(0.2, 0.5, 0.9)
+        cr.set_line_width(1.5)
+        for i in range(len(mean)):
+            y = height - min(mean[i] / top, 1.0) * height
+            if i == 0:
+                cr.move_to(0, y)
+            else:
+                cr.line_to(i * step, y)
+        cr.stroke()
+
+        # Stutter markers along the top edge
+        cr.set_source_rgb(0.9, 0.2, 0.2)
+        for x in stutters:
+            cr.move_to(x, 0)
+            cr.line_to(x, 6)
+        cr.set_line_width(1.5)
+        cr.stroke()
+
+    def draw_frametime_load_plot(self, area, cr, width, height):
+        if self.frametime_load_plot is None:
+            return
+
+        for mean, (r, g, b) in self.frametime_load_plot:
+            step = width / len(mean)
+            for i, value in enumerate(mean):
+                y = height - max(0.0, min(value, 100.0)) / 100.0 * height
+                if i == 0:
+                    cr.move_to(0, y)
+                else:
+                    cr.line_to(i * step, y)
+            cr.set_source_rgb(r, g, b)
+            cr.set_line_width(1.5)
+            cr.stroke()
+
+    # --- LOGS PAGE ---
+
+    LOG_PAGE_SIZE = 200
+    LOG_MAX_ENTRIES = 5000
+    LOG_PRIORITIES = ["emerg", "alert", "crit", "err", "warning", "notice", "info", "debug"]
+
+    def create_logs_page(self):
+        self.journal_reader = JournalReader(self.helper)
+        self.journal_following = False
+        self.journal_loading_older = False
+        self.journal_store = Gio.ListStore.new(JournalEntry)
+
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=12)
+        vbox.set_margin_top(12); vbox.set_margin_bottom(12)
+        vbox.set_margin_start(12); vbox.set_margin_end(12)
+
+        # Filters are passed to journalctl, nothing is filtered in Python
+        toolbar = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+        self.log_priority_dropdown = Gtk.DropDown.new_from_strings(
+            ["Any priority"] + [f"{i} {name} and above" for i, name in enumerate(self.LOG_PRIORITIES)]
+        )
+        self.log_priority_dropdown.connect("notify::selected", lambda *a: self.restart_journal())
+        self.log_boot_dropdown = Gtk.DropDown.new_from_strings(["Current boot", "Previous boot", "All boots"])
+        self.log_boot_dropdown.connect("notify::selected", lambda *a: self.restart_journal())
+        self.log_unit_entry = Gtk.SearchEntry(placeholder_text="Unit (e.g. sshd.service)", hexpand=True)
+        self.log_unit_entry.connect("activate", lambda *a: self.restart_journal())
+        self.log_latest_btn = Gtk.Button(label="Jump to Latest", visible=False, css_classes=["suggested-action"])
+        self.log_latest_btn.connect("clicked", lambda *a: self.restart_journal())
+
+        toolbar.append(self.log_priority_dropdown)
+        toolbar.append(self.log_boot_dropdown)
+        toolbar.append(self.log_unit_entry)
+        toolbar.append(self.log_latest_btn)
+        vbox.append(toolbar)
+
+        # Without journal group membership journalctl silently shows only the user's own logs
+        self.log_access_notice = Adw.Bin(css_classes=["card"], visible=not JournalReader.system_journal_readable())
+        notice_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+        notice_box.set_margin_top(12); notice_box.set_margin_bottom(12)
+        notice_box.set_margin_start(12); notice_box.set_margin_end(12)
+        notice_box.append(Gtk.Label(
+            label="Only your own logs are shown. System logs need membership in the systemd-journal group.",
+            wrap=True, xalign=0, hexpand=True
+        ))
+        system_logs_btn = Gtk.Button(label="Show System Logs", valign=Gtk.Align.CENTER, visible=self.helper.available())
+        system_logs_btn.connect("clicked", self.on_show_system_logs)
+        notice_box.append(system_logs_btn)
+        self.log_access_notice.set_child(notice_box)
+        vbox.append(self.log_access_notice)
+
+        # Virtualized list, only visible rows have widgets
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self.on_log_row_setup)
+        factory.connect("bind", self.on_log_row_bind)
+        list_view = Gtk.ListView(model=Gtk.NoSelection(model=self.journal_store), factory=factory)
+        list_view.add_css_class("card")
+
+        self.log_scroll = Gtk.ScrolledWindow(vexpand=True, child=list_view)
+        self.log_scroll.connect("edge-reached", self.on_log_edge_reached)
+        vbox.append(self.log_scroll)
+
+        self.log_status = Gtk.Label(halign=Gtk.Align.START, css_classes=["caption", "dim-label"])
+        vbox.append(self.log_status)
+
+        return vbox
+
+    def on_log_row_setup(self, factory, list_item):
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+        box.set_margin_start(8); box.set_margin_end(8)
+        for width, expand in ((15, False), (7, False), (18, False), (0, True)):
+            label = Gtk.Label(xalign=0, hexpand=expand, ellipsize=Pango.EllipsizeMode.END)
+            if width:
+                label.set_width_chars(width)
+                label.set_max_width_chars(width)
+            box.append(label)
+        box.get_first_child().add_css_class("monospace")
+        list_item.set_child(box)
+
+    def on_log_row_bind(self, factory, list_item):
+        entry = list_item.get_item()
+        time_label = list_item.get_child().get_first_child()
+        prio_label = time_label.get_next_sibling()
+        unit_label = prio_label.get_next_sibling()
+        msg_label = unit_label.get_next_sibling()
+
+        time_label.set_text(datetime.datetime.fromtimestamp(entry.timestamp).strftime("%b %d %H:%M:%S"))
+        prio_label.set_text(self.LOG_PRIORITIES[entry.priority] if 0 <= entry.priority < 8 else str(entry.priority))
+        for css in ("error", "warning"):
+            prio_label.remove_css_class(css)
+        if entry.priority <= 3:
+            prio_label.add_css_class("error")
+        elif entry.priority == 4:
+            prio_label.add_css_class("warning")
+        unit_label.set_text(entry.unit)
+        msg_label.set_text(entry.message.replace("\n", " "))
+        msg_label.set_tooltip_text(entry.message[:2000])
+
+    def journal_filters(self):
+        selected = self.log_priority_dropdown.get_selected()
+        priority = selected - 1 if selected > 0 else None
+        boot = {0: "0", 1: "-1", 2: None}[self.log_boot_dropdown.get_selected()]
+        unit = self.log_unit_entry.get_text().strip() or None
+        return JournalReader.filter_args(priority, unit, boot)
+
+    def restart_journal(self):
+        self.journal_store.remove_all()
+        self.log_latest_btn.set_visible(False)
+        self.journal_following = self.journal_reader.follow(
+            self.journal_filters(), self.LOG_PAGE_SIZE, self.on_journal_entries, self.on_journal_error
+        )
+        self.log_status.set_text("Following the journal..." if self.journal_following else "journalctl is not available")
+
+    def on_show_system_logs(self, btn):
+        """Read the journal through the privileged helper (one polkit prompt)."""
+        self.journal_reader.privileged = True
+        self.log_access_notice.set_visible(False)
+        self.restart_journal()
+
+    def on_journal_error(self, error):
+        # Authorization cancelled or the helper failed: back to the user's own journal
+        self.journal_reader.privileged = False
+        self.journal_following = False
+        self.log_access_notice.set_visible(True)
+        self.toast_overlay.add_toast(Adw.Toast(title=f"Could not read system logs: {error}"))
+        if self.content_stack.get_visible_child_name() == "logs":
+            self.restart_journal()
+
+    def on_journal_entries(self, entries):
+        adj = self.log_scroll.get_vadjustment()
+        at_bottom = adj.get_value() >= adj.get_upper() - adj.get_page_size() - 1
+
+        self.journal_store.splice(self.journal_store.get_n_items(), 0, entries)
+        # Bounded memory: drop the oldest entries beyond the window
+        excess = self.journal_store.get_n_items() - self.LOG_MAX_ENTRIES
+        if excess > 0:
+            self.journal_store.splice(0, excess, [])
+
+        self.log_status.set_text(f"Following the journal · {self.journal_store.get_n_items()} entries loaded")
+        if at_bottom:
+            GLib.idle_add(lambda: adj.set_value(adj.get_upper()) and False)
+
+    def on_log_edge_reached(self, scrolled, pos):
+        if pos != Gtk.PositionType.TOP or self.journal_loading_older:
+            return
+        if self.journal_store.get_n_items() == 0:
+            return
+
+        oldest = self.journal_store.get_item(0)
+        self.journal_loading_older = True
+        self.log_status.set_text("Loading older entries...")
+        self.journal_reader.load_before(oldest.cursor, self.journal_filters(), self.LOG_PAGE_SIZE, self.on_older_journal_entries)
+
+    def on_older_journal_entries(self, entries):
+        self.journal_loading_older = False
+        if not entries:
+            self.log_status.set_text(f"Start of the journal · {self.journal_store.get_n_items()} entries loaded")
+            return
+
+        adj = self.log_scroll.get_vadjustment()
+        old_upper = adj.get_upper()
+        self.journal_store.splice(0, 0, entries)
+
+        # Bounded memory: paging back drops the newest entries, so stop following
+        excess = self.journal_store.get_n_items() - self.LOG_MAX_ENTRIES
+        if excess > 0:
+            self.journal_store.splice(self.journal_store.get_n_items() - excess, excess, [])
+            if self.journal_following:
+                self.journal_reader.stop()
+                self.journal_following = False
+                self.log_latest_btn.set_visible(True)
+
+        # Keep the previously first row in place
+        GLib.idle_add(lambda: adj.set_value(adj.get_value() + adj.get_upper() - old_upper) and False)
+        state = "Following the journal" if self.journal_following else "Paused"
+        self.log_status.set_text(f"{state} · {self.journal_store.get_n_items()} entries loaded")
+
+    def create_jobs_page(self):
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=24)
+
+        self.graphs_group = Adw.PreferencesGroup(title="Task Graphs", visible=False)
+        vbox.append(self.graphs_group)
+
+        jobs_group = Adw.PreferencesGroup(
+            title="Jobs",
+            description=f"Background commands, up to {self.job_runner.max_concurrent} run at the same time"
+        )
+        self.jobs_list_box = Gtk.ListBox(css_classes=["boxed-list"])
+        self.jobs_list_box.set_selection_mode(Gtk.SelectionMode.SINGLE)
+        self.jobs_list_box.set_placeholder(Gtk.Label(label="No jobs yet", margin_top=12, margin_bottom=12, css_classes=["dim-label"]))
+        self.jobs_list_box.connect("row-selected", self.on_job_selected)
+        jobs_group.add(self.jobs_list_box)
+        vbox.append(jobs_group)
+
+        log_group = Adw.PreferencesGroup(title="Output")
+        self.job_log_buffer = Gtk.TextBuffer()
+        log_view = Gtk.TextView(buffer=self.job_log_buffer, editable=False, monospace=True, wrap_mode=Gtk.WrapMode.WORD_CHAR)
+        log_view.set_cursor_visible(False)
+        self.job_log_scroll = Gtk.ScrolledWindow(min_content_height=320, child=log_view, css_classes=["card"])
+        log_group.add(self.job_log_scroll)
+        vbox.append(log_group)
+
+        self.job_rows = {}
+        self.selected_job = None
+        self._pending_log_lines = []
 
         return self.wrap_in_resizable_view(vbox)
 
-    def refresh_startup_list(self):
-        # Clear existing rows
-        while (child := self.startup_list_box.get_first_child()):
-            self.startup_list_box.remove(child)
+    def run_job(self, title, argv, callback=None):
+        """Run a command in the background and report the result in a toast."""
+        def on_done(job):
+            if job.status == "done":
+                toast = Adw.Toast(title=f"{title} finished ({job.duration:.1f} s)")
+            elif job.status == "cancelled":
+                toast = Adw.Toast(title=f"{title} cancelled")
+            else:
+                toast = Adw.Toast(title=f"{title} failed", button_label="Show Log")
+                toast.connect("button-clicked", lambda t: self.show_job(job))
+            self.toast_overlay.add_toast(toast)
+            if callback:
+                callback(job)
+
+        return self.job_runner.submit(title, argv, on_done)
+
+    def run_task_graph(self, graph):
+        """Run a TaskGraph, showing per-task progress and critical-path timing on the Jobs page."""
+        graph_row = Adw.ExpanderRow(title=graph.title, subtitle=f"0/{len(graph.tasks)} done")
+        graph_row.add_prefix(Gtk.Image.new_from_icon_name("view-list-symbolic"))
+        task_rows = {}
+        for name, task in graph.tasks.items():
+            deps = ", ".join(graph.tasks[d]["title"] for d in task["deps"])
+            task_row = Adw.ActionRow(title=task["title"], subtitle="Waiting" + (f" for {deps}" if deps else ""))
+            graph_row.add_row(task_row)
+            task_rows[name] = task_row
+        self.graphs_group.add(graph_row)
+        self.graphs_group.set_visible(True)
+
+        def on_update(graph, task):
+            if task is not None:
+                row = task_rows[task["name"]]
+                job = task["job"]
+                parts = [task["status"].capitalize()]
+                if job is not None and job.status != "queued" and job.duration is not None:
+                    parts.append(f"{job.duration:.1f} s")
+                row.set_subtitle(" · ".join(parts))
+                graph_row.set_subtitle(f"{graph.done_count}/{len(graph.tasks)} done")
+                return
+
+            # Finished: show wall time and the chain of tasks that bounded it
+            wall = graph.finished - graph.started
+            summary = f"Finished in {wall:.1f} s"
+            if graph.critical_path:
+                path = " → ".join(t["title"] for t in graph.critical_path)
+                path_time = sum(t["job"].duration for t in graph.critical_path)
+                summary += f" · critical path: {path} ({path_time:.1f} s)"
+            graph_row.set_subtitle(summary)
+            for t in graph.critical_path:
+                task_rows[t["name"]].add_suffix(Gtk.Label(label="critical path", css_classes=["caption", "accent"]))
+
+            failed = graph.failed_tasks
+            if failed:
+                toast = Adw.Toast(title=f"{graph.title}: {len(failed)} step(s) failed or skipped", button_label="Details")
+            else:
+                toast = Adw.Toast(title=f"{graph.title} finished in {wall:.1f} s", button_label="Details")
+            toast.connect("button-clicked", lambda t: self.show_page("jobs"))
+            self.toast_overlay.add_toast(toast)
+
+        graph.listeners.append(on_update)
+        graph.run()
 
-        autostart_dir = os.path.expanduser("~/.config/autostart")
-        if not os.path.exists(autostart_dir):
+        toast = Adw.Toast(title=f"{graph.title} started", button_label="Show Progress")
+        toast.connect("button-clicked", lambda t: self.show_page("jobs"))
+        self.toast_overlay.add_toast(toast)
+
+    def privileged_argv(self, cmd):
+        """Turn a sudo shell command into an argv authorized once through pkexec."""
+        if not re.search(r"\bsudo\s", cmd):
+            return ["sh", "-c", cmd]
+        # The shell runs as root, $USER must still name the invoking user
+        user = shlex.quote(pwd.getpwuid(os.getuid()).pw_name)
+        cmd = re.sub(r"\$\{USER\}|\$USER\b", lambda m: user, cmd)
+        return ["pkexec", "sh", "-c", re.sub(r"\bsudo\s+", "", cmd)]
+
+    def show_job(self, job):
+        self.show_page("jobs")
+        row = self.job_rows.get(job.id)
+        if row:
+            self.jobs_list_box.select_row(row)
+
+    def format_job_subtitle(self, job):
+        parts = ["Cancelling" if job.cancel_requested and job.finished is None else job.status.capitalize()]
+        if job.duration is not None:
+            parts.append(f"{job.duration:.1f} s")
+        if job.exit_status not in (None, 0):
+            parts.append(f"exit {job.exit_status}")
+        average = self.job_runner.average_duration(job.title)
+        if average is not None:
+            parts.append(f"avg {average:.1f} s")
+        return " · ".join(parts)
+
+    def on_job_event(self, job, event, data):
+        if not hasattr(self, "jobs_list_box"):
             return
 
-        for filename in sorted(os.listdir(autostart_dir)):
-            if filename.endswith(".desktop"):
-                path = os.path.join(autostart_dir, filename)
-                config = configparser.ConfigParser(interpolation=None)
-                try:
-                    config.read(path)
-                    if "Desktop Entry" in config:
-                        name = config["Desktop Entry"].get("Name", filename)
-                        comment = config["Desktop Entry"].get("Comment", "No description")
-                        
-                        row = Adw.ActionRow(title=name, subtitle=comment)
-                        
-                        del_btn = Gtk.Button(
-                            icon_name="user-trash-symbolic",
-                            valign=Gtk.Align.CENTER,
-                            css_classes=["destructive-action", "flat"]
-                        )
-                        del_btn.connect("clicked", lambda b, p=path: self.on_delete_startup(p))
-                        row.add_suffix(del_btn)
-                        
-                        self.startup_list_box.append(row)
-                except Exception as e:
-                    print(f"[ERROR] Failed to read desktop file {path}: {e}")
-
-    def on_delete_startup(self, path):
+        if event == "added":
+            row = Adw.ActionRow(title=job.title, subtitle=self.format_job_subtitle(job))
+            row.job = job
+            cancel_btn = Gtk.Button(icon_name="process-stop-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"])
+            cancel_btn.set_tooltip_text("Cancel")
+            cancel_btn.connect("clicked", lambda b: self.job_runner.cancel(job))
+            row.add_suffix(cancel_btn)
+            row.cancel_btn = cancel_btn
+            if not job.can_cancel:
+                row.set_tooltip_text("Runs as root, can only be cancelled before it starts")
+            self.jobs_list_box.prepend(row)
+            self.job_rows[job.id] = row
+        elif event == "removed":
+            row = self.job_rows.pop(job.id, None)
+            if row:
+                self.jobs_list_box.remove(row)
+        elif event == "line":
+            if job is self.selected_job:
+                # Batch lines so chatty jobs don't redraw the view per line
+                if not self._pending_log_lines:
+                    GLib.timeout_add(100, self.flush_job_log)
+                self._pending_log_lines.append(data)
+            return
+        else:
+            row = self.job_rows.get(job.id)
+            if row:
+                row.set_subtitle(self.format_job_subtitle(job))
+                row.cancel_btn.set_visible(
+                    job.status == "queued" or (job.status == "running" and job.can_cancel and not job.cancel_requested)
+                )
+
+    def on_job_selected(self, listbox, row):
+        self.selected_job = row.job if row else None
+        self._pending_log_lines = []
+        if self.selected_job is None:
+            self.job_log_buffer.set_text("")
+            return
+
+        job = self.selected_job
+        header = f"$ {shlex.join(job.argv)}\n"
+        if job.dropped_lines:
+            header += f"... {job.dropped_lines} earlier lines dropped ...\n"
+        self.job_log_buffer.set_text(header + "\n".join(job.lines) + ("\n" if job.lines else ""))
+        GLib.idle_add(self.scroll_job_log)
+
+    def flush_job_log(self):
+        lines, self._pending_log_lines = self._pending_log_lines, []
+        if lines:
+            self.job_log_buffer.insert(self.job_log_buffer.get_end_iter(), "\n".join(lines) + "\n")
+            # Keep the view as bounded as the job's ring buffer
+            excess = self.job_log_buffer.get_line_count() - self.job_runner.max_lines - 2
+            if excess > 0:
+                start = self.job_log_buffer.get_start_iter()
+                end = self.job_log_buffer.get_iter_at_line(excess)[1]
+                self.job_log_buffer.delete(start, end)
+            GLib.idle_add(self.scroll_job_log)
+        return False
+
+    def scroll_job_log(self):
+        adj = self.job_log_scroll.get_vadjustment()
+        adj.set_value(adj.get_upper())
+        return False
+
+    def on_autostart_changed(self, filename, entry):
+        """Insert, update or remove the row of one autostart file."""
+        current = self.startup_rows.get(filename)
+        if entry is None:
+            if current:
+                self.startup_list_box.remove(current["row"])
+                del self.startup_rows[filename]
+            return
+
+        if current is None:
+            row = Adw.ActionRow()
+            switch = Gtk.Switch(valign=Gtk.Align.CENTER)
+            handler = switch.connect("state-set", lambda sw, state, f=filename: self.on_startup_toggle(f, state))
+            del_btn = Gtk.Button(
+                icon_name="user-trash-symbolic",
+                valign=Gtk.Align.CENTER,
+                css_classes=["destructive-action", "flat"]
+            )
+            del_btn.connect("clicked", lambda b, f=filename: self.on_delete_startup(f))
+            row.add_suffix(switch)
+            row.add_suffix(del_btn)
+            current = {"row": row, "switch": switch, "handler": handler, "delete": del_btn}
+            self.startup_rows[filename] = current
+            self.startup_list_box.append(row)
+
+        row = current["row"]
+        subtitle = entry["comment"]
+        if entry["system"]:
+            subtitle += " · System" if not entry["user"] else " · System (overridden)"
+        row.set_title(GLib.markup_escape_text(entry["name"]))
+        row.set_subtitle(GLib.markup_escape_text(subtitle))
+        # Only user files can be deleted; deleting an override restores the system entry
+        current["delete"].set_visible(entry["user"])
+
+        switch = current["switch"]
+        switch.handler_block(current["handler"])
+        switch.set_active(entry["enabled"] and not entry["hidden"])
+        switch.handler_unblock(current["handler"])
+        row.changed()
+
+    def sort_startup_rows(self, a, b):
+        a, b = a.get_title().lower(), b.get_title().lower()
+        return (a > b) - (a < b)
+
+    def on_startup_toggle(self, filename, state):
+        try:
+            self.autostart.set_enabled(filename, state)
+            self.autostart.rescan(filename)
+        except OSError as e:
+            print(f"[ERROR] Failed to update {filename}: {e}")
+            self.toast_overlay.add_toast(Adw.Toast(title=f"Failed to update {filename}"))
+            return True
+        return False
+
+    def on_delete_startup(self, filename):
+        path = os.path.join(self.autostart.user_dir, filename)
         try:
             os.remove(path)
-            self.refresh_startup_list()
+            self.autostart.rescan(filename)
             toast = Adw.Toast(title="Startup application removed")
             self.toast_overlay.add_toast(toast)
         except Exception as e:
@@ -817,6 +5224,15 @@ class LinuxUtilityApp(Adw.Application):
         cmd_entry = Gtk.Entry(placeholder_text="Command (e.g. discord)")
         desc_entry = Gtk.Entry(placeholder_text="Description (Optional)")
 
+        def on_app_chosen(app):
+            name_entry.set_text(app["name"])
+            cmd_entry.set_text(app["exec"])
+            desc_entry.set_text(app["comment"] or app["generic"])
+
+        pick_btn = Gtk.Button(label="Choose Application...", icon_name="system-search-symbolic")
+        pick_btn.connect("clicked", lambda b: self.show_app_picker(dialog, on_app_chosen))
+        content.append(pick_btn)
+
         content.append(Gtk.Label(label="Name:", halign=Gtk.Align.START))
         content.append(name_entry)
         content.append(Gtk.Label(label="Command:", halign=Gtk.Align.START))
@@ -836,8 +5252,58 @@ class LinuxUtilityApp(Adw.Application):
         dialog.connect("response", on_response)
         dialog.present()
 
+    _cached_app_index = None
+
+    def show_app_picker(self, parent, callback):
+        """Searchable list of installed applications; callback(app) on selection."""
+        if LinuxUtilityApp._cached_app_index is None:
+            LinuxUtilityApp._cached_app_index = ApplicationIndex()
+        else:
+            # Only re-reads directories whose mtime changed
+            LinuxUtilityApp._cached_app_index.load()
+        index = LinuxUtilityApp._cached_app_index
+
+        window = Adw.Window(transient_for=parent, modal=True, title="Choose Application",
+                            default_width=480, default_height=560)
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.append(Adw.HeaderBar())
+
+        search = Gtk.SearchEntry(placeholder_text="Search applications")
+        search.set_margin_top(12); search.set_margin_bottom(12)
+        search.set_margin_start(12); search.set_margin_end(12)
+        box.append(search)
+
+        list_box = Gtk.ListBox(css_classes=["boxed-list"], selection_mode=Gtk.SelectionMode.NONE)
+        list_box.set_margin_start(12); list_box.set_margin_end(12); list_box.set_margin_bottom(12)
+        box.append(Gtk.ScrolledWindow(vexpand=True, child=list_box))
+
+        def on_activated(row, app):
+            callback(app)
+            window.close()
+
+        def populate(query):
+            while (child := list_box.get_first_child()):
+                list_box.remove(child)
+            for app in index.search(query):
+                row = Adw.ActionRow(title=GLib.markup_escape_text(app["name"]),
+                                    subtitle=GLib.markup_escape_text(app["generic"] or app["exec"]), activatable=True)
+                icon = Gtk.Image(pixel_size=32)
+                if app["icon"].startswith("/"):
+                    icon.set_from_file(app["icon"])
+                else:
+                    icon.set_from_icon_name(app["icon"] or "application-x-executable-symbolic")
+                row.add_prefix(icon)
+                row.connect("activated", on_activated, app)
+                list_box.append(row)
+
+        search.connect("search-changed", lambda e: populate(e.get_text()))
+        populate("")
+
+        window.set_content(box)
+        window.present()
+
     def add_startup_file(self, name, cmd, desc):
-        autostart_dir = os.path.expanduser("~/.config/autostart")
+        autostart_dir = self.autostart.user_dir
         os.makedirs(autostart_dir, exist_ok=True)
         
         safe_name = "".join([c for c in name if c.isalnum()]).lower()
@@ -849,7 +5315,7 @@ class LinuxUtilityApp(Adw.Application):
         try:
             with open(path, "w") as f:
                 f.write(content)
-            self.refresh_startup_list()
+            self.autostart.rescan(os.path.basename(path))
             toast = Adw.Toast(title=f"Added {name} to startup")
             self.toast_overlay.add_toast(toast)
         except Exception as e:
@@ -857,60 +5323,693 @@ class LinuxUtilityApp(Adw.Application):
 
     # --- LOGIC FUNCTIONS ---
 
-    def update_public_ip(self, btn=None):
-        self.pub_ip_row.set_subtitle("Fetching...")
-        def fetch():
-            try:
-                with urllib.request.urlopen('https://api.ipify.org', timeout=5) as response:
-                    ip = response.read().decode('utf-8')
-                    GLib.idle_add(self.pub_ip_row.set_subtitle, ip)
-            except:
-                GLib.idle_add(self.pub_ip_row.set_subtitle, "Error/Timeout")
-        threading.Thread(target=fetch, daemon=True).start()
+    def update_public_ip(self, btn=None, force=True):
+        ip, fresh = self.public_ip.cached()
+        if ip:
+            self.pub_ip_row.set_subtitle(ip if fresh else f"{ip} (refreshing...)")
+        else:
+            self.pub_ip_row.set_subtitle("Fetching...")
+        self.public_ip.resolve(self.on_public_ip, force=force)
+
+    def on_public_ip(self, ip, error):
+        if ip:
+            self.pub_ip_row.set_subtitle(ip)
+        else:
+            cached, _ = self.public_ip.cached()
+            self.pub_ip_row.set_subtitle(f"{cached} (lookup failed)" if cached else f"Error: {error}")
+
+    def on_network_changed(self, monitor, available):
+        # Routes changed: the address may have too. Events come in bursts, refresh once they settle.
+        self.public_ip.invalidate()
+        if self._public_ip_refresh:
+            GLib.source_remove(self._public_ip_refresh)
+        self._public_ip_refresh = GLib.timeout_add_seconds(2, self.on_network_settled)
+
+    def on_network_settled(self):
+        self._public_ip_refresh = None
+        if Gio.NetworkMonitor.get_default().get_network_available():
+            self.update_public_ip(force=False)
+        return False
 
     def run_ping_test(self):
-        full_bash_cmd = "echo 'Testing connection to Google DNS...'; ping -c 4 8.8.8.8; echo -e '\nDone!'; sleep 3"
-        self.open_terminal(full_bash_cmd)
+        """Latency is probed continuously on the Diagnostics page."""
+        self.show_page("info")
+
+    def on_battery_changed(self, batteries):
+        summary = self.battery_monitor.summary()
+        self.battery_row.set_enable_expansion(summary is not None)
+        if summary is None:
+            self.battery_row.set_subtitle("N/A")
+            return
 
-    def view_system_logs(self):
-        """Open system journal in a pager."""
-        self.open_terminal("echo '=== SYSTEM LOGS (Journalctl) ==='; sudo journalctl -xe; echo 'Logs closed'; sleep 2")
+        parts = [f"{summary['percentage']:.0f}%", summary["state"]]
+        if summary["rate"] > 0 and summary["state"] in ("Charging", "Discharging"):
+            parts[-1] += f" at {summary['rate']:.1f} W"
+        if summary["time_left"] is not None:
+            left = self.format_duration(int(summary["time_left"]))
+            parts.append(f"{left} until full" if summary["state"] == "Charging" else f"{left} left")
+        self.battery_row.set_subtitle(" · ".join(parts))
+
+        for name in set(self.battery_detail_rows) - set(batteries):
+            self.battery_row.remove(self.battery_detail_rows.pop(name))
+        for name, info in batteries.items():
+            row = self.battery_detail_rows.get(name)
+            if row is None:
+                row = Adw.ActionRow()
+                self.battery_row.add_row(row)
+                self.battery_detail_rows[name] = row
+            title = f"{name} · {info['model']}" if info["model"] else name
+            row.set_title(GLib.markup_escape_text(title))
+            row.set_subtitle(GLib.markup_escape_text(self.format_battery_health(info)))
+
+        averages = [self.battery_monitor.average_rates(name) for name in batteries]
+        charge = [c for c, _ in averages if c is not None]
+        discharge = [d for _, d in averages if d is not None]
+        rates = []
+        if charge:
+            rates.append(f"avg charge {sum(charge):.1f} W")
+        if discharge:
+            rates.append(f"avg discharge {sum(discharge):.1f} W")
+        self.battery_rates_row.set_subtitle(" · ".join(rates) if rates else "Idle")
+        self.battery_graph.queue_draw()
+
+    def format_battery_health(self, info):
+        parts = []
+        if info["wear"] is not None:
+            parts.append(f"Health {100 - info['wear']:.0f}% (wear {info['wear']:.0f}%)")
+        if info["energy_full"] and info["energy_full_design"]:
+            parts.append(f"{info['energy_full']:.1f} of {info['energy_full_design']:.1f} Wh design")
+        if info["cycles"]:
+            parts.append(f"{info['cycles']} cycles")
+        if info["technology"]:
+            parts.append(info["technology"])
+        return " · ".join(parts) or "No capacity data"
+
+    def draw_battery_graph(self, area, cr, width, height):
+        """Signed rate over the last hour: charging above the center line, discharging below."""
+        series = [h for h in self.battery_monitor.history.values() if h]
+        if not series:
+            return
+        top = max(5.0, max(abs(w) for h in series for _, w in h) * 1.2)
+        now = time.monotonic()
+        window = BatteryMonitor.HISTORY_WINDOW
+        mid = height / 2
+
+        cr.set_source_rgba(0.5, 0.5, 0.5, 0.4)
+        cr.set_line_width(1)
+        cr.move_to(0, mid)
+        cr.line_to(width, mid)
+        cr.stroke()
 
-    def probe_battery_health(self):
-        """Show detailed battery wear and health info."""
-        cmd = (
-            "echo '=== BATTERY HEALTH PROBE ==='; "
-            "upower -i $(upower -e | grep 'BAT') | grep -E 'state|to full|percentage|capacity|energy-full|energy-design'; "
-            "echo -e '\nPress Enter to close...'; read"
+        cr.set_line_width(1.5)
+        cr.set_line_join(cairo.LineJoin.ROUND)
+        for i, history in enumerate(series):
+            cr.set_source_rgb(*self.LATENCY_COLORS[i % len(self.LATENCY_COLORS)])
+            points = [(width - (now - t) / window * width, mid - w / top * mid) for t, w in history]
+            # UPower only signals changes, the last value holds until now
+            points.append((width, points[-1][1]))
+            cr.move_to(*points[0])
+            for x, y in points[1:]:
+                cr.line_to(x, y)
+            cr.stroke()
+
+    LATENCY_COLORS = [(0.2, 0.5, 0.9), (1.0, 0.5, 0.1), (0.1, 0.8, 0.4), (0.6, 0.3, 0.8), (0.9, 0.2, 0.2)]
+
+    def get_latency_targets(self):
+        """Probe targets, one "icmp HOST" / "tcp HOST:PORT" / "udp HOST:PORT" per line in latency.list."""
+        try:
+            with open(os.path.join(CONFIG_DIR, "latency.list")) as f:
+                lines = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+        except OSError:
+            lines = DEFAULT_LATENCY_TARGETS
+        targets = []
+        for line in dict.fromkeys(lines):
+            try:
+                targets.append(LatencyProber.parse_target(line))
+            except ValueError as e:
+                print(f"[ERROR] {e}")
+        return targets
+
+    def setup_latency_prober(self):
+        if self.latency_prober:
+            self.latency_prober.stop()
+        for entry in self.latency_rows.values():
+            self.latency_group.remove(entry["row"])
+        self.latency_rows = {}
+
+        targets = self.get_latency_targets()
+        for i, target in enumerate(targets):
+            row = Adw.ActionRow(title=GLib.markup_escape_text(target["label"]), subtitle="Waiting...")
+            swatch = Gtk.DrawingArea(content_width=12, content_height=12, valign=Gtk.Align.CENTER)
+            color = self.LATENCY_COLORS[i % len(self.LATENCY_COLORS)]
+            swatch.set_draw_func(self.draw_latency_swatch, color)
+            row.add_prefix(swatch)
+            histogram = Gtk.DrawingArea(content_width=90, content_height=28, valign=Gtk.Align.CENTER)
+            histogram.set_tooltip_text("RTT histogram: " + ", ".join(f"≤{b}" for b in ProbeStats.BUCKETS) + ", more (ms)")
+            row.add_suffix(histogram)
+            stats = ProbeStats()
+            histogram.set_draw_func(self.draw_latency_histogram, (stats, color))
+            self.latency_group.add(row)
+            self.latency_rows[target["label"]] = {"row": row, "stats": stats, "histogram": histogram, "color": color}
+
+        self.latency_prober = LatencyProber(targets, self.on_latency_results)
+        self.latency_prober.start()
+
+    def on_latency_results(self, results):
+        for target, rtt in results:
+            entry = self.latency_rows.get(target["label"])
+            if entry is None:
+                continue
+            entry["stats"].add(rtt)
+            summary = entry["stats"].summary()
+            if "avg" not in summary:
+                error = self.latency_prober.errors.get(target["label"])
+                entry["row"].set_subtitle(GLib.markup_escape_text(f"No replies · {error}" if error else "No replies"))
+            else:
+                now = f"{rtt:.1f} ms now" if rtt is not None else "Timeout"
+                entry["row"].set_subtitle(
+                    f"{now} · avg {summary['avg']:.1f} · p95 {summary['p95']:.1f} · "
+                    f"jitter {summary['jitter']:.1f} ms · loss {summary['loss'] * 100:.0f}%"
+                )
+            entry["histogram"].queue_draw()
+        self.latency_area.queue_draw()
+        return False
+
+    def draw_latency_graph(self, area, cr, width, height):
+        series = [(e["stats"].rtts, e["color"]) for e in self.latency_rows.values()]
+        values = [r for rtts, _ in series for r in rtts if r is not None]
+        if not values:
+            return
+        top = max(10.0, max(values) * 1.2)
+        maxlen = max(rtts.maxlen for rtts, _ in series)
+        step = width / (maxlen - 1)
+
+        cr.set_line_width(1.5)
+        cr.set_line_join(cairo.LineJoin.ROUND)
+        for rtts, (r, g, b) in series:
+            offset = maxlen - len(rtts)
+            drawing = False
+            for i, rtt in enumerate(rtts):
+                x = (offset + i) * step
+                if rtt is None:
+                    # Lost probes break the line and get a tick on the bottom edge
+                    if drawing:
+                        cr.set_source_rgb(r, g, b)
+                        cr.stroke()
+                        drawing = False
+                    cr.set_source_rgb(0.9, 0.2, 0.2)
+                    cr.rectangle(x - 1, height - 4, 2, 4)
+                    cr.fill()
+                    continue
+                y = height - min(rtt / top, 1.0) * height
+                if drawing:
+                    cr.line_to(x, y)
+                else:
+                    cr.move_to(x, y)
+                    drawing = True
+            if drawing:
+                cr.set_source_rgb(r, g, b)
+                cr.stroke()
+
+    def draw_latency_swatch(self, area, cr, width, height, color):
+        cr.set_source_rgb(*color)
+        cr.arc(width / 2, height / 2, min(width, height) / 2, 0, 2 * math.pi)
+        cr.fill()
+
+    def draw_latency_histogram(self, area, cr, width, height, data):
+        stats, (r, g, b) = data
+        peak = max(stats.histogram)
+        if not peak:
+            return
+        bar = width / len(stats.histogram)
+        cr.set_source_rgb(r, g, b)
+        for i, count in enumerate(stats.histogram):
+            h = count / peak * height
+            cr.rectangle(i * bar + 1, height - h, bar - 2, h)
+        cr.fill()
+
+    def on_edit_latency_targets(self, btn):
+        buffer = Gtk.TextBuffer()
+        buffer.set_text("\n".join(self.latency_rows))
+        text_view = Gtk.TextView(buffer=buffer, monospace=True)
+        scrolled = Gtk.ScrolledWindow(min_content_height=150, child=text_view)
+
+        dialog = Adw.MessageDialog(
+            transient_for=btn.get_root(), heading="Latency Targets",
+            body="One target per line: icmp HOST, tcp HOST:PORT or udp HOST:PORT."
         )
-        self.open_terminal(cmd)
+        dialog.set_extra_child(scrolled)
+        dialog.add_response("cancel", "Cancel")
+        dialog.add_response("save", "Save")
+        dialog.set_response_appearance("save", Adw.ResponseAppearance.SUGGESTED)
+
+        def on_response(dialog, response):
+            if response != "save":
+                return
+            text = buffer.get_text(buffer.get_start_iter(), buffer.get_end_iter(), False)
+            try:
+                os.makedirs(CONFIG_DIR, exist_ok=True)
+                with open(os.path.join(CONFIG_DIR, "latency.list"), "w") as f:
+                    f.write(text.strip() + "\n")
+            except OSError as e:
+                print(f"[ERROR] Failed to save latency targets: {e}")
+                return
+            self.setup_latency_prober()
+
+        dialog.connect("response", on_response)
+        dialog.present()
+
+    def view_system_logs(self, priority=None):
+        """Open the Logs page, optionally filtered to a maximum priority."""
+        if priority is not None:
+            # Index 0 is "Any priority", then 0 (emerg) .. 7 (debug)
+            self.log_priority_dropdown.set_selected(priority + 1)
+            self.log_boot_dropdown.set_selected(0)
+        self.show_page("logs")
+
+    def probe_battery_health(self):
+        """Battery wear and charge history are tracked on the Diagnostics page."""
+        self.show_page("info")
+        if self.battery_row.get_enable_expansion():
+            self.battery_row.set_expanded(True)
 
     def trigger_logrotate(self):
         """Manually trigger log rotation."""
-        self.open_terminal("echo 'Force rotating logs...'; sudo logrotate -f /etc/logrotate.conf && echo 'Success' || echo 'Failed'; sleep 3")
+        self.run_privileged(
+            "Log rotation", [{"op": "logrotate"}],
+            "echo 'Force rotating logs...'; sudo logrotate -f /etc/logrotate.conf && echo 'Success' || echo 'Failed'; sleep 3"
+        )
+
+    def run_privileged(self, title, ops, fallback_cmd, parallel=False):
+        """Run allow-listed operations through the privileged helper, or in a terminal without it."""
+        if not self.helper.available():
+            self.open_terminal(fallback_cmd)
+            return
+
+        def on_done(results, error):
+            if results is None:
+                self.toast_overlay.add_toast(Adw.Toast(title=f"{title} failed: {error}"))
+                return
+            failed = [r for r in results if not r["ok"]]
+            if failed:
+                lines = (failed[0].get("error") or failed[0].get("output") or "unknown error").splitlines()
+                self.toast_overlay.add_toast(Adw.Toast(title=f"{title} failed: {lines[-1]}"))
+            else:
+                self.toast_overlay.add_toast(Adw.Toast(title=f"{title} done"))
+
+        self.helper.request(ops, on_done, parallel)
 
     def probe_pci_devices(self):
-        """List PCI devices with verbose info."""
-        self.open_terminal("echo '=== PCI DEVICE LIST ==='; lspci -vmm; echo -e '\nPress Enter to close...'; read")
+        """Open the hardware inventory."""
+        self.show_page("hardware")
 
     def probe_usb_devices(self):
-        """List USB devices."""
-        self.open_terminal("echo '=== USB DEVICE LIST ==='; lsusb; echo -e '\nPress Enter to close...'; read")
+        """Open the hardware inventory."""
+        self.show_page("hardware")
+
+    def get_cpu_vulnerabilities(self):
+        """List of (name, status) from sysfs."""
+        base = "/sys/devices/system/cpu/vulnerabilities"
+        result = []
+        try:
+            for name in sorted(os.listdir(base)):
+                try:
+                    with open(os.path.join(base, name), "r") as f:
+                        result.append((name.replace("_", " ").title(), f.read().strip()))
+                except OSError:
+                    continue
+        except OSError:
+            pass
+        return result
+
+    def get_microcode_revisions(self):
+        """Map each microcode revision to the logical CPUs running it."""
+        revisions = {}
+        cpu = None
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    key = key.strip()
+                    if key == "processor":
+                        cpu = value.strip()
+                    elif key == "microcode" and cpu is not None:
+                        revisions.setdefault(value.strip(), []).append(int(cpu))
+        except (OSError, ValueError):
+            pass
+        return revisions
+
+    def get_microcode_summary(self):
+        revisions = self.get_microcode_revisions()
+        if not revisions:
+            rev = "Revision unknown"
+        elif len(revisions) == 1:
+            rev = f"Revision {next(iter(revisions))} on all {len(next(iter(revisions.values())))} threads"
+        else:
+            rev = "Mixed revisions: " + ", ".join(revisions)
+
+        vulns = self.get_cpu_vulnerabilities()
+        vulnerable = sum(1 for _, status in vulns if status.startswith("Vulnerable"))
+        if not vulns:
+            return rev
+        if vulnerable:
+            return f"{rev} · {vulnerable} of {len(vulns)} vulnerabilities unmitigated"
+        return f"{rev} · No unmitigated vulnerabilities"
+
+    def load_microcode_messages(self, callback):
+        """Kernel microcode messages of the current boot; callback(lines)."""
+        base = ["journalctl", "_TRANSPORT=kernel", "--boot=0", "--output=cat", "--no-pager", "--quiet"]
+
+        def run(argv, on_done):
+            try:
+                proc = Gio.Subprocess.new(argv, Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_PIPE)
+            except GLib.Error:
+                callback([])
+                return
+            proc.communicate_utf8_async(None, None, on_done)
+
+        def on_filtered(proc, result):
+            try:
+                ok, stdout, stderr = proc.communicate_utf8_finish(result)
+            except GLib.Error:
+                callback([])
+                return
+            if proc.get_exit_status() == 0 or not stderr:
+                callback(stdout.splitlines()[-10:])
+                return
+            # journalctl built without PCRE2 rejects --grep, filter the same query here
+            run(base, on_unfiltered)
+
+        def on_unfiltered(proc, result):
+            try:
+                ok, stdout, stderr = proc.communicate_utf8_finish(result)
+            except GLib.Error:
+                callback([])
+                return
+            callback([l for l in stdout.splitlines() if "microcode" in l.lower()][-10:])
+
+        run(base + ["--grep=microcode", "--case-sensitive=false"], on_filtered)
 
     def check_microcode(self):
-        """Check CPU microcode status."""
-        self.open_terminal("echo '=== CPU MICROCODE STATUS ==='; grep . /sys/devices/system/cpu/vulnerabilities/*; echo; journalctl -k | grep -i microcode | tail -n 5; echo -e '\nPress Enter to close...'; read")
+        """Show CPU vulnerabilities, per-core microcode and kernel microcode messages."""
+        self.microcode_row.set_subtitle(self.get_microcode_summary())
+
+        content = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=18)
+
+        rev_group = Adw.PreferencesGroup(title="Microcode Revisions")
+        revisions = self.get_microcode_revisions()
+        for rev, cpus in revisions.items():
+            rev_group.add(Adw.ActionRow(title=rev, subtitle=f"CPUs {self.format_cpu_ranges(cpus)}"))
+        if not revisions:
+            rev_group.add(Adw.ActionRow(title="Not reported by /proc/cpuinfo"))
+        content.append(rev_group)
+
+        vuln_group = Adw.PreferencesGroup(title="Vulnerabilities")
+        for name, status in self.get_cpu_vulnerabilities():
+            row = Adw.ActionRow(title=name, subtitle=GLib.markup_escape_text(status), subtitle_lines=2)
+            icon = "dialog-warning-symbolic" if status.startswith("Vulnerable") else "security-high-symbolic"
+            row.add_prefix(Gtk.Image.new_from_icon_name(icon))
+            vuln_group.add(row)
+        content.append(vuln_group)
+
+        log_group = Adw.PreferencesGroup(title="Kernel Messages", description="Loading...")
+        content.append(log_group)
+
+        def on_messages(lines):
+            log_group.set_description(None if lines else "No microcode messages in this boot")
+            for line in lines:
+                log_group.add(Adw.ActionRow(title=GLib.markup_escape_text(line), title_lines=3, css_classes=["monospace"]))
+
+        self.load_microcode_messages(on_messages)
+
+        scrolled = Gtk.ScrolledWindow(child=content, min_content_height=420, propagate_natural_width=True)
+        dialog = Adw.MessageDialog(transient_for=self.toast_overlay.get_root(), heading="CPU Microcode Status",
+                                   extra_child=scrolled)
+        dialog.add_response("close", "Close")
+        dialog.present()
+
+    def format_cpu_ranges(self, cpus):
+        """[0, 1, 2, 5] -> "0-2, 5"."""
+        cpus = sorted(cpus)
+        ranges = []
+        start = prev = cpus[0]
+        for cpu in cpus[1:] + [None]:
+            if cpu is not None and cpu == prev + 1:
+                prev = cpu
+                continue
+            ranges.append(f"{start}-{prev}" if start != prev else str(start))
+            start = prev = cpu
+        return ", ".join(ranges)
+
+    _cached_sysctl_index = None
 
     def view_kernel_params(self):
-        """List active sysctl parameters."""
-        self.open_terminal("echo '=== KERNEL PARAMETERS (sysctl) ==='; sysctl -a | head -n 50; echo '... (truncated, use sysctl -a for full list)'; echo -e '\nPress Enter to close...'; read")
+        """Browse and search every kernel runtime parameter in /proc/sys."""
+        if LinuxUtilityApp._cached_sysctl_index is None:
+            LinuxUtilityApp._cached_sysctl_index = SysctlIndex()
+        index = LinuxUtilityApp._cached_sysctl_index
+
+        window = Adw.Window(transient_for=self.toast_overlay.get_root(), title="Kernel Parameters",
+                            default_width=760, default_height=600)
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.append(Adw.HeaderBar())
+
+        search = Gtk.SearchEntry(placeholder_text="Search, e.g. net.ipv4. or swappiness")
+        search.set_margin_top(12); search.set_margin_bottom(6)
+        search.set_margin_start(12); search.set_margin_end(12)
+        box.append(search)
+
+        model = Gtk.StringList.new(index.keys)
+        bound = set()
+
+        def on_setup(factory, list_item):
+            row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+            row.set_margin_start(12); row.set_margin_end(12)
+            row.set_margin_top(4); row.set_margin_bottom(4)
+            row.append(Gtk.Label(xalign=0, hexpand=True, ellipsize=Pango.EllipsizeMode.MIDDLE, selectable=True))
+            row.append(Gtk.Label(xalign=1, max_width_chars=40, ellipsize=Pango.EllipsizeMode.END,
+                                 selectable=True, css_classes=["monospace", "dim-label"]))
+            list_item.set_child(row)
+
+        def update_value(list_item):
+            key = list_item.get_item().get_string()
+            value = index.read(key)
+            label = list_item.get_child().get_last_child()
+            label.set_text(value)
+            label.set_tooltip_text(value)
+
+        def on_bind(factory, list_item):
+            # Values are read only for rows that actually get a widget
+            list_item.get_child().get_first_child().set_text(list_item.get_item().get_string())
+            update_value(list_item)
+            bound.add(list_item)
+
+        def on_unbind(factory, list_item):
+            bound.discard(list_item)
+
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", on_setup)
+        factory.connect("bind", on_bind)
+        factory.connect("unbind", on_unbind)
+
+        list_view = Gtk.ListView(model=Gtk.NoSelection(model=model), factory=factory, css_classes=["rich-list"])
+        box.append(Gtk.ScrolledWindow(vexpand=True, child=list_view))
+
+        status = Gtk.Label(halign=Gtk.Align.START, css_classes=["caption", "dim-label"])
+        status.set_margin_start(12); status.set_margin_bottom(6); status.set_margin_top(6)
+        status.set_text(f"{len(index.keys)} parameters")
+        box.append(status)
+
+        def on_search(entry):
+            keys = index.search(entry.get_text())
+            model.splice(0, model.get_n_items(), keys)
+            status.set_text(f"{len(keys)} of {len(index.keys)} parameters")
+
+        search.connect("search-changed", on_search)
+
+        def refresh_visible():
+            for list_item in list(bound):
+                if list_item.get_item() is not None:
+                    update_value(list_item)
+            return True
+
+        timer = GLib.timeout_add_seconds(2, refresh_visible)
+        window.connect("close-request", lambda w: GLib.source_remove(timer) and False)
+
+        window.set_content(box)
+        window.present()
 
     def on_service_action(self, service, action):
-        """Handle service management actions (status, restart)."""
+        """Handle service management actions (status, restart) over D-Bus."""
         if action == "status":
-            self.open_terminal(f"systemctl status {service}; echo -e '\nPress Enter to close...'; read")
+            self.systemd.load_units([service], lambda states, error: self.show_service_status(service, states, error))
         elif action == "restart":
-            self.open_terminal(f"echo 'Restarting {service}...'; sudo systemctl restart {service} && echo 'Done' || echo 'Failed'; sleep 3")
+            self.restart_services([service])
+
+    def format_service_state(self, state):
+        """Summarize a unit state dict from SystemdClient."""
+        if state["LoadState"] == "not-found":
+            return "Not installed"
+        parts = [f"{state['ActiveState']} ({state['SubState']})"]
+        if state["ActiveState"] == "active" and state.get("ActiveEnterTimestamp"):
+            uptime = int(time.time() - state["ActiveEnterTimestamp"] / 1e6)
+            parts.append(f"up {self.format_duration(uptime)}")
+        if state["MemoryCurrent"] is not None:
+            parts.append(f"Memory {self.format_bytes(state['MemoryCurrent'])}")
+        if state["CPUUsageNSec"] is not None:
+            parts.append(f"CPU {state['CPUUsageNSec'] / 1e9:.1f} s")
+        return " · ".join(parts)
+
+    def format_duration(self, seconds):
+        days, rem = divmod(max(seconds, 0), 86400)
+        hours, rem = divmod(rem, 3600)
+        minutes = rem // 60
+        if days:
+            return f"{days}d {hours}h"
+        if hours:
+            return f"{hours}h {minutes:02d}m"
+        return f"{minutes}m"
+
+    def get_monitored_services(self):
+        """Services shown in Service Management, one unit per line in services.list."""
+        path = os.path.join(CONFIG_DIR, "services.list")
+        try:
+            with open(path) as f:
+                services = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+            return list(dict.fromkeys(services))
+        except OSError:
+            return list(DEFAULT_MONITORED_SERVICES)
+
+    def populate_service_rows(self):
+        for row in self.service_rows.values():
+            self.services_adm_group.remove(row)
+        self.service_rows = {}
+        self._service_states = {}
+        self._dirty_services = set()
+        self._service_flush_pending = False
+
+        for svc in self.get_monitored_services():
+            row = Adw.ActionRow(title=f"Service: {svc}", subtitle="Loading...")
+            row.add_prefix(Gtk.Image.new_from_icon_name("system-run-symbolic"))
+
+            # Status btn
+            status_btn = Gtk.Button(icon_name="dialog-information-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"])
+            status_btn.connect("clicked", lambda x, s=svc: self.on_service_action(s, "status"))
+
+            # Restart btn
+            restart_btn = Gtk.Button(icon_name="view-refresh-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat", "warning"])
+            restart_btn.connect("clicked", lambda x, s=svc: self.on_service_action(s, "restart"))
+
+            row.add_suffix(status_btn)
+            row.add_suffix(restart_btn)
+            self.services_adm_group.add(row)
+            self.service_rows[svc] = row
+
+        self.systemd.watch_units(list(self.service_rows), self.on_service_state_changed)
+
+    def on_service_state_changed(self, service, state):
+        # Coalesce bursts of signals into one UI update per main loop iteration
+        self._service_states[service] = state
+        self._dirty_services.add(service)
+        if not self._service_flush_pending:
+            self._service_flush_pending = True
+            GLib.idle_add(self.flush_service_rows)
+
+    def flush_service_rows(self):
+        dirty, self._dirty_services = self._dirty_services, set()
+        self._service_flush_pending = False
+        for svc in dirty:
+            self.update_service_row(svc)
+        return False
+
+    def update_service_row(self, svc):
+        row = self.service_rows.get(svc)
+        if row is None:
+            return
+        state = self._service_states.get(svc)
+        subtitle = "State unavailable" if state is None else self.format_service_state(state)
+        # Only touch the widget when the text actually changed
+        if row.get_subtitle() != subtitle:
+            row.set_subtitle(subtitle)
+
+    def on_edit_monitored_services(self, btn):
+        buffer = Gtk.TextBuffer()
+        buffer.set_text("\n".join(self.service_rows))
+        text_view = Gtk.TextView(buffer=buffer, monospace=True)
+        scrolled = Gtk.ScrolledWindow(min_content_height=200, child=text_view)
+
+        dialog = Adw.MessageDialog(
+            transient_for=btn.get_root(), heading="Monitored Services",
+            body="One systemd unit per line."
+        )
+        dialog.set_extra_child(scrolled)
+        dialog.add_response("cancel", "Cancel")
+        dialog.add_response("save", "Save")
+        dialog.set_response_appearance("save", Adw.ResponseAppearance.SUGGESTED)
+
+        def on_response(dialog, response):
+            if response != "save":
+                return
+            text = buffer.get_text(buffer.get_start_iter(), buffer.get_end_iter(), False)
+            try:
+                os.makedirs(CONFIG_DIR, exist_ok=True)
+                with open(os.path.join(CONFIG_DIR, "services.list"), "w") as f:
+                    f.write(text.strip() + "\n")
+            except OSError as e:
+                print(f"[ERROR] Failed to save monitored services: {e}")
+                return
+            self.populate_service_rows()
+
+        dialog.connect("response", on_response)
+        dialog.present()
+
+    def show_service_status(self, service, states, error):
+        if states is None:
+            # systemd is not reachable over D-Bus, fall back to the terminal
+            self.open_terminal(f"systemctl status {service}; echo -e '\nPress Enter to close...'; read")
+            return
+
+        state = states.get(service)
+        if state is None or state["LoadState"] == "not-found":
+            body = "This service is not installed."
+        else:
+            body = f"{state['Description']}\n\n{self.format_service_state(state)}"
+
+        dialog = Adw.MessageDialog(transient_for=self.toast_overlay.get_root(), heading=service, body=body)
+        dialog.add_response("close", "Close")
+        dialog.present()
+
+    def restart_services(self, services, user=False):
+        """Restart units through systemd (polkit for system units) and report the job results in a toast."""
+        client = self.user_systemd if user else self.systemd
+        label = ", ".join(services)
+        results = {}
+
+        def on_done(service, ok, result):
+            results[service] = (ok, result)
+            if len(results) < len(services):
+                return
+
+            if client.proxy is None:
+                # No D-Bus connection, fall back to the helper or the terminal
+                prefix = "systemctl --user" if user else "sudo systemctl"
+                fallback = f"echo 'Restarting {label}...'; {prefix} restart {' '.join(services)} && echo 'Done' || echo 'Failed'; sleep 3"
+                if user:
+                    self.open_terminal(fallback)
+                else:
+                    ops = [{"op": "restart_service", "args": {"unit": svc}} for svc in services]
+                    self.run_privileged(f"Restart of {label}", ops, fallback, parallel=True)
+                return
+
+            failed = [f"{svc} ({res})" for svc, (ok, res) in results.items() if not ok]
+            if failed:
+                self.toast_overlay.add_toast(Adw.Toast(title=f"Restart failed: {', '.join(failed)}"))
+            else:
+                self.toast_overlay.add_toast(Adw.Toast(title=f"Restarted {label}"))
+
+        self.toast_overlay.add_toast(Adw.Toast(title=f"Restarting {label}..."))
+        for svc in services:
+            client.restart_unit(svc, lambda ok, res, s=svc: on_done(s, ok, res))
 
     def _detect_terminal(self):
         """Detect and cache available terminal emulator."""
@@ -934,56 +6033,91 @@ class LinuxUtilityApp(Adw.Application):
             "pacman": {
                 "update": "sudo pacman -Syu",
                 "install": "sudo pacman -S --needed {}",
+                # Non-interactive variants for background jobs
+                "update_auto": "sudo pacman -Syu --noconfirm",
+                "install_auto": "sudo pacman -S --needed --noconfirm {}",
                 "check": "pacman -Qi {}",
+                "query": ["pacman", "-Qq"],
                 "cleanup": "sudo pacman -Sc --noconfirm",
                 "orphans": "sudo pacman -Rns $(pacman -Qtdq) 2>/dev/null || echo 'No orphans found'"
             },
             "apt": {
                 "update": "sudo apt update && sudo apt upgrade -y",
                 "install": "sudo apt update && sudo apt install -y {}",
+                # Non-interactive variants for background jobs: no debconf questions,
+                # changed config files keep the local version
+                "update_auto": "sudo apt-get update && sudo DEBIAN_FRONTEND=noninteractive apt-get upgrade -y "
+                               "-o Dpkg::Options::=--force-confdef -o Dpkg::Options::=--force-confold",
+                "install_auto": "sudo apt-get update && sudo DEBIAN_FRONTEND=noninteractive apt-get install -y "
+                                "-o Dpkg::Options::=--force-confdef -o Dpkg::Options::=--force-confold {}",
                 "check": "dpkg -s {}",
+                "query": ["dpkg-query", "-W", "-f=${db:Status-Status} ${Package}\n"],
                 "cleanup": "sudo apt clean && sudo apt autoclean",
                 "orphans": "sudo apt autoremove -y"
             },
             "dnf": {
                 "update": "sudo dnf upgrade -y",
                 "install": "sudo dnf install -y {}",
+                # Non-interactive variants for background jobs
+                "update_auto": "sudo dnf upgrade -y",
+                "install_auto": "sudo dnf install -y {}",
                 "check": "rpm -q {}",
+                "query": ["rpm", "-qa", "--qf", "%{NAME}\n"],
                 "cleanup": "sudo dnf clean all",
                 "orphans": "sudo dnf autoremove -y"
             },
             "zypper": {
                 "update": "sudo zypper dup",
                 "install": "sudo zypper install -y {}",
+                # Non-interactive variants for background jobs
+                "update_auto": "sudo zypper --non-interactive dup --auto-agree-with-licenses",
+                "install_auto": "sudo zypper --non-interactive install {}",
                 "check": "rpm -q {}",
+                "query": ["rpm", "-qa", "--qf", "%{NAME}\n"],
                 "cleanup": "sudo zypper clean --all",
                 "orphans": "sudo zypper rm -u"
             },
             "xbps-install": {
                 "update": "sudo xbps-install -Su",
                 "install": "sudo xbps-install -S {}",
+                # Non-interactive variants for background jobs
+                "update_auto": "sudo xbps-install -Suy",
+                "install_auto": "sudo xbps-install -Sy {}",
                 "check": "xbps-query -W {}",
+                "query": ["xbps-query", "-l"],
                 "cleanup": "sudo xbps-remove -O",
                 "orphans": "sudo xbps-remove -o"
             },
             "apk": {
                 "update": "sudo apk update && sudo apk upgrade",
                 "install": "sudo apk add {}",
+                # Non-interactive variants for background jobs
+                "update_auto": "sudo apk update && sudo apk upgrade",
+                "install_auto": "sudo apk add {}",
                 "check": "apk info -e {}",
+                "query": ["apk", "info"],
                 "cleanup": "sudo apk cache clean",
                 "orphans": "sudo apk del $(apk info -n --orphans)"
             },
             "emerge": {
                 "update": "sudo emerge --sync && sudo emerge -auDN @world",
                 "install": "sudo emerge -a {}",
+                # Non-interactive variants for background jobs
+                "update_auto": "sudo emerge --sync && sudo emerge -uDN @world",
+                "install_auto": "sudo emerge {}",
                 "check": "qlist -I {}",
+                "query": ["qlist", "-I"],
                 "cleanup": "sudo eclean-dist -d",
                 "orphans": "sudo emerge --depclean"
             },
             "nix-env": {
                 "update": "nix-channel --update && nix-env -iA nixpkgs.nix nixpkgs.cacert",
                 "install": "nix-env -iA nixpkgs.{}",
+                # Non-interactive variants for background jobs
+                "update_auto": "nix-channel --update && nix-env -iA nixpkgs.nix nixpkgs.cacert",
+                "install_auto": "nix-env -iA nixpkgs.{}",
                 "check": "nix-env -q {}",
+                "query": ["nix-env", "-q"],
                 "cleanup": "nix-collect-garbage -d",
                 "orphans": "nix-collect-garbage"
             }
@@ -997,6 +6131,74 @@ class LinuxUtilityApp(Adw.Application):
         LinuxUtilityApp._cached_pkg_manager = (None, None)
         return LinuxUtilityApp._cached_pkg_manager
 
+    def _get_package_index(self):
+        """Create and cache the local package database index for the detected manager."""
+        if LinuxUtilityApp._cached_pkg_index is None:
+            pkg_name, pkg_cmds = self._detect_package_manager()
+            LinuxUtilityApp._cached_pkg_index = LocalPackageIndex(pkg_name)
+        return LinuxUtilityApp._cached_pkg_index
+
+    def _query_installed_packages(self):
+        """Return the installed package names (set or name -> version dict), or None if unknown."""
+        # Fast path: read the local database directly, no fork
+        packages = self._get_package_index().packages()
+        if packages is not None:
+            return packages
+
+        pkg_name, pkg_cmds = self._detect_package_manager()
+        if not pkg_cmds or "query" not in pkg_cmds:
+            return None
+
+        try:
+            result = subprocess.run(pkg_cmds["query"], capture_output=True, text=True, timeout=30)
+        except Exception as e:
+            print(f"[ERROR] Failed to query installed packages: {e}")
+            return None
+        if result.returncode != 0:
+            return None
+
+        return self._parse_installed_packages(pkg_name, result.stdout)
+
+    def _parse_installed_packages(self, pkg_name, output):
+        """Turn the output of a backend's installed-package query into a set of names."""
+        installed = set()
+        for line in output.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            if pkg_name == "apt":
+                # "<status> <package>", only fully installed packages count
+                status, _, name = line.partition(" ")
+                if status == "installed":
+                    installed.add(name.split(":")[0])
+            elif pkg_name == "xbps-install":
+                # "ii <name>-<version>_<rev> <description>"
+                fields = line.split()
+                if len(fields) >= 2:
+                    installed.add(fields[1].rsplit("-", 1)[0])
+            elif pkg_name == "emerge":
+                # "<category>/<name>", allow lookups with or without the category
+                installed.add(line)
+                installed.add(line.split("/", 1)[-1])
+            elif pkg_name == "nix-env":
+                # "<name>-<version>", split like builtins.parseDrvName
+                match = re.match(r"(.+?)-(?=[^a-zA-Z])", line)
+                installed.add(match.group(1) if match else line)
+            else:
+                installed.add(line)
+
+        return installed
+
+    def _get_missing_packages(self, packages):
+        """Return the packages (in the given order) that are not installed yet."""
+        installed = self._query_installed_packages()
+        if installed is None:
+            # Unknown state, let the package manager sort it out
+            return list(packages)
+
+        return [p for p in packages if p not in installed]
+
     def open_terminal(self, cmd):
         terminal = self._detect_terminal()
         
@@ -1026,6 +6228,57 @@ class LinuxUtilityApp(Adw.Application):
             else:
                 subprocess.Popen([terminal, "-e", exec_cmd])
 
+    def refresh_storage(self):
+        """Sync disk rows with the mount table, then request fresh usage for every mount."""
+        mounts = self.storage.mounts()
+
+        for mountpoint in list(self.storage_rows):
+            if mountpoint not in mounts:
+                self.storage_group.remove(self.storage_rows.pop(mountpoint)["row"])
+
+        for mountpoint, (device, fstype, network) in mounts.items():
+            if mountpoint in self.storage_rows:
+                continue
+            disk_row = Adw.ExpanderRow(title=GLib.markup_escape_text(f"Disk ({mountpoint})"), subtitle="Checking...")
+            disk_row.add_prefix(Gtk.Image.new_from_icon_name("network-server-symbolic" if network else "drive-harddisk-symbolic"))
+            total_row = self.create_action_row("Total Space", "-", "drive-harddisk-symbolic")
+            used_row = self.create_action_row("Used", "-", "drive-harddisk-symbolic")
+            free_row = self.create_action_row("Free", "-", "drive-harddisk-symbolic")
+            for child in (total_row, used_row, free_row):
+                disk_row.add_row(child)
+            self.storage_group.add(disk_row)
+            self.storage_rows[mountpoint] = {
+                "row": disk_row, "total": total_row, "used": used_row, "free": free_row,
+                "tag": f" · Network ({fstype})" if network else "", "shown": None,
+            }
+
+        self.storage.refresh(list(mounts), self.on_storage_usage)
+        return True
+
+    def on_storage_usage(self, mountpoint, usage, error):
+        entry = self.storage_rows.get(mountpoint)
+        if entry is None:
+            # Unmounted while the worker was running
+            return False
+
+        if usage is None:
+            shown = (error,)
+        else:
+            shown = (usage.percent, round(usage.total / 1e9, 1), round(usage.used / 1e9, 1), round(usage.free / 1e9, 1))
+        # Only touch widgets whose values changed
+        if shown == entry["shown"]:
+            return False
+        entry["shown"] = shown
+
+        if usage is None:
+            entry["row"].set_subtitle(GLib.markup_escape_text(f"{error}{entry['tag']}"))
+            return False
+        entry["row"].set_subtitle(f"{usage.percent}% Used{entry['tag']}")
+        entry["total"].set_subtitle(f"{shown[1]} GB")
+        entry["used"].set_subtitle(f"{shown[2]} GB")
+        entry["free"].set_subtitle(f"{shown[3]} GB")
+        return False
+
     def refresh_data(self):
         now = time.time()
         dt = now - self.last_refresh_time
@@ -1056,17 +6309,37 @@ class LinuxUtilityApp(Adw.Application):
         self.swap_history.pop(0); self.swap_history.append(swap_val)
         self.freq_history.pop(0); self.freq_history.append(freq_val)
 
+        # Package power and throttling, aligned with the frequency samples
+        power = self.power_monitor.sample(freq_val)
+        self.power_history.pop(0); self.power_history.append(power["package"] or 0)
+        self.throttle_history.pop(0); self.throttle_history.append(power["throttle"])
+
+        # System samples for a running benchmark
+        if hasattr(self, 'benchmark_samples') and self.benchmark_samples is not None:
+            self.benchmark_samples.append([round(now, 1), cpu_val, mem_val, round(freq_val, 1)])
+
         # Update labels (now subtitles/text)
         if hasattr(self, 'cpu_label'): self.cpu_label.set_text(f"CPU Load: {cpu_val:.1f}%")
         if hasattr(self, 'mem_label'): self.mem_label.set_text(f"Memory Load: {mem_val:.1f}%")
         if hasattr(self, 'swap_label'): self.swap_label.set_text(f"Swap Usage: {swap_val:.1f}%")
-        if hasattr(self, 'freq_label'): self.freq_label.set_text(f"CPU Freq: {int(freq_list.current if freq_list else 0)} MHz")
+        if hasattr(self, 'freq_label'):
+            throttle = {"thermal": " · Thermal throttling", "power": " · Power limited"}.get(power["throttle"], "")
+            self.freq_label.set_text(f"CPU Freq: {int(freq_list.current if freq_list else 0)} MHz{throttle}")
+        if hasattr(self, 'power_label'):
+            if power["package"] is not None:
+                cores = f" (cores {power['core']:.1f} W)" if power["core"] is not None else ""
+                self.power_label.set_text(f"CPU Power: {power['package']:.1f} W{cores}")
+            elif self.power_monitor.needs_helper and time.monotonic() >= self.power_monitor.helper_until:
+                self.power_label.set_text("CPU Power: paused to let the privileged helper exit, reopen this page to resume")
+            elif self.power_monitor.needs_helper:
+                self.power_label.set_text("CPU Power: energy counters need the privileged helper")
 
         # Update rows
         if hasattr(self, 'uptime_row'): self.uptime_row.set_subtitle(self.get_uptime())
         if hasattr(self, 'temp_row'): self.temp_row.set_subtitle(self.get_temp())
+        if hasattr(self, 'throttle_row'): self.throttle_row.set_subtitle(self.format_throttle_status())
         if hasattr(self, 'mem_avail_row'): self.mem_avail_row.set_subtitle(f"{round(psutil.virtual_memory().available / 1e9, 2)} GB")
-        if hasattr(self, 'battery_row'): self.battery_row.set_subtitle(self.get_battery())
+        if hasattr(self, 'battery_graph') and self.battery_row.get_expanded(): self.battery_graph.queue_draw()
         if hasattr(self, 'fans_row'): self.fans_row.set_subtitle(self.get_fans())
         
         # New monitoring rows
@@ -1076,12 +6349,21 @@ class LinuxUtilityApp(Adw.Application):
             self.disk_io_row.set_subtitle(f"Read: {self.format_bytes(read_speed)}/s | Write: {self.format_bytes(write_speed)}/s")
         if hasattr(self, 'top_proc_row'):
             self.top_proc_row.set_subtitle(self.get_top_process())
+        if hasattr(self, 'job_rows'):
+            for job in self.job_runner.jobs:
+                if job.status == "running" and job.id in self.job_rows:
+                    self.job_rows[job.id].set_subtitle(self.format_job_subtitle(job))
+        # Service uptimes are derived from cached timestamps, no D-Bus traffic
+        if hasattr(self, '_service_states'):
+            for svc in self._service_states:
+                self.update_service_row(svc)
 
         # Redraw areas
         if hasattr(self, 'cpu_draw_area'): self.cpu_draw_area.queue_draw()
         if hasattr(self, 'mem_draw_area'): self.mem_draw_area.queue_draw()
         if hasattr(self, 'swap_area'): self.swap_area.queue_draw()
         if hasattr(self, 'freq_draw_area'): self.freq_draw_area.queue_draw()
+        if hasattr(self, 'power_draw_area'): self.power_draw_area.queue_draw()
 
         return True
 
@@ -1176,10 +6458,6 @@ class LinuxUtilityApp(Adw.Application):
             s.connect(("8.8.8.8", 80)); ip = s.getsockname()[0]; s.close(); return ip
         except: return "127.0.0.1"
 
-    def get_battery(self):
-        b = psutil.sensors_battery()
-        return f"{int(b.percent)}% ({'Plugged' if b.power_plugged else 'Battery'})" if b else "N/A"
-
     def get_gpu_info(self):
         try:
             glx_out = subprocess.check_output("glxinfo | grep 'Device:'", shell=True, stderr=subprocess.DEVNULL).decode()
@@ -1214,75 +6492,122 @@ class LinuxUtilityApp(Adw.Application):
         return scrolled
 
     def get_config_status(self, filename):
-        targets = {"general.conf": "~/.config/hypr/hyprland/general.conf", "MangoHud.conf": "~/.config/MangoHud/MangoHud.conf"}
-        path = os.path.expanduser(targets.get(filename))
-        if not os.path.islink(path): return False
-        try:
-            link_target = os.readlink(path)
-            return ".pivot" in link_target or ".enabled" in link_target
-        except: return False
+        return self.config_variants.current(filename) in ("pivot", "enabled")
 
-    def on_config_toggle(self, widget, state, filename, target_path):
+    def on_config_toggle(self, widget, state, filename):
         ext = ("pivot" if state else "original") if filename == "general.conf" else ("enabled" if state else "disabled")
-        source = self.get_resource_path(os.path.join("configs", f"{filename}.{ext}"))
-        
-        target = os.path.expanduser(target_path)
-        backup_dir = os.path.join(os.path.dirname(target), "backup")
-        
+
         try:
-            os.makedirs(os.path.dirname(target), exist_ok=True)
-            if filename != "MangoHud.conf":
-                os.makedirs(backup_dir, exist_ok=True)
-
-            if not os.path.exists(target):
-                open(target, "a").close()
-                print(f"[INFO] Created missing config file: {target}")
-
-            if os.path.exists(target) and filename != "MangoHud.conf":
-                backup_file = os.path.join(backup_dir, os.path.basename(target))
-                
-                backup_file = backup_file.replace(".pivot", "").replace(".enabled", "")
-                
-                if os.path.exists(backup_file):
-                    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                    backup_file = f"{backup_file}.{timestamp}"
-                
-                shutil.move(target, backup_file)
-                print(f"[INFO] Moved old config to backup: {backup_file}")
-            
-            shutil.copy2(source, target)
-            print(f"[INFO] Copied {source} -> {target}")
-            
+            previous = self.config_variants.apply(filename, ext)
+            print(f"[INFO] Switched {self.config_variants.target(filename)} to {ext}")
+
             if filename != "MangoHud.conf":
-                subprocess.run(["hyprctl", "reload"], check=False)
-                print("[INFO] Hyprland reloaded")
-            
+                with open(self.config_variants.target(filename), "rb") as f:
+                    current = f.read()
+                self.apply_hyprland_changes(previous.decode(errors="replace"), current.decode(errors="replace"))
+
         except Exception as e:
             print(f"[ERROR] Failed to toggle config: {e}")
-        
+
         return False
 
+    def create_restore_config_button(self, filename, switch):
+        btn = Gtk.Button(icon_name="document-revert-symbolic", valign=Gtk.Align.CENTER, css_classes=["flat"],
+                         tooltip_text="Restore a backup of your own version")
+        btn.connect("clicked", self.on_restore_config, filename, switch)
+        return btn
+
+    def on_restore_config(self, btn, filename, switch):
+        """List the backups taken before a toggle replaced a customized file."""
+        backups = self.config_variants.backups(filename)
+        if not backups:
+            self.toast_overlay.add_toast(Adw.Toast(title=f"No backups of {filename} yet"))
+            return
+
+        group = Adw.PreferencesGroup()
+        dialog = Adw.MessageDialog(
+            transient_for=btn.get_root(), heading=f"Restore {filename}",
+            body="Customized versions are saved here before a toggle replaces them.", extra_child=group
+        )
+        for record in reversed(backups):
+            row = Adw.ActionRow(
+                title=datetime.datetime.fromtimestamp(record["time"]).strftime("%Y-%m-%d %H:%M:%S"),
+                subtitle=record["hash"][:12], activatable=True
+            )
+            row.add_suffix(Gtk.Image.new_from_icon_name("document-revert-symbolic"))
+            row.connect("activated", self.on_restore_backup, dialog, filename, record["hash"], switch)
+            group.add(row)
+        dialog.add_response("cancel", "Cancel")
+        dialog.present()
+
+    def on_restore_backup(self, row, dialog, filename, digest, switch):
+        dialog.close()
+        try:
+            previous = self.config_variants.restore(filename, digest)
+        except OSError as e:
+            print(f"[ERROR] Failed to restore {filename}: {e}")
+            self.toast_overlay.add_toast(Adw.Toast(title=f"Failed to restore {filename}"))
+            return
+
+        # Reflect the restored file without switching it to a variant again
+        switch.handler_block_by_func(self.on_config_toggle)
+        switch.set_active(self.get_config_status(filename))
+        switch.handler_unblock_by_func(self.on_config_toggle)
+
+        if filename != "MangoHud.conf":
+            with open(self.config_variants.target(filename), "rb") as f:
+                current = f.read()
+            self.apply_hyprland_changes(previous.decode(errors="replace"), current.decode(errors="replace"))
+        self.toast_overlay.add_toast(Adw.Toast(title=f"Restored {filename} from backup"))
+
+    def apply_hyprland_changes(self, old_text, new_text):
+        """Send only the changed keywords to Hyprland, or reload when the diff needs it."""
+        ipc = HyprlandIPC()
+        if not ipc.available():
+            print("[INFO] Hyprland is not running, changes apply on next start")
+            return
+
+        commands = HyprlandIPC.keyword_diff(old_text, new_text)
+        try:
+            if commands == []:
+                return
+            if commands is not None:
+                failed = ipc.batch(commands)
+                if not failed:
+                    print(f"[INFO] Applied {len(commands)} Hyprland keyword(s)")
+                    return
+                for command, reply in failed:
+                    print(f"[ERROR] Hyprland rejected '{command}': {reply}")
+            # Reloading re-reads the whole file, which also covers partially applied batches
+            ipc.reload()
+            print("[INFO] Hyprland reloaded")
+        except OSError as e:
+            print(f"[ERROR] Hyprland IPC failed: {e}")
+
     def on_system_update(self, btn=None):
         pkg_name, pkg_cmds = self._detect_package_manager()
 
+        # The package manager and Flatpak don't share a lock, so both updates run side by side
+        graph = TaskGraph(self.job_runner, "System Update")
         if pkg_cmds:
-            update_cmd = pkg_cmds["update"]
-        else:
-            update_cmd = "echo 'No supported system package manager found!'"
+            graph.add("system", f"System update ({pkg_name})", self.privileged_argv(pkg_cmds["update_auto"]), locks=["pkgdb"])
+        if shutil.which("flatpak"):
+            graph.add("flatpak", "Flatpak update", ["flatpak", "update", "-y", "--noninteractive"], locks=["flatpak"])
 
-        flatpak_update = self.update_flatpaks()
-
-        full_cmd = (
-            "echo '=== SYSTEM UPDATE ==='; "
-            f"{update_cmd}; "
-            "echo; echo '=== FLATPAK UPDATE ==='; "
-            f"{flatpak_update}; "
-            "echo; echo 'All updates completed.'; "
-            "sleep 5"
-        )
+        if not graph.tasks:
+            self.toast_overlay.add_toast(Adw.Toast(title="No supported package manager found"))
+            return
 
-        self.open_terminal(full_cmd)
+        def on_update(graph, task):
+            # Conflicts and other questions make the unattended run fail (stdin is /dev/null),
+            # they need the interactive update
+            if task is not None and task["name"] == "system" and task["status"] == "failed":
+                toast = Adw.Toast(title="System update needs attention", button_label="Open Terminal", timeout=0)
+                toast.connect("button-clicked", lambda t: self.open_terminal(pkg_cmds["update"]))
+                self.toast_overlay.add_toast(toast)
 
+        graph.listeners.append(on_update)
+        self.run_task_graph(graph)
 
     def get_packages_to_install(self):
         packages = [
@@ -1321,9 +6646,14 @@ class LinuxUtilityApp(Adw.Application):
             self.open_terminal("echo 'No packages defined'; sleep 3")
             return
 
-        pkg_str = " ".join(packages)
         pkg_name, pkg_cmds = self._detect_package_manager()
+        if pkg_cmds:
+            packages = self._get_missing_packages(packages)
+            if not packages:
+                self.toast_overlay.add_toast(Adw.Toast(title="All packages are already installed"))
+                return
 
+        pkg_str = " ".join(packages)
         if pkg_cmds:
             install_cmd = pkg_cmds["install"].format(pkg_str)
         else:
@@ -1342,11 +6672,9 @@ class LinuxUtilityApp(Adw.Application):
         pkg_name, pkg_cmds = self._detect_package_manager()
 
         if pkg_cmds and "cleanup" in pkg_cmds:
-            cmd = pkg_cmds["cleanup"]
+            self.run_job("Clean Package Cache", self.privileged_argv(pkg_cmds["cleanup"]))
         else:
-            cmd = "echo 'Cleanup not supported for this package manager'"
-
-        self.open_terminal(f"{cmd} && echo 'Cache cleaned' && sleep 3")
+            self.toast_overlay.add_toast(Adw.Toast(title="Cleanup not supported for this package manager"))
 
     def remove_orphans(self):
         """Remove orphan packages based on detected package manager."""
@@ -1373,68 +6701,113 @@ class LinuxUtilityApp(Adw.Application):
             "it.mijorus.gearlever",
         ]
 
-    def install_flatpaks(self):
+    def get_installed_flatpaks(self):
+        """Return installed Flatpak app IDs (system and user) without spawning flatpak per app."""
+        installed = set()
+        app_dirs = ["/var/lib/flatpak/app", os.path.expanduser("~/.local/share/flatpak/app")]
+        found_dir = False
+        for app_dir in app_dirs:
+            if not os.path.isdir(app_dir):
+                continue
+            found_dir = True
+            for entry in os.scandir(app_dir):
+                # "current" points at the active arch/branch of an installed app
+                if os.path.exists(os.path.join(entry.path, "current")):
+                    installed.add(entry.name)
+
+        if not found_dir and shutil.which("flatpak"):
+            try:
+                out = subprocess.run(
+                    ["flatpak", "list", "--app", "--columns=application"],
+                    capture_output=True, text=True, timeout=30
+                ).stdout
+                installed.update(line.strip() for line in out.splitlines() if line.strip())
+            except Exception as e:
+                print(f"[ERROR] Failed to list Flatpaks: {e}")
+
+        return installed
+
+    def _split_flatpak_ref(self, entry):
+        """Split a "remote:app.id" entry, defaulting to the flathub remote."""
+        remote, sep, app_id = entry.partition(":")
+        return (remote, app_id) if sep else ("flathub", entry)
+
+    def on_install_flatpaks(self):
+        if not shutil.which("flatpak"):
+            self.toast_overlay.add_toast(Adw.Toast(title="Flatpak is not installed"))
+            return
+
         flatpaks = self.get_flatpaks_to_install()
         if not flatpaks:
-            return "echo 'No Flatpaks defined'; sleep 3"
-
-        flatpak_list = " ".join(flatpaks)
-
-        script = (
-            "#!/bin/bash\n"
-            "command -v flatpak >/dev/null 2>&1 || {\n"
-            "  echo \"Flatpak not installed!\";\n"
-            "  sleep 5;\n"
-            "  exit 1;\n"
-            "}\n"
-            "\n"
-            "# Ensure Flathub remote exists\n"
-            "flatpak remote-add --if-not-exists flathub https://flathub.org/repo/flathub.flatpakrepo\n"
-            "\n"
-            "MISSING=\"\"\n"
-            "\n"
-            f"set -- {flatpak_list}\n"
-            "\n"
-            "for fp in \"$@\"; do\n"
-            "  if ! flatpak info \"$fp\" >/dev/null 2>&1; then\n"
-            "    MISSING=\"$MISSING $fp\"\n"
-            "  fi\n"
-            "done\n"
-            "\n"
-            "if [ -z \"$MISSING\" ]; then\n"
-            "  echo \"All Flatpaks are already installed.\"\n"
-            "  echo \"Closing in 5 seconds...\"\n"
-            "  sleep 5\n"
-            "  exit 0\n"
-            "fi\n"
-            "echo \"========================================\"\n"
-            "echo \"   FLATPAK INSTALLATION SERVICE\"\n"
-            "echo \"========================================\"\n"
-            "\n"
-            "echo \"Installing missing Flatpaks:\"\n"
-            "echo \"$MISSING\"\n"
-            "echo\n"
-            "\n"
-            "if flatpak install -y flathub $MISSING; then\n"
-            "  echo\n"
-            "  echo \"SUCCESSFUL\"\n"
-            "else\n"
-            "  echo\n"
-            "  echo \"ERROR during installation\"\n"
-            "fi\n"
-            "\n"
-            "echo \"Closing in 5 seconds...\"\n"
-            "sleep 5\n"
-        )
+            self.toast_overlay.add_toast(Adw.Toast(title="No Flatpaks defined"))
+            return
 
-        return script
+        installed = self.get_installed_flatpaks()
+        missing = [fp for fp in flatpaks if self._split_flatpak_ref(fp)[1] not in installed]
+        if not missing:
+            self.toast_overlay.add_toast(Adw.Toast(title="All Flatpaks are already installed"))
+            return
 
-    def update_flatpaks(self):
-        return (
-            "command -v flatpak >/dev/null || "
-            "(echo 'Flatpak not installed!' && sleep 5 && exit); "
-            "flatpak update -y"
-        )
+        self.open_terminal(self.install_flatpaks(missing))
+
+    def install_flatpaks(self, missing):
+        """Build the install script for the missing Flatpaks, one concurrent transaction per remote."""
+        groups = {}
+        for entry in missing:
+            remote, app_id = self._split_flatpak_ref(entry)
+            groups.setdefault(remote, []).append(app_id)
+
+        total = len(missing)
+        script = [
+            "#!/bin/bash",
+            "echo \"========================================\"",
+            "echo \"   FLATPAK INSTALLATION SERVICE\"",
+            "echo \"========================================\"",
+            f"echo \"Installing {total} missing Flatpak(s) from {len(groups)} remote(s)\"",
+            "echo",
+        ]
+        if "flathub" in groups:
+            script.append("flatpak remote-add --if-not-exists flathub https://flathub.org/repo/flathub.flatpakrepo")
+
+        # One transaction per remote so shared runtimes are resolved once; remotes run concurrently
+        index = 0
+        script.append("PIDS=()")
+        for remote, app_ids in groups.items():
+            labels = {}
+            for app_id in app_ids:
+                index += 1
+                labels[app_id] = shlex.quote(f"[{index}/{total}] {app_id} ({remote})")
+            install = shlex.join(["flatpak", "install", "-y", "--noninteractive", remote])
+            script.append("(")
+            script.append("  set -o pipefail; FAILED=0; LOG=$(mktemp)")
+            # Per-app progress from the transaction's "Installing app/<id>/..." lines
+            script.append(f"  if {install} {shlex.join(app_ids)} 2>&1 | tee \"$LOG\" | while read -r line; do case \"$line\" in")
+            for app_id, label in labels.items():
+                script.append(f"    {shlex.quote(f'Installing app/{app_id}/')}*) echo {label}\": installing...\";;")
+            script.append("  esac; done; then")
+            for label in labels.values():
+                script.append(f"    echo {label}\": done\"")
+            script.append("  else")
+            # A single bad ref fails the whole transaction, retry one by one so the others still install
+            script.append(f"    echo {shlex.quote(f'({remote}) transaction failed, retrying apps one by one:')}; tail -n 5 \"$LOG\" | sed 's/^/    /'")
+            for app_id, label in labels.items():
+                script.append(
+                    f"    if {install} {shlex.quote(app_id)} >\"$LOG\" 2>&1; "
+                    f"then echo {label}\": done\"; else echo {label}\": FAILED\"; tail -n 5 \"$LOG\" | sed 's/^/    /'; FAILED=1; fi"
+                )
+            script.append("  fi")
+            script.append("  rm -f \"$LOG\"; exit $FAILED")
+            script.append(") & PIDS+=($!)")
+
+        script.extend([
+            "STATUS=0",
+            "for pid in \"${PIDS[@]}\"; do wait \"$pid\" || STATUS=1; done",
+            "echo",
+            "if [ $STATUS -eq 0 ]; then echo \"SUCCESSFUL\"; else echo \"ERROR during installation\"; fi",
+            "echo \"Closing in 5 seconds...\"",
+            "sleep 5",
+        ])
+        return "\n".join(script) + "\n"
 
     def install_cups_and_canon(self, btn=None):
         required = ["cups", "gutenprint"]
@@ -1444,15 +6817,9 @@ class LinuxUtilityApp(Adw.Application):
             self.open_terminal("echo 'No supported package manager found!' && sleep 5")
             return
 
-        missing = []
-        for pkg in required:
-            check_cmd = pkg_cmds["check"].format(pkg)
-            result = subprocess.run(check_cmd, shell=True, capture_output=True)
-            if result.returncode != 0:
-                missing.append(pkg)
-
+        missing = self._get_missing_packages(required)
         if not missing:
-            self.open_terminal("echo 'CUPS and Printer drivers are already installed!' && sleep 5")
+            self.toast_overlay.add_toast(Adw.Toast(title="CUPS and Printer drivers are already installed"))
             return
 
         pkg_str = " ".join(missing)
@@ -1501,8 +6868,7 @@ class LinuxUtilityApp(Adw.Application):
 
     def restart_bluetooth(self):
         """Restart the bluetooth service."""
-        cmd = "sudo systemctl restart bluetooth && echo 'Bluetooth service restarted' && sleep 3"
-        self.open_terminal(cmd)
+        self.restart_services(["bluetooth"])
 
     def kill_gpu_procs(self):
         """Forcefully kill processes using the GPU."""
@@ -1519,7 +6885,7 @@ class LinuxUtilityApp(Adw.Application):
             "sudo timedatectl set-ntp true && sudo hwclock --systohc && "
             "echo 'System clock synchronized' && sleep 3"
         )
-        self.open_terminal(cmd)
+        self.run_privileged("Clock sync", [{"op": "set_ntp"}, {"op": "hwclock_systohc"}], cmd)
 
     def flush_dns_cache(self):
         """Flush system DNS cache."""
@@ -1529,22 +6895,104 @@ class LinuxUtilityApp(Adw.Application):
             "sudo killall -HUP nscd 2>/dev/null; "
             "echo 'DNS cache flushed' && sleep 3"
         )
-        self.open_terminal(cmd)
+        self.run_privileged("DNS cache flush", [{"op": "flush_dns"}], cmd)
 
     def on_systemd_reload(self, btn=None):
         """Reload systemd configuration."""
-        self.open_terminal("sudo systemctl daemon-reload && echo 'systemd reloaded' && sleep 3")
+        def on_done(ok, error):
+            if self.systemd.proxy is None:
+                self.run_privileged(
+                    "systemd reload", [{"op": "daemon_reload"}],
+                    "sudo systemctl daemon-reload && echo 'systemd reloaded' && sleep 3"
+                )
+            elif ok:
+                self.toast_overlay.add_toast(Adw.Toast(title="systemd reloaded"))
+            else:
+                self.toast_overlay.add_toast(Adw.Toast(title=f"systemd reload failed: {error}"))
+
+        self.systemd.reload_daemon(on_done)
 
     def check_disk_health(self):
-        """Run SMART disk diagnostics."""
-        cmd = (
-            "echo '=== DISK HEALTH ===' && "
-            "for disk in $(lsblk -d -o NAME | tail -n +2); do "
-            "echo \"\\n--- /dev/$disk ---\"; "
-            "sudo smartctl -H /dev/$disk 2>/dev/null || echo 'SMART not supported'; "
-            "done; echo; read -p 'Press Enter to close...'"
-        )
-        self.open_terminal(cmd)
+        """Show SMART health for every disk, queried in parallel through the helper."""
+        if not self.helper.available():
+            cmd = (
+                "echo '=== DISK HEALTH ===' && "
+                "for disk in $(lsblk -d -o NAME | tail -n +2); do "
+                "echo \"\\n--- /dev/$disk ---\"; "
+                "sudo smartctl -H /dev/$disk 2>/dev/null || echo 'SMART not supported'; "
+                "done; echo; read -p 'Press Enter to close...'"
+            )
+            self.open_terminal(cmd)
+            return
+
+        disks = SmartMonitor.list_disks()
+        group = Adw.PreferencesGroup()
+        rows = {}
+        for disk in disks:
+            row = Adw.ExpanderRow(title=f"/dev/{disk}", subtitle="Querying...")
+            row.add_prefix(Gtk.Image.new_from_icon_name("drive-harddisk-symbolic"))
+            group.add(row)
+            rows[disk] = [row, []]
+        if not disks:
+            group.add(Adw.ActionRow(title="No disks found"))
+
+        def on_refresh(btn):
+            # Bypass the cache
+            for row, _ in rows.values():
+                row.set_subtitle("Querying...")
+            self.smart.query(disks, on_result, force=True)
+
+        refresh_btn = Gtk.Button(icon_name="view-refresh-symbolic", css_classes=["flat"], tooltip_text="Query again")
+        refresh_btn.connect("clicked", on_refresh)
+        group.set_header_suffix(refresh_btn)
+
+        def on_result(disk, info):
+            row, children = rows[disk]
+            for child in children:
+                row.remove(child)
+            children.clear()
+
+            title = f"/dev/{disk}"
+            if info.get("model"):
+                title += f" · {info['model']}"
+            row.set_title(GLib.markup_escape_text(title))
+            row.set_subtitle(GLib.markup_escape_text(self.format_smart_summary(info)))
+
+            details = []
+            if info.get("capacity"):
+                details.append(("Capacity", self.format_bytes(info["capacity"])))
+            if info.get("power_on_hours") is not None:
+                details.append(("Power-On Time", f"{info['power_on_hours']} h"))
+            if info.get("serial"):
+                details.append(("Serial", info["serial"]))
+            for key, value in info.get("errors", {}).items():
+                details.append((key.replace("_", " ").capitalize(), str(value)))
+            for label, value in details:
+                child = Adw.ActionRow(title=label, subtitle=GLib.markup_escape_text(value))
+                row.add_row(child)
+                children.append(child)
+
+        self.smart.query(disks, on_result)
+
+        scrolled = Gtk.ScrolledWindow(child=group, min_content_height=360, propagate_natural_width=True)
+        dialog = Adw.MessageDialog(transient_for=self.toast_overlay.get_root(), heading="Disk Health (SMART)",
+                                   extra_child=scrolled)
+        dialog.add_response("close", "Close")
+        dialog.present()
+
+    def format_smart_summary(self, info):
+        state = info.get("state")
+        if state in ("error", "unsupported", "standby"):
+            return info.get("message", state)
+
+        parts = ["Health: PASSED" if state == "ok" else "Health: FAILING"]
+        if info.get("temperature") is not None:
+            parts.append(f"{info['temperature']}°C")
+        if info.get("wear") is not None:
+            parts.append(f"Wear {info['wear']}%")
+        errors = sum(v for v in info.get("errors", {}).values() if isinstance(v, int) and v > 0)
+        parts.append(f"{errors} error counts" if errors else "No errors")
+        return " · ".join(parts)
 
     def create_utility_row(self, title, subtitle, icon, callback, css=None):
         row = Adw.ActionRow(title=title, subtitle=subtitle)
@@ -1571,28 +7019,228 @@ class LinuxUtilityApp(Adw.Application):
     def apply_profile(self, btn=None):
         selected_idx = self.profile_row.get_selected()
         profile = list(SYSTEM_PROFILES.keys())[selected_idx]
+
+        steps = self.plan_profile(profile)
+        if not steps:
+            self.toast_overlay.add_toast(Adw.Toast(title=f"Profile '{profile}' is already applied"))
+            return
+
+        self.show_profile_preview(profile, steps)
+
+    # ------------------------------
+    # PROFILE PLANNER
+    # ------------------------------
+
+    # Well-known ufw service names used by profile post commands
+    _UFW_SERVICE_PORTS = {"ssh": "22", "http": "80", "https": "443"}
+
+    def plan_profile(self, profile):
+        """Compare a profile with the current system and return only the steps still needed.
+
+        Each step is a dict with a "kind" (packages, enable, disable, post),
+        a human readable "title" and the shell "cmd" that applies it. Steps
+        the privileged helper can run also carry its "op" and "args".
+        """
         cfg = SYSTEM_PROFILES[profile]
+        steps = []
 
-        pkg_str = " ".join(cfg["packages"])
+        # 1. Packages
         pkg_name, pkg_cmds = self._detect_package_manager()
+        if pkg_cmds:
+            missing = self._get_missing_packages(cfg["packages"])
+            if missing:
+                step = {
+                    "kind": "packages",
+                    "title": f"Install {len(missing)} package(s): {', '.join(missing)}",
+                    "cmd": pkg_cmds["install"].format(" ".join(missing)),
+                    "cmd_args": " ".join(missing),
+                }
+                if "sudo" in pkg_cmds["install_auto"]:
+                    step.update(op="install_packages", args={"manager": pkg_name, "packages": missing})
+                steps.append(step)
+        elif cfg["packages"]:
+            steps.append({
+                "kind": "packages",
+                "title": "Install packages (no supported package manager found)",
+                "cmd": "echo 'No supported package manager found!' >&2; exit 1",
+            })
+
+        # 2. Services
+        units = self._query_unit_states(cfg["services_enable"] + cfg["services_disable"])
+        for svc in cfg["services_enable"]:
+            load, file_state, active = units.get(svc, ("", "", ""))
+            if file_state not in ("enabled", "enabled-runtime", "static", "alias") or active != "active":
+                steps.append({"kind": "enable", "title": f"Enable and start {svc}", "cmd": f"sudo systemctl enable --now {svc}",
+                              "op": "enable_service", "args": {"unit": svc}})
+
+        for svc in cfg["services_disable"]:
+            load, file_state, active = units.get(svc, ("", "", ""))
+            if load == "not-found":
+                continue
+            if file_state in ("enabled", "enabled-runtime") or active in ("active", "activating"):
+                steps.append({"kind": "disable", "title": f"Disable and stop {svc}", "cmd": f"sudo systemctl disable --now {svc}",
+                              "op": "disable_service", "args": {"unit": svc}})
+
+        # 3. Post commands
+        ufw_state = self._read_ufw_state()
+        for cmd in cfg["post_cmd"]:
+            if not self._post_cmd_applied(cmd, ufw_state):
+                step = {"kind": "post", "title": f"Run: {cmd}", "cmd": cmd}
+                step.update(self._post_cmd_op(cmd))
+                steps.append(step)
+
+        return steps
+
+    def _query_unit_states(self, services):
+        """Return {service: (LoadState, UnitFileState, ActiveState)} with a single systemctl call."""
+        if not services or not shutil.which("systemctl"):
+            return {}
+
+        units = [s if "." in s else f"{s}.service" for s in services]
+        try:
+            out = subprocess.run(
+                ["systemctl", "show", "--property=LoadState,UnitFileState,ActiveState", *units],
+                capture_output=True, text=True, timeout=10
+            ).stdout
+        except Exception as e:
+            print(f"[ERROR] Failed to query unit states: {e}")
+            return {}
+
+        # One block per unit, in the order the units were requested
+        blocks = out.strip("\n").split("\n\n")
+        if len(blocks) != len(services):
+            return {}
+
+        states = {}
+        for svc, block in zip(services, blocks):
+            props = dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+            states[svc] = (props.get("LoadState", ""), props.get("UnitFileState", ""), props.get("ActiveState", ""))
+        return states
+
+    def _read_ufw_state(self):
+        """Read ufw enablement, default policies and (if readable) user rules from its config files."""
+        state = {"enabled": False, "input": None, "output": None, "rules": None}
+        try:
+            with open("/etc/ufw/ufw.conf") as f:
+                state["enabled"] = any(line.strip().lower() == "enabled=yes" for line in f)
+            with open("/etc/default/ufw") as f:
+                for line in f:
+                    key, _, value = line.strip().partition("=")
+                    if key == "DEFAULT_INPUT_POLICY":
+                        state["input"] = value.strip('"')
+                    elif key == "DEFAULT_OUTPUT_POLICY":
+                        state["output"] = value.strip('"')
+        except OSError:
+            return state
+
+        try:
+            with open("/etc/ufw/user.rules") as f:
+                state["rules"] = f.read()
+        except OSError:
+            pass # Only readable by root on most distros
+        return state
+
+    def _post_cmd_applied(self, cmd, ufw_state):
+        """Check whether a known post command is already in effect; unknown commands always run."""
+        args = cmd.split()
+        if args and args[0] == "sudo":
+            args = args[1:]
+
+        if args[:2] == ["usermod", "-aG"] and len(args) == 4:
+            try:
+                user = pwd.getpwuid(os.getuid()).pw_name
+                group = grp.getgrnam(args[2])
+                return user in group.gr_mem or group.gr_gid == pwd.getpwnam(user).pw_gid
+            except KeyError:
+                return False
+
+        if args[:1] == ["ufw"]:
+            if args[1:] == ["--force", "enable"]:
+                return ufw_state["enabled"]
+            if args[1:3] == ["default", "deny"] and args[3:] == ["incoming"]:
+                return ufw_state["input"] == "DROP"
+            if args[1:3] == ["default", "allow"] and args[3:] == ["outgoing"]:
+                return ufw_state["output"] == "ACCEPT"
+            if len(args) == 3 and args[1] == "allow" and ufw_state["rules"] is not None:
+                port = self._UFW_SERVICE_PORTS.get(args[2], args[2])
+                return re.search(rf"^### tuple ### allow \S+ {re.escape(port)} ", ufw_state["rules"], re.M) is not None
+
+        return False
+
+    def _post_cmd_op(self, cmd):
+        """Helper operation for a known post command ({"op", "args"}), or {} to run it as a shell command."""
+        args = cmd.split()
+        if args and args[0] == "sudo":
+            args = args[1:]
+        if args[:2] == ["usermod", "-aG"] and len(args) == 4 and args[3] in ("$USER", "${USER}"):
+            return {"op": "add_to_group", "args": {"group": args[2]}}
+        if args[:1] == ["ufw"] and len(args) > 1:
+            return {"op": "ufw", "args": {"rule": " ".join(args[1:])}}
+        return {}
+
+    def show_profile_preview(self, profile, steps):
+        """Show the planned changes and run them once confirmed."""
+        body = "\n".join(f"• {step['title']}" for step in steps)
+        dialog = Adw.MessageDialog(
+            transient_for=self.toast_overlay.get_root(),
+            heading=f"Apply '{profile}' profile?",
+            body=f"The following changes are needed:\n\n{body}"
+        )
+        dialog.add_response("cancel", "Cancel")
+        dialog.add_response("apply", "Apply")
+        dialog.set_response_appearance("apply", Adw.ResponseAppearance.SUGGESTED)
+
+        def on_helper_ready(results, error):
+            if results is None:
+                self.toast_overlay.add_toast(Adw.Toast(title=f"Profile '{profile}' not applied: {error}"))
+                return
+            self.run_task_graph(self.build_profile_graph(profile, steps, use_helper=True))
 
-        cmds = []
+        def on_response(dialog, response):
+            if response != "apply":
+                return
+            # One polkit prompt starts the helper, every step then runs through it
+            if self.helper.available() and any("op" in step for step in steps):
+                self.helper.request([{"op": "ping"}], on_helper_ready)
+            else:
+                self.run_task_graph(self.build_profile_graph(profile, steps))
 
-        if pkg_str and pkg_cmds:
-            cmds.append(pkg_cmds["install"].format(pkg_str))
-        elif pkg_str:
-            cmds.append("echo 'No supported package manager found!'")
+        dialog.connect("response", on_response)
+        dialog.present()
 
-        for s in cfg["services_enable"]:
-            cmds.append(f"sudo systemctl enable --now {s}")
+    def build_profile_graph(self, profile, steps, use_helper=False):
+        """Packages first, then service changes in parallel, post commands in their given order.
 
-        for s in cfg["services_disable"]:
-            cmds.append(f"sudo systemctl disable --now {s}")
+        With use_helper, steps that have a helper operation run through the
+        already authorized helper instead of a pkexec prompt each.
+        """
+        graph = TaskGraph(self.job_runner, f"Apply '{profile}' profile")
+        pkg_deps = []
+        previous_post = None
+
+        for i, step in enumerate(steps):
+            name = f"{step['kind']}-{i}"
+            # Stopping the client would leave the operation running in the helper
+            can_cancel = None
+            if use_helper and "op" in step:
+                argv = self.helper.client_argv(step["op"], step["args"])
+                can_cancel = False
+            elif step["kind"] == "packages":
+                pkg_name, pkg_cmds = self._detect_package_manager()
+                cmd = pkg_cmds["install_auto"].format(step["cmd_args"]) if pkg_cmds and "cmd_args" in step else step["cmd"]
+                argv = self.privileged_argv(cmd)
+            else:
+                argv = self.privileged_argv(step["cmd"])
 
-        cmds.extend(cfg["post_cmd"])
+            if step["kind"] == "packages":
+                pkg_deps = [graph.add(name, step["title"], argv, locks=["pkgdb"], can_cancel=can_cancel)]
+            elif step["kind"] in ("enable", "disable"):
+                graph.add(name, step["title"], argv, deps=pkg_deps, can_cancel=can_cancel)
+            else:
+                deps = pkg_deps + ([previous_post] if previous_post else [])
+                previous_post = graph.add(name, step["title"], argv, deps=deps, can_cancel=can_cancel)
 
-        full_cmd = " && ".join(cmds) + " ; echo 'Profile applied'; sleep 5"
-        self.open_terminal(full_cmd)
+        return graph
 
 
 if __name__ == "__main__":